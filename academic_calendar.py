@@ -0,0 +1,176 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+from schedule_model import DAYS
+from config import WEEK_CONFIG, ACADEMIC_CALENDAR
+
+# Названия всех дней недели (понедельник=0, воскресенье=6)
+WEEKDAY_NAMES = DAYS + ('Воскресенье',)
+
+class CalendarDay(NamedTuple):
+    """День календаря: дата, тип недели, название дня и признак учебного дня"""
+    date: date
+    week_type: str
+    day_name: str
+    is_school_day: bool
+    is_holiday: bool
+
+class _AcademicYear:
+    """Предрасчитанная таблица дней одного учебного года"""
+    __slots__ = ('start', 'days', 'next_school')
+
+    def __init__(self, start: date, days: List[CalendarDay]):
+        self.start = start
+        self.days = days
+        # next_school[i] - индекс ближайшего учебного дня начиная с i (len(days), если таких нет)
+        self.next_school = [len(days)] * (len(days) + 1)
+        for i in range(len(days) - 1, -1, -1):
+            self.next_school[i] = i if days[i].is_school_day else self.next_school[i + 1]
+
+class AcademicCalendar:
+    """
+    Календарь учебного года: для каждой даты заранее посчитаны тип недели,
+    название дня и признак учебного дня с учетом праздников.
+    """
+
+    def __init__(self, week_config: Dict = None, year_start_month: int = 9, year_start_day: int = 1,
+                 holidays: List[Union[str, tuple]] = None):
+        self.week_config = week_config or WEEK_CONFIG
+        self.year_start_month = year_start_month
+        self.year_start_day = year_start_day
+        self.holidays = self._expand_holidays(holidays or [])
+        self._years = {}  # год начала -> _AcademicYear
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _expand_holidays(holidays) -> set:
+        """Даты праздников: 'ГГГГ-ММ-ДД' или диапазон ('ГГГГ-ММ-ДД', 'ГГГГ-ММ-ДД')"""
+        result = set()
+        for item in holidays:
+            if isinstance(item, (tuple, list)):
+                first = date.fromisoformat(item[0])
+                last = date.fromisoformat(item[1])
+                result.update(first + timedelta(days=i) for i in range((last - first).days + 1))
+            else:
+                result.add(date.fromisoformat(item))
+        return result
+
+    def _first_monday(self, year: int) -> date:
+        """Понедельник недели, в которую попадает начало учебного года (неделя не делится между годами)"""
+        first_day = date(year, self.year_start_month, self.year_start_day)
+        return first_day - timedelta(days=first_day.weekday())
+
+    def _year_start(self, day: date) -> date:
+        start = self._first_monday(day.year)
+        return start if day >= start else self._first_monday(day.year - 1)
+
+    def _build_year(self, start: date) -> _AcademicYear:
+        """
+        Тип недели считается по числу недель от понедельника базовой недели
+        (ISO-неделя base_week_number года начала), поэтому переход через новый год не сбивает чередование.
+        Год начинается и заканчивается на границе недели, так что у всех дней недели один тип.
+        """
+        first_day = date(start.year, self.year_start_month, self.year_start_day)
+        base_monday = date.fromisocalendar(first_day.year, self.week_config['base_week_number'], 1)
+        base_type = self.week_config['base_week_type']
+        other_type = 'odd' if base_type == 'even' else 'even'
+        end = self._first_monday(first_day.year + 1)
+
+        days = []
+        current = start
+        while current < end:
+            weekday = current.weekday()
+            weeks = (current - timedelta(days=weekday) - base_monday).days // 7
+            is_holiday = current in self.holidays
+            days.append(CalendarDay(
+                date=current,
+                week_type=base_type if weeks % 2 == 0 else other_type,
+                day_name=WEEKDAY_NAMES[weekday],
+                is_school_day=weekday < len(DAYS) and not is_holiday,
+                is_holiday=is_holiday
+            ))
+            current += timedelta(days=1)
+        return _AcademicYear(start, days)
+
+    def _year(self, day: date) -> _AcademicYear:
+        start = self._year_start(day)
+        year = self._years.get(start)
+        if year is None:
+            with self._lock:
+                year = self._years.get(start)
+                if year is None:
+                    year = self._build_year(start)
+                    self._years[start] = year
+        return year
+
+    @staticmethod
+    def _as_date(day: Union[date, datetime]) -> date:
+        return day.date() if isinstance(day, datetime) else day
+
+    def resolve(self, day: Union[date, datetime]) -> CalendarDay:
+        """Информация о дате"""
+        day = self._as_date(day)
+        year = self._year(day)
+        return year.days[(day - year.start).days]
+
+    def week_type(self, day: Union[date, datetime]) -> str:
+        """Тип недели ('even'/'odd') для даты"""
+        return self.resolve(day).week_type
+
+    def today(self) -> CalendarDay:
+        return self.resolve(datetime.now())
+
+    def tomorrow(self) -> CalendarDay:
+        return self.resolve(datetime.now() + timedelta(days=1))
+
+    def year_bounds(self, day: Union[date, datetime] = None):
+        """Первый и последний день учебного года, в который попадает day"""
+        year = self._year(self._as_date(day or datetime.now()))
+        return year.days[0].date, year.days[-1].date
+
+    def holidays_between(self, first: date, last: date) -> List[date]:
+        """Праздники в интервале [first, last]"""
+        return sorted(day for day in self.holidays if first <= day <= last)
+
+    def next_school_day(self, day: Union[date, datetime] = None) -> Optional[CalendarDay]:
+        """Ближайший учебный день начиная с day включительно (переход по индексу, без перебора)"""
+        day = self._as_date(day or datetime.now())
+        for _ in range(2):  # Текущий учебный год и, если он закончился, следующий
+            year = self._year(day)
+            index = year.next_school[(day - year.start).days]
+            if index < len(year.days):
+                return year.days[index]
+            day = year.days[-1].date + timedelta(days=1)
+        return None
+
+    def iter_school_days(self, day: Union[date, datetime] = None, max_days: int = 14) -> Iterator[CalendarDay]:
+        """Учебные дни в интервале [day, day + max_days)"""
+        day = self._as_date(day or datetime.now())
+        end = day + timedelta(days=max_days)
+        current = self.next_school_day(day)
+        while current is not None and current.date < end:
+            yield current
+            current = self.next_school_day(current.date + timedelta(days=1))
+
+# Глобальный экземпляр учебного календаря
+academic_calendar = AcademicCalendar(
+    year_start_month=ACADEMIC_CALENDAR['year_start_month'],
+    year_start_day=ACADEMIC_CALENDAR['year_start_day'],
+    holidays=ACADEMIC_CALENDAR['holidays']
+)
+
+if __name__ == "__main__":
+    # Проверка границ учебных лет: у всех дней одной недели должен быть один тип недели
+    # (в том числе у недели, в которой 31 августа и 1 сентября). Запуск: python academic_calendar.py [год]
+    import sys
+    first_year = int(sys.argv[1]) if len(sys.argv) > 1 else date.today().year - 1
+    errors = 0
+    monday = academic_calendar._first_monday(first_year)
+    while monday < academic_calendar._first_monday(first_year + 3):
+        types = {academic_calendar.week_type(monday + timedelta(days=i)) for i in range(7)}
+        if len(types) != 1:
+            errors += 1
+            print(f"❌ Неделя с {monday}: разные типы {sorted(types)}")
+        monday += timedelta(days=7)
+    print("✅ Тип недели не меняется внутри недели" if not errors else f"❌ Ошибок: {errors}")
+    sys.exit(1 if errors else 0)
\ No newline at end of file
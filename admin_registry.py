@@ -0,0 +1,136 @@
+import os
+import time
+import functools
+import threading
+import logging
+from typing import Any, Callable, Optional, Set
+from database_manager import db_manager
+from shared_state import shared_state
+from config import ADMIN_REGISTRY, SHARED_STATE
+
+logger = logging.getLogger(__name__)
+
+class AdminRegistry:
+    """
+    Список администраторов в памяти процесса.
+    Загружается при старте, обновляется при add/remove и периодически из БД.
+    Несколько процессов узнают об add/remove в другом процессе по версии списка.
+    """
+
+    def __init__(self, version_check_interval: float = 0):
+        self._admins = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.version_check_interval = version_check_interval
+        self._version_source = None
+        self._version_bump = None
+        self._known_version = None
+        self._last_version_check = 0.0
+
+    def set_version_source(self, version_source: Callable[[], Optional[int]], version_bump: Callable[[], Any]):
+        """Источник версии списка (общее состояние или БД); version_bump увеличивает ее после add/remove"""
+        self._version_source = version_source
+        self._version_bump = version_bump
+
+    def _publish_change(self):
+        if not self._version_bump or self.version_check_interval <= 0:
+            return
+        try:
+            self._version_bump()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления версии списка администраторов: {e}")
+
+    def _check_version(self):
+        """Перезагрузка списка, если другой процесс его изменил (не чаще version_check_interval секунд)"""
+        if not self._version_source or self.version_check_interval <= 0:
+            return
+
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return
+        self._last_version_check = now
+
+        try:
+            version = self._version_source()
+        except Exception as e:
+            logger.error(f"❌ Ошибка проверки версии списка администраторов: {e}")
+            return
+
+        if version is None:
+            return
+        if self._known_version is not None and version != self._known_version:
+            logger.info("🔄 Список администраторов изменен в другом процессе, перезагрузка")
+            self.load()
+        self._known_version = version
+
+    def load(self) -> bool:
+        """Загрузка списка администраторов из БД"""
+        admin_ids = db_manager.get_admin_ids()
+        if admin_ids is None:
+            # БД недоступна - оставляем последний известный список
+            logger.warning("⚠️ Не удалось обновить список администраторов, используется прежний")
+            return False
+
+        with self._lock:
+            self._admins = admin_ids
+            self._loaded = True
+        logger.info(f"👑 Загружено администраторов: {len(admin_ids)}")
+        return True
+
+    def is_admin(self, user_id) -> bool:
+        """Проверка прав администратора без обращения к БД (кроме редкой проверки версии)"""
+        if not self._loaded:
+            self.load()
+        self._check_version()
+        return str(user_id) in self._admins
+
+    def add(self, user_id: str, username: str = None) -> bool:
+        """Добавление администратора в БД и в реестр"""
+        if not db_manager.add_admin(str(user_id), username):
+            return False
+        with self._lock:
+            self._admins = self._admins | {str(user_id)}
+        self._publish_change()
+        return True
+
+    def remove(self, user_id: str) -> bool:
+        """Удаление администратора из БД и из реестра"""
+        if not db_manager.remove_admin(str(user_id)):
+            return False
+        with self._lock:
+            self._admins = self._admins - {str(user_id)}
+        self._publish_change()
+        return True
+
+    def get_admin_ids(self) -> Set[str]:
+        """Текущий список ID администраторов"""
+        if not self._loaded:
+            self.load()
+        self._check_version()
+        return set(self._admins)
+
+# Глобальный реестр администраторов
+admin_registry = AdminRegistry(ADMIN_REGISTRY['version_check_interval'])
+if shared_state.shared:
+    admin_registry.version_check_interval = ADMIN_REGISTRY['version_check_interval'] or SHARED_STATE['poll_interval']
+    admin_registry.set_version_source(lambda: shared_state.get_int('admins_version'),
+                                      lambda: shared_state.incr('admins_version'))
+else:
+    # Без общего состояния - общая версия настроек в БД (ее увеличение сбрасывает и кэш настроек).
+    # Процессы за webhook прокси сверяют ее всегда, даже если интервал в config не задан
+    if not admin_registry.version_check_interval and os.getenv('WEBHOOK_WORKER') is not None:
+        admin_registry.version_check_interval = SHARED_STATE['poll_interval']
+    admin_registry.set_version_source(db_manager.get_settings_version, db_manager.bump_settings_version)
+
+def admin_only(handler):
+    """Декоратор обработчика: выполнить только для администраторов"""
+    @functools.wraps(handler)
+    async def wrapper(update, context, *args, **kwargs):
+        if not admin_registry.is_admin(update.effective_user.id):
+            if update.callback_query:
+                await update.callback_query.answer("❌ У вас нет прав для выполнения этой команды.", show_alert=True)
+            else:
+                await update.effective_message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+            return
+        return await handler(update, context, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,107 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from config import BELLS_SCHEDULE
+
+def parse_minutes(value: str) -> int:
+    """'9:30' -> минуты от начала суток"""
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+def parse_interval(value: str) -> Tuple[int, int]:
+    """'9:30-10:15' -> (570, 615)"""
+    start, end = value.split('-')
+    return parse_minutes(start), parse_minutes(end)
+
+def pair_number(value) -> Optional[int]:
+    """Номер пары из '1 пара' или из значения ячейки расписания ('1', '1.0')"""
+    match = re.match(r'\s*(\d+)', str(value or ''))
+    return int(match.group(1)) if match else None
+
+class BellPair(NamedTuple):
+    """Пара по звонкам: границы в минутах от начала суток"""
+    number: int
+    title: str
+    start: int
+    end: int
+    first_half: Tuple[int, int]
+    second_half: Tuple[int, int]
+
+class BellsPosition(NamedTuple):
+    """Положение момента времени относительно звонков дня"""
+    current: Optional[BellPair]   # Идущая пара
+    half: Optional[int]           # 1 или 2 - идущая половина пары, None - перемена между половинами
+    next: Optional[BellPair]      # Следующая пара
+
+class BellsIndex:
+    """
+    Звонки, разобранные один раз при старте: по каждому дню отсортированные
+    массивы начал и концов пар для поиска бинарным поиском и готовые тексты.
+    """
+
+    def __init__(self, bells_schedule: Dict[str, List[Dict[str, str]]]):
+        self._pairs = {}   # день -> список BellPair по возрастанию начала
+        self._starts = {}  # день -> начала пар в минутах
+        self._day_texts = {}
+
+        for day, pairs in bells_schedule.items():
+            parsed = []
+            for pair_info in pairs:
+                first_half = parse_interval(pair_info['first_half'])
+                second_half = parse_interval(pair_info['second_half'])
+                parsed.append(BellPair(
+                    number=pair_number(pair_info['pair']),
+                    title=pair_info['pair'],
+                    start=first_half[0],
+                    end=second_half[1],
+                    first_half=first_half,
+                    second_half=second_half
+                ))
+            parsed.sort(key=lambda pair: pair.start)
+            self._pairs[day] = parsed
+            self._starts[day] = [pair.start for pair in parsed]
+            self._day_texts[day] = self._render_pairs(pairs)
+
+        self.all_days_text = "🔔 Расписание звонков:\n\n" + "".join(
+            f"**{day}:**\n{self._render_pairs(pairs, separator='')}\n"
+            for day, pairs in bells_schedule.items()
+        )
+
+    @staticmethod
+    def _render_pairs(pairs: List[Dict[str, str]], separator: str = '\n') -> str:
+        return "".join(
+            f"• {pair_info['pair']}:\n"
+            f"  Первая половина: {pair_info['first_half']}\n"
+            f"  Вторая половина: {pair_info['second_half']}\n{separator}"
+            for pair_info in pairs
+        )
+
+    def day_text(self, day: str) -> str:
+        """Готовый текст звонков на день"""
+        return f"🔔 Расписание звонков на {day}:\n\n{self._day_texts.get(day, '')}"
+
+    def get_pairs(self, day: str) -> List[BellPair]:
+        return self._pairs.get(day, [])
+
+    def locate(self, day: str, minute: int) -> BellsPosition:
+        """Идущая и следующая пара для момента minute (минуты от начала суток), O(log n)"""
+        pairs = self._pairs.get(day, [])
+        index = bisect_right(self._starts.get(day, []), minute) - 1
+
+        current = half = None
+        if index >= 0 and minute < pairs[index].end:
+            current = pairs[index]
+            if minute < current.first_half[1]:
+                half = 1
+            elif minute >= current.second_half[0]:
+                half = 2
+
+        next_pair = pairs[index + 1] if index + 1 < len(pairs) else None
+        return BellsPosition(current, half, next_pair)
+
+def format_minutes(value: int) -> str:
+    """570 -> '9:30'"""
+    return f"{value // 60}:{value % 60:02d}"
+
+# Глобальный индекс звонков
+bells_index = BellsIndex(BELLS_SCHEDULE)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Горячие запросы DatabaseManager (is_banned, get_user_group, log_request,
+get_flood_settings, get_mailing_settings): соединение на запрос против
+подготовленных запросов на долгоживущем соединении.
+
+SQLite (временный файл, сервер не нужен):
+    python benchmarks/bench_db_queries.py --backend sqlite [--iterations 2000]
+
+MySQL - только отдельная тестовая база, бенчмарк применяет миграции и пишет в request_stats:
+    docker run --rm -d -p 3306:3306 -e MARIADB_ROOT_PASSWORD=bench -e MARIADB_DATABASE=bench mariadb:11
+    DB_USER=root DB_PASSWORD=bench DB_NAME=bench python benchmarks/bench_db_queries.py [--iterations 2000]
+"""
+import os
+import sys
+import argparse
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import create_db_manager
+from schema_migrations import SchemaMigrations
+
+CHAT_ID = 'bench_chat'
+
+QUERIES = {
+    'is_banned': lambda db: db.is_banned(CHAT_ID),
+    'get_user_group': lambda db: db.get_user_group(CHAT_ID),
+    'log_request': lambda db: db.log_request(CHAT_ID, '/today', 'bench'),
+    'get_flood_settings': lambda db: db.get_flood_settings(),
+    'get_mailing_settings': lambda db: db.get_mailing_settings(CHAT_ID),
+}
+
+def measure(db, query, iterations: int):
+    """Время каждого вызова в мкс"""
+    query(db)  # Прогрев: соединение и подготовка запроса
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        query(db)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+def summary(timings):
+    timings = sorted(timings)
+    return (statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.95)])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql')
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite':
+        from sqlite_manager import SQLiteManager
+        directory = tempfile.TemporaryDirectory()
+        db = SQLiteManager(os.path.join(directory.name, 'bench.sqlite3'))
+    else:
+        db = create_db_manager('mysql')
+
+    if SchemaMigrations(db=db).run() is None:
+        print("❌ База данных недоступна, проверьте DB_HOST/DB_USER/DB_PASSWORD/DB_NAME")
+        sys.exit(1)
+    db.set_user_group(CHAT_ID, 'bench')
+
+    results = {}
+    for prepared in (False, True):
+        db.prepared_statements = prepared
+        for name, query in QUERIES.items():
+            results[(name, prepared)] = summary(measure(db, query, args.iterations))
+        db.close()
+
+    print(f"Хранилище: {args.backend}")
+    print(f"{'запрос':22s} {'режим':12s} {'среднее':>10s} {'p50':>10s} {'p95':>10s}")
+    for name in QUERIES:
+        for prepared in (False, True):
+            mean, p50, p95 = results[(name, prepared)]
+            mode = 'подготовл.' if prepared else 'на запрос'
+            print(f"{name:22s} {mode:12s} {mean:8.0f}мкс {p50:8.0f}мкс {p95:8.0f}мкс")
+        speedup = results[(name, False)][0] / results[(name, True)][0]
+        print(f"{'':22s} ускорение x{speedup:.1f}")
+
+if __name__ == '__main__':
+    main()
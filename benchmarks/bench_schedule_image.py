@@ -0,0 +1,90 @@
+"""
+Время рисования картинки расписания и доля попаданий в кэш PNG
+на синтетических группах при случайном потоке запросов /week_image.
+
+Запуск: python benchmarks/bench_schedule_image.py [количество_групп] [количество_запросов]
+"""
+import os
+import sys
+import random
+import asyncio
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule_model import DAYS, Lesson
+from schedule_image import ScheduleImageRenderer, build_rows, render_week_png
+from config import SCHEDULE_IMAGE
+
+def make_week(rng):
+    """Синтетическое расписание группы на неделю"""
+    week = {}
+    for day in DAYS:
+        lessons = []
+        for number in range(1, 6):
+            if rng.random() < 0.7:
+                lessons.append(Lesson(str(number), '', f"Дисциплина {rng.randrange(40)}\n"
+                                      f"Преподаватель {rng.randrange(60)}\nауд. {rng.randrange(100, 160)}"))
+        week[day] = tuple(lessons)
+    return week
+
+class FakeParsingService:
+    """Сервис разбора с заранее построенными неделями вместо Excel-файла"""
+    version = 'bench'
+
+    def __init__(self, weeks):
+        self.weeks = weeks
+        self.parser = self
+
+    def get_file_version(self):
+        return self.version
+
+    def served_version(self):
+        return self.version
+
+    async def get_week_schedule(self, group, week_type):
+        return self.weeks[(group, week_type)]
+
+def bench_render(weeks, repeats):
+    """Чистое время рисования одной картинки в текущем процессе"""
+    rows = [build_rows(week) for week in list(weeks.values())[:repeats]]
+    started = time.perf_counter()
+    sizes = [len(render_week_png('Группа', 'even', r, SCHEDULE_IMAGE['font_path'])) for r in rows]
+    elapsed = time.perf_counter() - started
+    print(f"Рисование: {elapsed / len(rows) * 1000:.1f} мс на картинку, "
+          f"средний PNG {sum(sizes) / len(sizes) / 1024:.1f} КБ")
+
+async def bench_requests(weeks, groups, requests):
+    """Поток запросов через рендерер с пулом процессов и кэшем на диске"""
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as image_dir:
+        renderer = ScheduleImageRenderer(image_dir=image_dir, max_workers=SCHEDULE_IMAGE['max_workers'],
+                                         font_path=SCHEDULE_IMAGE['font_path'], service=FakeParsingService(weeks))
+        started = time.perf_counter()
+        # Запросы приходят пачками, как при рассылке
+        for _ in range(requests // 10):
+            batch = [renderer.get_image(f"Группа-{rng.randrange(groups)}", rng.choice(('even', 'odd')))
+                     for _ in range(10)]
+            await asyncio.gather(*batch)
+        elapsed = time.perf_counter() - started
+        renderer.shutdown()
+
+    stats = renderer.get_stats()
+    print(f"Запросов: {requests}, время {elapsed:.2f} с")
+    print(f"Нарисовано: {stats['renders']}, из кэша: {stats['hits']} ({stats['hit_ratio']:.0%}), "
+          f"рендер в пуле в среднем {stats['avg_render_ms']:.0f} мс")
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    rng = random.Random(42)
+    weeks = {(f"Группа-{g}", week_type): make_week(rng)
+             for g in range(groups) for week_type in ('even', 'odd')}
+
+    bench_render(weeks, repeats=10)
+    asyncio.run(bench_requests(weeks, groups, requests))
+
+if __name__ == '__main__':
+    main()
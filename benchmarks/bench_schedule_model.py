@@ -0,0 +1,93 @@
+"""
+Сравнение памяти: словари занятий и полные строки ячеек против компактной модели
+(Lesson со __slots__, CellGrid) на синтетической книге из 50 групп.
+
+Запуск: python benchmarks/bench_schedule_model.py [количество_групп]
+"""
+import os
+import sys
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule_model import DAYS, CellGrid, build_day_lessons
+
+ROWS_PER_DAY = 12   # строк в диапазоне schedule на день
+COLS_PER_DAY = 3    # столбцов в диапазоне schedule
+PAIRS = ['1', '', '2', '', '3', '', '4', '', '5', '', '6', '']
+TIMES = ['9:30-10:15', '', '10:25-11:10', '', '11:50-12:35', '', '12:45-13:30', '', '14:00-14:45', '', '14:55-15:40', '']
+
+def make_cell_ranges(rng):
+    """Синтетические значения диапазонов одного дня (как из get_cell_range)"""
+    schedule = []
+    for row in range(ROWS_PER_DAY):
+        if row % 2 == 0 and rng.random() < 0.7:
+            # Каждая ячейка - новый объект строки, как при чтении из openpyxl
+            schedule.append([f"Дисциплина {rng.randrange(40)}", f"Преподаватель {rng.randrange(60)}",
+                             f"ауд. {rng.randrange(100, 160)}"])
+        else:
+            schedule.append([''] * COLS_PER_DAY)
+    pairs = [[p] for p in PAIRS]
+    times = [[t] for t in TIMES]
+    return pairs, times, schedule
+
+def make_workbook(groups, seed=42):
+    rng = random.Random(seed)
+    return {
+        f"Группа-{g}": {
+            week_type: {day: make_cell_ranges(rng) for day in DAYS}
+            for week_type in ('even', 'odd')
+        }
+        for g in range(groups)
+    }
+
+def build_dict_model(workbook):
+    """Старое представление: словари занятий + полные строки ячеек детектора"""
+    parser_cache, detector_cache = {}, {}
+    for group, weeks in workbook.items():
+        for week_type, days in weeks.items():
+            for day, (pairs, times, schedule) in days.items():
+                lessons = []
+                for i, row in enumerate(schedule):
+                    content = [cell for cell in row if cell]
+                    if content:
+                        lessons.append({'pair': pairs[i][0], 'time': times[i][0],
+                                        'discipline': '\n'.join(content)})
+                parser_cache[f"{group}_{week_type}_{day}"] = lessons
+                detector_cache[(group, week_type, day)] = schedule
+    return parser_cache, detector_cache
+
+def build_compact_model(workbook):
+    """Новое представление: кортежи Lesson + CellGrid"""
+    parser_cache, detector_cache = {}, {}
+    for group, weeks in workbook.items():
+        for week_type, days in weeks.items():
+            for day, (pairs, times, schedule) in days.items():
+                parser_cache[f"{group}_{week_type}_{day}"] = build_day_lessons(pairs, times, schedule)
+                detector_cache[(group, week_type, day)] = CellGrid.from_rows(schedule)
+    return parser_cache, detector_cache
+
+def measure(builder, groups):
+    """Память, которая остается занятой моделью после чтения книги"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    model = builder(make_workbook(groups))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return size, model
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    dict_size, _ = measure(build_dict_model, groups)
+    compact_size, _ = measure(build_compact_model, groups)
+
+    print(f"📊 Групп: {groups}, дней: {groups * 2 * len(DAYS)}")
+    print(f"   Словари + полные строки: {dict_size / 1024:.1f} КБ")
+    print(f"   Lesson + CellGrid:       {compact_size / 1024:.1f} КБ")
+    if compact_size:
+        print(f"   Экономия: {dict_size / compact_size:.2f}x")
+
+if __name__ == "__main__":
+    main()
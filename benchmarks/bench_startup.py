@@ -0,0 +1,79 @@
+"""
+Холодный старт точек входа: время импорта bot.py и cron_download.py по -X importtime
+и самые дорогие модули. С --budget-ms выходит с кодом 1 при превышении бюджета.
+
+Запуск: python benchmarks/bench_startup.py [--repeat 5] [--top 15] [--budget-ms 1500]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ('bot', 'cron_download')
+
+def measure(module: str):
+    """Один холодный импорт модуля в новом процессе: (время процесса, {модуль: (self, cumulative)} в мкс)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+        raise RuntimeError(f"import {module} завершился с ошибкой: {last_line}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall, modules
+
+def report(module: str, repeat: int, top: int) -> float:
+    walls, totals, runs = [], [], []
+    for _ in range(repeat):
+        wall, modules = measure(module)
+        walls.append(wall)
+        totals.append(modules.get(module, (0, 0))[1])
+        runs.append(modules)
+
+    # Самые дорогие модули по медиане собственного времени
+    names = set().union(*runs)
+    costs = sorted(
+        ((statistics.median(run.get(name, (0, 0))[0] for run in runs), name) for name in names),
+        reverse=True
+    )
+
+    import_ms = statistics.median(totals) / 1000
+    print(f"\n=== {module} ===")
+    print(f"Импорт: {import_ms:.0f} мс (медиана из {repeat}), процесс целиком: {statistics.median(walls) * 1000:.0f} мс")
+    print(f"Модулей загружено: {len(names)}")
+    print("Самые дорогие модули (собственное время):")
+    for self_us, name in costs[:top]:
+        print(f"  {self_us / 1000:8.1f} мс  {name}")
+    return import_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=None, help='бюджет времени импорта каждой точки входа')
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in ENTRY_POINTS:
+        import_ms = report(module, args.repeat, args.top)
+        if args.budget_ms is not None and import_ms > args.budget_ms:
+            over_budget.append(f"{module}: {import_ms:.0f} мс > {args.budget_ms:.0f} мс")
+
+    if over_budget:
+        print("\n❌ Превышен бюджет старта:\n  " + "\n  ".join(over_budget))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Нагрузка на webhook бота: воспроизведение записанных обновлений (UPDATES_RECORD)
+или синтетических команд, задержка ответа HTTP, полная задержка до ответа бота
+и обновлений в секунду.
+
+Полная задержка измеряется через заглушку Bot API, которую поднимает сам тест:
+бот отправляет ответы в нее, а не в Telegram. ID чатов в обновлениях подменяются
+на --chats синтетических, поэтому запускать только на тестовой базе.
+
+    # 1. Нагрузка (записанные обновления или синтетические /today, /bells...):
+    #    тест поднимает заглушку Bot API и ждет, пока бот начнет принимать webhook
+    python benchmarks/webhook_load.py --secret bench [--updates updates.jsonl] [--count 2000 --concurrency 50]
+    # 2. В другом терминале бот в webhook режиме с заглушкой Bot API (DB_* - тестовая база)
+    BOT_MODE=webhook WEBHOOK_LISTEN=127.0.0.1 WEBHOOK_SECRET=bench \\
+        BOT_API_URL=http://127.0.0.1:8081/bot python bot.py
+
+Несколько процессов: WEBHOOK_WORKERS=4 на шаге 1, URL тот же (порт прокси).
+Анти-флуд считает запросы по чату: при малом --chats его стоит выключить (/floodoff).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import asyncio
+import statistics
+from collections import Counter, defaultdict, deque
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_server import SECRET_HEADER, chat_id_of
+
+CHAT_BASE = 9_000_000_000
+COMMANDS = ['/today', '/tomorrow', '/week', '/bells', '/now']
+# Методы Bot API, ответ которых считается ответом на обновление
+REPLY_METHODS = {'sendmessage', 'senddocument', 'sendphoto', 'editmessagetext', 'answercallbackquery'}
+
+def synthetic_update(index: int) -> dict:
+    text = COMMANDS[index % len(COMMANDS)]
+    return {
+        'update_id': index,
+        'message': {
+            'message_id': index,
+            'date': int(time.time()),
+            'chat': {'id': 0, 'type': 'private', 'first_name': 'bench'},
+            'from': {'id': 0, 'is_bot': False, 'first_name': 'bench'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        }
+    }
+
+def load_updates(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def retarget(update: dict, index: int, chat_id: int) -> dict:
+    """Копия обновления с новым update_id и синтетическим чатом/пользователем"""
+    data = json.loads(json.dumps(update))
+    data['update_id'] = index
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        for holder in (value, value.get('message') or {}):
+            if 'chat' in holder:
+                holder['chat']['id'] = chat_id
+            if 'from' in holder:
+                holder['from']['id'] = chat_id
+    return data
+
+class FakeBotApi:
+    """Заглушка Bot API: отвечает ok на любой метод и засекает первый ответ бота чату"""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay  # Имитация сетевой задержки до серверов Telegram, секунд
+        self.pending = defaultdict(deque)  # чат -> время отправки обновлений без ответа
+        self.latencies = []
+        self.calls = Counter()
+        self.message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if method == 'getme':
+            return web.json_response({'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}})
+        if method not in REPLY_METHODS:
+            return web.json_response({'ok': True, 'result': True})
+
+        chat_id = params.get('chat_id')
+        pending = self.pending.get(int(chat_id)) if chat_id else None
+        if pending:
+            self.latencies.append((time.perf_counter() - pending.popleft()) * 1000)
+        if method == 'answercallbackquery':
+            return web.json_response({'ok': True, 'result': True})
+
+        self.message_id += 1
+        return web.json_response({'ok': True, 'result': {
+            'message_id': self.message_id, 'date': int(time.time()),
+            'chat': {'id': int(chat_id or 0), 'type': 'private'}, 'text': ''}})
+
+    async def start(self, port: int):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        return runner
+
+def percentiles(values):
+    if not values:
+        return "нет данных"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return (f"среднее {statistics.mean(values):7.1f} мс, p50 {pick(0.5):7.1f}, "
+            f"p95 {pick(0.95):7.1f}, p99 {pick(0.99):7.1f}")
+
+async def wait_for_webhook(url: str, timeout: float) -> bool:
+    """Ждем, пока сервер webhook начнет принимать соединения (GET на POST-маршрут - 405)"""
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            try:
+                async with session.get(url):
+                    return True
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.5)
+    return False
+
+async def run(args):
+    api = FakeBotApi(args.api_delay / 1000)
+    api_runner = await api.start(args.api_port)
+    print(f"Заглушка Bot API: http://127.0.0.1:{args.api_port}/bot, ждем webhook {args.url}...")
+    if not await wait_for_webhook(args.url, args.wait):
+        print(f"❌ Webhook не ответил за {args.wait:.0f} с")
+        await api_runner.cleanup()
+        sys.exit(1)
+
+    source = load_updates(args.updates) if args.updates else None
+    headers = {'Content-Type': 'application/json'}
+    if args.secret:
+        headers[SECRET_HEADER] = args.secret
+
+    queue = asyncio.Queue()
+    for index in range(args.count):
+        chat_id = CHAT_BASE + index % args.chats
+        update = source[index % len(source)] if source else synthetic_update(index)
+        queue.put_nowait(retarget(update, index + 1, chat_id))
+
+    ack_latencies = []
+    statuses = Counter()
+
+    async def sender(session):
+        while not queue.empty():
+            update = queue.get_nowait()
+            body = json.dumps(update)
+            started = time.perf_counter()
+            api.pending[chat_id_of(update)].append(started)
+            try:
+                async with session.post(args.url, data=body, headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            ack_latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        await asyncio.gather(*(sender(session) for _ in range(args.concurrency)))
+    sent_seconds = time.perf_counter() - started
+
+    # Ждем ответы бота, пока они приходят, но не дольше --drain секунд
+    deadline = time.perf_counter() + args.drain
+    last_reply, replied = time.perf_counter(), len(api.latencies)
+    while sum(map(len, api.pending.values())) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.2)
+        if len(api.latencies) != replied:
+            last_reply, replied = time.perf_counter(), len(api.latencies)
+        elif time.perf_counter() - last_reply > 3:
+            break  # На остальные обновления бот, видимо, не отвечает
+    total_seconds = time.perf_counter() - started
+    await api_runner.cleanup()
+
+    print(f"Обновлений: {args.count} ({'запись ' + args.updates if source else 'синтетические'}), "
+          f"чатов: {args.chats}, параллельно: {args.concurrency}")
+    print(f"Статусы HTTP: {dict(statuses)}")
+    print(f"Прием webhook:  {args.count / sent_seconds:8.0f} обновл./с, {percentiles(ack_latencies)}")
+    print(f"Ответ бота:     {len(api.latencies) / total_seconds:8.0f} ответов/с, {percentiles(api.latencies)}")
+    print(f"Без ответа: {sum(map(len, api.pending.values()))}, вызовы Bot API: {dict(api.calls.most_common(6))}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--updates', help='JSONL, записанный ботом с UPDATES_RECORD')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--api-delay', type=float, default=0, help='Задержка ответа заглушки Bot API, мс (у Telegram обычно 50-200)')
+    parser.add_argument('--drain', type=float, default=30)
+    parser.add_argument('--wait', type=float, default=120, help='Сколько ждать запуска бота, секунд')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,35 @@
+import asyncio
 import logging
-import platform
-import socket
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, ConversationHandler,
-    ContextTypes, MessageHandler, filters
+    ContextTypes, MessageHandler, TypeHandler, filters
 )
-from schedule_parser import ScheduleParser
+from parsing_service import parsing_service
+from cache_warmup import cache_warmup
 from mailing_manager import MailingManager, TOMSK_TZ
-from change_notifier import ChangeNotifier
 from group_manager import GroupManager
-from config import BELLS_SCHEDULE
 from datetime import datetime, time as dt_time, timedelta
 import time
 from database_manager import db_manager
+from schema_migrations import schema_migrations
 from flood_protection import flood_protection
-import subprocess
-import platform
-import psutil
+from settings_cache import settings_cache
+from shared_state import shared_state, reload_signal
+from update_processor import update_processor
+from metrics import metrics
+from chat_tracker import chat_tracker
+from admin_registry import admin_registry, admin_only
+from request_rollups import request_rollups
+from request_retention import request_retention
+from request_analytics import request_analytics
+from academic_calendar import academic_calendar
+from bells_index import bells_index, pair_number, format_minutes
+from schedule_export import schedule_exporter, EXPORT_FORMATS
+from file_id_cache import file_id_cache
+from payload_cache import payload_cache, send_document, Payload
+from schedule_image import schedule_image_renderer
+from config import CHAT_TRACKER, ADMIN_REGISTRY, REQUEST_ROLLUPS, REQUEST_STATS_RETENTION, STARTINFO_PAGE_SIZE, CACHE_WARMUP, WEBHOOK, METRICS
 import sys
 import os
 import json
@@ -29,22 +41,42 @@ TOKEN = ""
 SELECT_GROUP, SELECT_WEEK, SELECT_DAY, SET_MAILING_TIME = range(4)
 
 # Инициализация парсеров и менеджеров
-parser = ScheduleParser()
+parser = parsing_service.parser  # Общий парсер: промахи кэша разбираются в пуле процессов
 mailing_manager = MailingManager()
-change_notifier = ChangeNotifier()
 group_manager = GroupManager()
 
+_change_notifier = None
+_update_recorder = None
+
+def owns_chat(chat_id) -> bool:
+    """Рассылку чата ведет процесс, которому прокси webhook отдает обновления этого чата"""
+    worker = os.getenv('WEBHOOK_WORKER')
+    if worker is None:
+        return True
+    from webhook_server import worker_for
+    return worker_for(chat_id, int(os.getenv('WEBHOOK_WORKERS', '1'))) == int(worker)
+
+def get_change_notifier():
+    """Уведомления об изменениях: модуль с детектором и его кэшем загружается при первом обращении"""
+    global _change_notifier
+    if _change_notifier is None:
+        from change_notifier import ChangeNotifier
+        _change_notifier = ChangeNotifier()
+    return _change_notifier
+
 def check_reload_flag():
-    """Проверяет перезагрузку кэша"""
-    reload_flag = 'cache/reload_cache.flag'
-    if os.path.exists(reload_flag):
-        try:
-            parser.clear_cache()
-            os.remove(reload_flag)
-            logger.info("🔄 Кэш перезагружен по флагу от крона")
+    """Проверяет перезагрузку кэша (файл-флаг или счетчик в общем состоянии)"""
+    try:
+        if reload_signal.consume():
+            # Старый кэш отвечает, пока в фоне готовится новый; без цикла событий - сброс сразу
+            if cache_warmup.schedule('reload'):
+                logger.info("🔄 Запущен прогрев кэша по флагу от крона")
+            else:
+                parser.clear_cache()
+                logger.info("🔄 Кэш перезагружен по флагу от крона")
             return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка перезагрузки кэша: {e}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка перезагрузки кэша: {e}")
     return False
 
 # Настройка логирования
@@ -58,11 +90,14 @@ async def check_flood_protection(update: Update, context: ContextTypes.DEFAULT_T
     chat_id = str(update.effective_chat.id)
     
     # Логируем запрос
+    command = db_manager.normalize_command(update.message.text) if update.message else 'Unknown'
     db_manager.log_request(
         chat_id, 
-        update.message.text if update.message else 'Unknown',
+        command,
         f"Telegram Bot"
     )
+    request_rollups.record(chat_id, command)
+    request_analytics.record(chat_id, command)
     
     # Проверяем флуд
     flood_check = flood_protection.check_flood(chat_id)
@@ -119,12 +154,48 @@ async def save_chat_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 'last_name': user.last_name
             })
         
-        # Сохраняем в базу
-        db_manager.save_bot_chat(**chat_info)
+        # В базу попадут только новые или изменившиеся чаты (фоновой записью)
+        chat_tracker.track(**chat_info)
         
     except Exception as e:
         logger.error(f"Ошибка сохранения информации о чате: {e}")
 
+async def flush_chat_tracker(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая запись накопленной информации о чатах"""
+    try:
+        await asyncio.to_thread(chat_tracker.flush)
+    except Exception as e:
+        logger.error(f"Ошибка записи информации о чатах: {e}")
+
+async def flush_request_rollups(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая запись счетчиков статистики запросов"""
+    try:
+        await asyncio.to_thread(request_rollups.flush)
+    except Exception as e:
+        logger.error(f"Ошибка записи статистики запросов: {e}")
+
+async def prune_request_stats(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая очистка устаревших записей request_stats"""
+    try:
+        await asyncio.to_thread(request_retention.prune)
+    except Exception as e:
+        logger.error(f"Ошибка очистки статистики запросов: {e}")
+
+async def refresh_admins(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическое обновление списка администраторов из БД"""
+    await asyncio.to_thread(admin_registry.load)
+
+async def shutdown_buffers(application: Application):
+    """Запись оставшейся информации о чатах и статистики при остановке бота"""
+    await metrics.stop_server()
+    chat_tracker.flush()
+    request_rollups.flush()
+    schedule_image_renderer.shutdown()
+    parsing_service.shutdown()
+    db_manager.close()
+    if _update_recorder:
+        _update_recorder.close()
+
 # Обновите команду start для сохранения информации
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Команда /start"""
@@ -149,8 +220,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             "/today - расписание на сегодня\n"
             "/tomorrow - расписание на завтра\n"
             "/week - расписание на всю неделю\n"
+            "/week_image - картинка расписания на неделю\n"
             "/bells - расписание звонков\n"
             "/bells_today - звонки на сегодня\n"
+            "/now - текущая и следующая пара\n"
+            "/export - выгрузить расписание в календарь (ics) или json\n"
             "/update_info - информация об обновлении\n"
             "/mailing - управление ежедневной рассылкой\n"
             "/mailing_status - статус ежедневной рассылки\n"
@@ -159,7 +233,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         
         # Если пользователь администратор, показываем дополнительную информацию
-        if db_manager.is_admin(user_id):
+        if admin_registry.is_admin(user_id):
             text += "\n\n🛠️ Вы администратор!\n"
             text += "Используйте /service_help для просмотра сервисных команд"
         
@@ -195,14 +269,87 @@ async def chat_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         logger.error(f"Ошибка в обработчике chat_member: {e}")
 
+def _format_startinfo_page(chat_type, stats, chats, page):
+    """Текст страницы /startinfo"""
+    # Формируем заголовок
+    if chat_type:
+        title = f"📊 ЧАТЫ (тип: {chat_type})"
+    else:
+        title = "📊 ВСЕ ЧАТЫ"
+    
+    text_parts = [f"{title}\n"]
+    
+    # Добавляем статистику
+    if stats:
+        text_parts.append("\n📈 *СТАТИСТИКА:*")
+        text_parts.append(f"• Всего: {stats.get('total', 0)}")
+        for ctype, count in stats.items():
+            if ctype != 'total':
+                text_parts.append(f"• {ctype}: {count}")
+    
+    text_parts.append(f"\n👥 *СПИСОК ЧАТОВ (страница {page}):*")
+    
+    if not chats:
+        text_parts.append("\nℹ️ Чатов не найдено")
+    
+    first_number = (page - 1) * STARTINFO_PAGE_SIZE
+    for i, chat in enumerate(chats, first_number + 1):
+        chat_info = []
+        
+        # ID и тип
+        chat_info.append(f"{i}. 🆔 `{chat['chat_id']}`")
+        chat_info.append(f"   📝 Тип: {chat['chat_type']}")
+        
+        # Информация в зависимости от типа
+        if chat['chat_type'] == 'private':
+            if chat['first_name']:
+                chat_info.append(f"   👤 Имя: {chat['first_name']}")
+            if chat['last_name']:
+                chat_info.append(f"   📛 Фамилия: {chat['last_name']}")
+            if chat['username']:
+                chat_info.append(f"   🔖 @{chat['username']}")
+        else:
+            if chat['title']:
+                chat_info.append(f"   🏷️ Название: {chat['title']}")
+            if chat['username']:
+                chat_info.append(f"   🔖 @{chat['username']}")
+        
+        # Дата первого контакта
+        created = chat['created_at']
+        if isinstance(created, str):
+            created = datetime.fromisoformat(created.replace('Z', '+00:00'))
+        created_str = created.strftime("%d.%m.%Y %H:%M")
+        chat_info.append(f"   📅 Добавлен: {created_str}")
+        
+        text_parts.append("\n".join(chat_info))
+    
+    full_text = "\n".join(text_parts)
+    
+    # Длинные названия могут не поместиться в одно сообщение
+    if len(full_text) > 4096:
+        full_text = full_text[:4090] + "\n..."
+    return full_text
+
+def _startinfo_keyboard(chat_type, chats, page, has_older):
+    """Кнопки навигации /startinfo: курсор - (created_at, id) крайнего чата страницы"""
+    def cursor_data(direction, target_page, chat):
+        created = chat['created_at']
+        if isinstance(created, str):
+            created = datetime.fromisoformat(created.replace('Z', '+00:00'))
+        return f"si:{chat_type or 'all'}:{direction}:{target_page}:{created.strftime('%Y%m%d%H%M%S')}:{chat['id']}"
+    
+    buttons = []
+    if chats and page > 1:
+        buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data=cursor_data('p', page - 1, chats[0])))
+    if chats and has_older:
+        buttons.append(InlineKeyboardButton("Старее ➡️", callback_data=cursor_data('n', page + 1, chats[-1])))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
 # Добавьте команду startinfo
+@admin_only
 async def startinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Информация о всех чатах, которые использовали бота"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         # Получаем параметры фильтрации
         chat_type = None
         if context.args:
@@ -210,104 +357,58 @@ async def startinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             if filter_arg in ['private', 'group', 'supergroup', 'channel']:
                 chat_type = filter_arg
         
-        # Получаем статистику
+        # Дописываем отложенные изменения, чтобы список был актуальным
+        chat_tracker.flush()
+
+        # Получаем статистику и первую страницу
         stats = db_manager.get_bot_chats_count()
-        all_chats = db_manager.get_all_bot_chats(chat_type)
-        
-        # Формируем заголовок
-        if chat_type:
-            title = f"📊 ЧАТЫ (тип: {chat_type})"
-        else:
-            title = "📊 ВСЕ ЧАТЫ"
+        chats, has_older = db_manager.get_bot_chats_page(chat_type, limit=STARTINFO_PAGE_SIZE)
         
-        text_parts = [f"{title}\n"]
+        await update.message.reply_text(
+            _format_startinfo_page(chat_type, stats, chats, 1),
+            parse_mode='Markdown',
+            reply_markup=_startinfo_keyboard(chat_type, chats, 1, has_older)
+        )
+            
+    except Exception as e:
+        logger.error(f"Ошибка в команде startinfo: {e}")
+        await update.message.reply_text("❌ Ошибка при получении информации о чатах.")
+
+@admin_only
+async def startinfo_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Переход между страницами /startinfo"""
+    query = update.callback_query
+    try:
+        await query.answer()
         
-        # Добавляем статистику
-        if stats:
-            text_parts.append("\n📈 *СТАТИСТИКА:*")
-            text_parts.append(f"• Всего: {stats.get('total', 0)}")
-            for ctype, count in stats.items():
-                if ctype != 'total':
-                    text_parts.append(f"• {ctype}: {count}")
+        _, chat_type, direction, page, created, chat_row_id = query.data.split(':')
+        chat_type = None if chat_type == 'all' else chat_type
+        page = int(page)
+        cursor_key = (datetime.strptime(created, '%Y%m%d%H%M%S'), int(chat_row_id))
         
-        text_parts.append("\n👥 *СПИСОК ЧАТОВ:*")
+        stats = db_manager.get_bot_chats_count()
+        direction = 'next' if direction == 'n' else 'prev'
+        chats, has_more = db_manager.get_bot_chats_page(chat_type, cursor_key, direction, STARTINFO_PAGE_SIZE)
         
-        if not all_chats:
-            text_parts.append("\nℹ️ Чатов не найдено")
-        else:
-            for i, chat in enumerate(all_chats, 1):
-                chat_info = []
-                
-                # ID и тип
-                chat_info.append(f"{i}. 🆔 `{chat['chat_id']}`")
-                chat_info.append(f"   📝 Тип: {chat['chat_type']}")
-                
-                # Информация в зависимости от типа
-                if chat['chat_type'] == 'private':
-                    if chat['first_name']:
-                        chat_info.append(f"   👤 Имя: {chat['first_name']}")
-                    if chat['last_name']:
-                        chat_info.append(f"   📛 Фамилия: {chat['last_name']}")
-                    if chat['username']:
-                        chat_info.append(f"   🔖 @{chat['username']}")
-                else:
-                    if chat['title']:
-                        chat_info.append(f"   🏷️ Название: {chat['title']}")
-                    if chat['username']:
-                        chat_info.append(f"   🔖 @{chat['username']}")
-                
-                # Дата первого контакта
-                created = chat['created_at']
-                if isinstance(created, str):
-                    created = datetime.fromisoformat(created.replace('Z', '+00:00'))
-                created_str = created.strftime("%d.%m.%Y %H:%M")
-                chat_info.append(f"   📅 Добавлен: {created_str}")
-                
-                text_parts.append("\n".join(chat_info))
-                
-                # Ограничиваем вывод для предотвращения слишком длинных сообщений
-                if i >= 50:  # Максимум 50 чатов в одном сообщении
-                    text_parts.append(f"\n... и ещё {len(all_chats) - i} чатов")
-                    break
+        # При переходе к новым чатам более старые страницы точно есть
+        has_older = has_more if direction == 'next' else True
+        if direction == 'prev' and not has_more:
+            page = 1
         
-        full_text = "\n".join(text_parts)
+        await query.edit_message_text(
+            _format_startinfo_page(chat_type, stats, chats, page),
+            parse_mode='Markdown',
+            reply_markup=_startinfo_keyboard(chat_type, chats, page, has_older)
+        )
         
-        # Разбиваем на части если слишком длинное
-        if len(full_text) > 4096:
-            parts = []
-            current_part = ""
-            
-            for line in full_text.split('\n'):
-                if len(current_part) + len(line) + 1 < 4096:
-                    current_part += line + '\n'
-                else:
-                    parts.append(current_part)
-                    current_part = line + '\n'
-            
-            if current_part:
-                parts.append(current_part)
-            
-            for i, part in enumerate(parts, 1):
-                if i == 1:
-                    await update.message.reply_text(part, parse_mode='Markdown')
-                else:
-                    await update.message.reply_text(f"*Продолжение ({i}/{len(parts)})*:\n\n{part}", parse_mode='Markdown')
-                await asyncio.sleep(0.5)
-        else:
-            await update.message.reply_text(full_text, parse_mode='Markdown')
-            
     except Exception as e:
-        logger.error(f"Ошибка в команде startinfo: {e}")
-        await update.message.reply_text("❌ Ошибка при получении информации о чатах.")
+        logger.error(f"Ошибка переключения страницы startinfo: {e}")
 
 # Добавьте команду для очистки неактивных чатов
+@admin_only
 async def cleanup_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Очистка неактивных чатов (только для админов)"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         # Получаем все забаненные пользователи
         banned_users = db_manager.get_banned_users()
         cleaned_count = 0
@@ -317,6 +418,7 @@ async def cleanup_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             
             # Удаляем из tracking
             if db_manager.delete_bot_chat(chat_id):
+                chat_tracker.forget(chat_id)
                 cleaned_count += 1
         
         await update.message.reply_text(
@@ -331,15 +433,11 @@ async def cleanup_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 # СЕРВИСНЫЕ КОМАНДЫ ДЛЯ АДМИНИСТРАТОРОВ
 
+@admin_only
 async def service_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Справка по сервисным командам для администраторов"""
     try:
         await save_chat_info(update, context)
-        # Проверяем права администратора
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         text = (
             "🛠️ *СЕРВИСНЫЕ КОМАНДЫ ДЛЯ АДМИНИСТРАТОРОВ*\n\n"
             
@@ -363,8 +461,9 @@ async def service_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             
             "📊 *Мониторинг и статистика:*\n"
             "`/sysinfo` - подробная системная информация\n"
-            "`/stats [время_в_минутах]` - статистика запросов\n"
+            "`/stats [время_в_минутах] [exact=true]` - статистика запросов (exact=true - точный подсчет)\n"
             "`/settings_info` - информация о настройках\n"
+            "`/metrics` - время обработчиков, запросы к БД, кэш, рассылки\n"
             "`/find <user_id>` - Профиль по id\n"
             "`/startinfo [тип]` - список всех чатов бота\n"
             "`/cleanup_chats` - очистка неактивных чатов\n\n"
@@ -408,14 +507,10 @@ async def service_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         logger.error(f"Ошибка в команде service_help: {e}")
         await update.message.reply_text("❌ Ошибка при получении справки.")
 
+@admin_only
 async def setadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выдача админки"""
     try:
-        # Проверяем права администратора
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if not context.args:
             await update.message.reply_text("❌ Использование: /setadmin <user_id> [username]")
             return
@@ -423,7 +518,7 @@ async def setadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user_id = context.args[0]
         username = context.args[1] if len(context.args) > 1 else None
         
-        if db_manager.add_admin(user_id, username):
+        if admin_registry.add(user_id, username):
             await update.message.reply_text(f"✅ Пользователь {user_id} добавлен в администраторы.")
         else:
             await update.message.reply_text("❌ Ошибка при добавлении администратора.")
@@ -478,7 +573,7 @@ async def takeadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             return
         
         # Удаляем администратора
-        if db_manager.remove_admin(target_admin['user_id']):
+        if admin_registry.remove(target_admin['user_id']):
             await update.message.reply_text(
                 f"✅ Администратор успешно удален:\n"
                 f"• ID: {target_admin['user_id']}\n"
@@ -491,13 +586,10 @@ async def takeadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде takeadmin: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def floodon(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Включение анти-флуда"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if db_manager.update_flood_settings(enabled=True):
             await update.message.reply_text("✅ Анти-флуд система включена.")
         else:
@@ -507,13 +599,10 @@ async def floodon(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде floodon: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def floodoff(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выключение анти-флуда"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if db_manager.update_flood_settings(enabled=False):
             await update.message.reply_text("✅ Анти-флуд система выключена.")
         else:
@@ -523,13 +612,10 @@ async def floodoff(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде floodoff: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def floodsettings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Управление настройками анти-флуда"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if len(context.args) < 2:
             # Показать текущие настройки
             settings = db_manager.get_flood_settings()
@@ -563,13 +649,10 @@ async def floodsettings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         logger.error(f"Ошибка в команде floodsettings: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def settings_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Управление настройками чатов"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if len(context.args) < 2:
             await update.message.reply_text(
                 "❌ Использование: /settingschats <id_чата> <тип> [значение] [время]\n\n"
@@ -607,7 +690,7 @@ async def settings_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             # Показать информацию о текущих настройках
             group = group_manager.get_group(chat_id)
             mailing_info = mailing_manager.get_mailing_info(chat_id)
-            notifications_status = change_notifier.is_notification_enabled(chat_id)
+            notifications_status = get_change_notifier().is_notification_enabled(chat_id)
             
             result_text += (
                 f"📊 Текущие настройки:\n\n"
@@ -658,10 +741,10 @@ async def settings_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             else:
                 enabled = value.lower() == 'вкл'
                 if enabled:
-                    change_notifier.enable_notifications(chat_id)
+                    get_change_notifier().enable_notifications(chat_id)
                     result_text += f"✅ Уведомления об изменениях ВКЛЮЧЕНЫ для чата {chat_id}"
                 else:
-                    change_notifier.disable_notifications(chat_id)
+                    get_change_notifier().disable_notifications(chat_id)
                     result_text += f"✅ Уведомления об изменениях ВЫКЛЮЧЕНЫ для чата {chat_id}"
         
         elif setting_type == 'group':
@@ -696,13 +779,14 @@ async def settings_chats(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         logger.error(f"Ошибка в команде settingschats: {e}")
         await update.message.reply_text(f"❌ Ошибка при изменении настроек: {e}")
 
+@admin_only
 async def sysinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Подробная техническая информация о боте"""
+    # Системные модули нужны только администратору - не грузим их при старте
+    import platform
+    import socket
+    import psutil
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         # Собираем информацию частями
         info_parts = []
         
@@ -802,7 +886,8 @@ async def sysinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         try:
             process = psutil.Process()
             memory_info = process.memory_info()
-            cpu_percent = process.cpu_percent(interval=0.1)
+            # Замер CPU ждет interval - в потоке, чтобы не останавливать цикл событий
+            cpu_percent = await asyncio.to_thread(process.cpu_percent, 0.1)
             threads = process.num_threads()
             
             # Сетевые соединения
@@ -833,13 +918,18 @@ async def sysinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             info_parts.append(f"⚠️ Ошибка получения информации о процессе: {e}")
             info_parts.append("")
         
-        # 5. БАЗА ДАННЫХ MYSQL
-        info_parts.append("🗄️ *БАЗА ДАННЫХ MYSQL*")
+        # 5. БАЗА ДАННЫХ
+        info_parts.append(f"🗄️ *БАЗА ДАННЫХ {db_manager.BACKEND.upper()}*")
         info_parts.append("")
         
         try:
-            conn = db_manager.get_connection()
-            if conn:
+            conn = db_manager.get_connection() if db_manager.BACKEND == 'mysql' else None
+            if db_manager.BACKEND == 'sqlite':
+                storage = db_manager.get_storage_info()
+                info_parts.append(f"• Версия: {storage.get('version', 'неизвестна')}")
+                info_parts.append(f"• Журнал: {storage.get('journal_mode', 'неизвестен')}")
+                info_parts.append(f"• Размер БД: {storage.get('size_bytes', 0) / 1048576:.2f} MB")
+            elif conn:
                 cursor = conn.cursor(dictionary=True)
                 
                 # Версия MySQL
@@ -1025,13 +1115,10 @@ async def sysinfo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде sysinfo: {e}")
         await update.message.reply_text("❌ Ошибка при получении системной информации.")
         
+@admin_only
 async def delid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Удаление всех данных пользователя по ID"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if not context.args:
             await update.message.reply_text("❌ Использование: /delid <user_id>")
             return
@@ -1068,6 +1155,8 @@ async def delid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                     deleted_tables.append("banned_users")
                 
                 conn.commit()
+                settings_cache.invalidate(user_id)
+                flood_protection.forget(user_id)
                 
                 if deleted_tables:
                     await update.message.reply_text(
@@ -1092,13 +1181,10 @@ async def delid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
 # Обновите команду ban_user для поддержки времени бана
+@admin_only
 async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Бан пользователя с указанием времени в днях"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if not context.args:
             await update.message.reply_text(
                 "❌ Использование: /ban <user_id> [дни] [причина]\n\n"
@@ -1153,6 +1239,7 @@ async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         
         # Выполняем бан
         if db_manager.ban_user(user_id, reason, ban_duration_minutes):
+            flood_protection.forget(user_id)
             if days == 0:
                 ban_text = "навсегда"
             else:
@@ -1170,13 +1257,10 @@ async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде ban: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Разбан пользователя"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if not context.args:
             await update.message.reply_text("❌ Использование: /unban <user_id>")
             return
@@ -1184,6 +1268,7 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         user_id = context.args[0]
         
         if db_manager.unban_user(user_id):
+            flood_protection.forget(user_id)
             await update.message.reply_text(f"✅ Пользователь {user_id} разбанен.")
         else:
             await update.message.reply_text(f"❌ Пользователь {user_id} не найден в списке забаненных.")
@@ -1192,13 +1277,11 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         logger.error(f"Ошибка в команде unban: {e}")
         await update.message.reply_text("❌ Ошибка при выполнении команды.")
 
+@admin_only
 async def reboot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Перезагрузка бота через restart_service.py"""
+    import subprocess
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         await update.message.reply_text("🔄 Запуск перезагрузки...")
         
         # Проверяем существование файла
@@ -1206,9 +1289,10 @@ async def reboot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             await update.message.reply_text("❌ Файл restart_service.py не найден!")
             return
         
-        # Запускаем с минимальным выводом
+        # Запускаем с минимальным выводом (в потоке - остальные чаты обслуживаются, пока ждем)
         try:
-            result = subprocess.run(
+            result = await asyncio.to_thread(
+                subprocess.run,
                 [sys.executable, "restart_service.py"], 
                 timeout=30,
                 capture_output=True,
@@ -1232,13 +1316,10 @@ async def reboot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде reboot: {e}")
         await update.message.reply_text("❌ Ошибка при перезагрузке.")
 
+@admin_only
 async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Удаление сообщения бота по ответу на него"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-
         # Проверяем, что команда отправлена в ответ на сообщение
         if not update.message.reply_to_message:
             await update.message.reply_text(
@@ -1266,25 +1347,41 @@ async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         logger.error(f"Ошибка в команде delmsg: {e}")
         await update.message.reply_text("❌ Ошибка при удалении сообщения.")
 
+@admin_only
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Информация о запросах к боту"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         time_period = 60  # Статистика за последний час
-        if context.args:
+        exact = False  # exact=true - точный подсчет по сырым записям (для проверки)
+        for arg in context.args or []:
+            if arg.lower() in ('exact=true', 'exact'):
+                exact = True
+                continue
             try:
-                time_period = int(context.args[0])
+                time_period = int(arg)
             except ValueError:
                 pass
         
-        stats_data = db_manager.get_request_stats(time_period)
+        if exact:
+            stats_data = await asyncio.to_thread(db_manager.get_request_stats_exact, time_period)
+            source = "точно, по request_stats"
+        else:
+            # Дописываем счетчики из памяти, чтобы статистика была актуальной
+            await asyncio.to_thread(request_rollups.flush)
+            stats_data = db_manager.get_request_stats(time_period)
+            source = "агрегаты"
+            
+            # Короткие окна - топы из потоковой аналитики в памяти, без запросов к БД.
+            # Только если процесс один и записывал запросы все окно, иначе топы из агрегатов
+            single_process = not shared_state.shared and os.getenv('WEBHOOK_WORKER') is None
+            if single_process and request_analytics.covers(time_period):
+                stats_data['popular_commands'] = request_analytics.top('command', time_period)
+                stats_data['active_users'] = request_analytics.top('chat', time_period)
+                source = "агрегаты, топы ≈ из памяти"
         
         # ИСПРАВЛЕНИЕ: Убираем Markdown разметку и используем обычный текст
         text = (
-            f"📊 СТАТИСТИКА ЗАПРОСОВ (последние {time_period} мин)\n\n"
+            f"📊 СТАТИСТИКА ЗАПРОСОВ (последние {time_period} мин, {source})\n\n"
             f"• Всего запросов: {stats_data.get('recent_requests', 0)}\n"
             f"• Всего за всё время: {stats_data.get('total_requests', 0)}\n\n"
         )
@@ -1311,20 +1408,20 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Ошибка в команде stats: {e}")
         await update.message.reply_text("❌ Ошибка при получении статистики.")
 
+@admin_only
 async def crondownload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Исполнение файла cron_download"""
+    import subprocess
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         await update.message.reply_text("🔄 Запуск cron_download...")
         
         # Запускаем cron_download в отдельном процессе с указанием кодировки
         env = os.environ.copy()
         env['PYTHONIOENCODING'] = 'utf-8'
         
-        result = subprocess.run(
+        # Ожидание процесса (до 5 минут) в потоке, чтобы не блокировать остальные чаты
+        result = await asyncio.to_thread(
+            subprocess.run,
             [sys.executable, "cron_download.py"], 
             capture_output=True, 
             text=True, 
@@ -1386,13 +1483,10 @@ async def crondownload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         logger.error(f"Ошибка в команде crondownload: {e}")
         await update.message.reply_text(f"❌ Ошибка при выполнении cron_download: {str(e)}")
 
+@admin_only
 async def settings_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выдача информации о настройках"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         settings_info = db_manager.get_settings_info()
         
         text = (
@@ -1404,6 +1498,91 @@ async def settings_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             f"• Заблокированных: {settings_info.get('banned_users_count', 0)}\n\n"
         )
         
+        # Статистика кэша настроек чатов
+        cache_stats = settings_cache.get_stats()
+        text += (
+            "🗃️ *Кэш настроек чатов:*\n"
+            f"• Записей: {cache_stats['size']}/{cache_stats['max_size']}\n"
+            f"• Попадания/промахи: {cache_stats['hits']}/{cache_stats['misses']} "
+            f"({cache_stats['hit_ratio']:.0%})\n"
+            f"• Вытеснено: {cache_stats['evictions']}, сброшено: {cache_stats['invalidations']}\n\n"
+        )
+        
+        # Общее состояние процессов (анти-флуд, баны, версии кэшей)
+        state_stats = shared_state.get_stats()
+        text += (
+            "🔗 *Общее состояние:*\n"
+            f"• Хранилище: {state_stats['backend']}, ключей: {state_stats['keys']}\n"
+        )
+        if 'errors' in state_stats:
+            text += f"• Ошибок Redis: {state_stats['errors']}\n"
+        text += "\n"
+        
+        # Статистика кэша исходящих сообщений
+        payload_stats = payload_cache.get_stats()
+        text += (
+            "📨 *Кэш рассылок:*\n"
+            f"• Текстов: {payload_stats['size']}/{payload_stats['max_size']}\n"
+            f"• Попадания/промахи: {payload_stats['hits']}/{payload_stats['misses']} "
+            f"({payload_stats['hit_ratio']:.0%})\n"
+            f"• Сохранено загруженных файлов: {payload_stats['file_ids']}\n"
+        )
+        image_stats = schedule_image_renderer.get_stats()
+        text += (
+            f"• Картинок нарисовано: {image_stats['renders']} "
+            f"(в среднем {image_stats['avg_render_ms']:.0f} мс), из кэша: {image_stats['hits']}\n\n"
+        )
+        
+        # Разбор расписания: попадания в кэш, разборы и схлопнутые одновременные запросы
+        parsing_stats = parsing_service.get_stats()
+        flight_stats = parser.get_flight_stats()
+        text += (
+            "📖 *Разбор расписания:*\n"
+            f"• Из кэша: {parsing_stats['hits']}, разобрано в пуле: {parsing_stats['extractions']}\n"
+            f"• Дождались чужого разбора: в боте {parsing_stats['coalesced']}, "
+            f"в потоках {flight_stats['coalesced']} (макс. {flight_stats['max_waiters']} на ключ)\n"
+        )
+        warmup_report = cache_warmup.get_last_report()
+        if warmup_report:
+            text += (
+                f"• Последний прогрев: {warmup_report['finished_at']}, "
+                f"{warmup_report['duration']:.1f} с, записей {warmup_report['entries']}\n"
+            )
+        if cache_warmup.running:
+            text += "• Идет прогрев новой версии файла\n"
+        text += "\n"
+        
+        # Параллельная обработка обновлений: ожидание в очереди и длительность обработчиков
+        processing_stats = update_processor.get_stats()
+        text += (
+            "⚡ *Обработка обновлений:*\n"
+            f"• Одновременно: {processing_stats['active']}/{processing_stats['max_concurrent']}, "
+            f"ждут: {processing_stats['waiting']}, обработано: {processing_stats['processed']}\n"
+            f"• Ожидание p50/p95/макс: {processing_stats['wait_p50'] * 1000:.0f}/"
+            f"{processing_stats['wait_p95'] * 1000:.0f}/{processing_stats['wait_max'] * 1000:.0f} мс, "
+            f"дольше порога: {processing_stats['slow_waits']}\n"
+            f"• Обработка p50/p95: {processing_stats['duration_p50'] * 1000:.0f}/"
+            f"{processing_stats['duration_p95'] * 1000:.0f} мс\n\n"
+        )
+        
+        # Размер request_stats и отчет последней очистки
+        table_size = db_manager.get_table_size('request_stats')
+        text += (
+            "🗄️ *Хранение статистики запросов:*\n"
+            f"• Строк: ~{table_size.get('rows', 0)}, размер: {table_size.get('total_bytes', 0) / 1048576:.1f} МБ\n"
+            f"• Срок хранения: {request_retention.retention_days} дн.\n"
+        )
+        report = request_retention.get_last_report()
+        if report:
+            before = report.get('size_before', {})
+            after = report.get('size_after', {})
+            text += (
+                f"• Последняя очистка: {report['finished_at']}, удалено {report['deleted']}\n"
+                f"• Размер до/после: {before.get('total_bytes', 0) / 1048576:.1f}/"
+                f"{after.get('total_bytes', 0) / 1048576:.1f} МБ\n"
+            )
+        text += "\n"
+        
         # Получаем списки
         conn = db_manager.get_connection()
         if conn:
@@ -1440,13 +1619,51 @@ async def settings_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         logger.error(f"Ошибка в команде settings_info: {e}")
         await update.message.reply_text("❌ Ошибка при получении информации о настройках.")
 
+@admin_only
+async def metrics_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сводка метрик производительности бота (то же, что отдает /metrics по HTTP)"""
+    try:
+        text = "📈 *МЕТРИКИ БОТА*\n\n⏱️ *Обработчики (по суммарному времени):*\n"
+        rows = metrics.handler_summary()
+        for row in rows:
+            text += (
+                f"• `{row['handler']}`: {row['calls']} выз., ср. {row['avg'] * 1000:.0f} мс, "
+                f"p50 {row['p50'] * 1000:.0f} / p95 {row['p95'] * 1000:.0f} мс"
+                + (f", ошибок {row['errors']:.0f}" if row['errors'] else "") + "\n"
+            )
+        if not rows:
+            text += "• Вызовов пока не было\n"
+        
+        hits, misses = metrics.parser_cache.value('hit'), metrics.parser_cache.value('miss')
+        text += (
+            "\n🗄️ *База данных:*\n"
+            f"• Горячих запросов: {metrics.db_queries.value('prepared'):.0f} подготовленных, "
+            f"{metrics.db_queries.value('once'):.0f} на отдельном соединении, ошибок {metrics.db_errors.value():.0f}\n"
+            f"• Открыто соединений: {metrics.db_connections.value():.0f}\n\n"
+            "📖 *Расписание:*\n"
+            f"• Кэш парсера: {hits:.0f} попаданий, {misses:.0f} промахов"
+            f" ({hits / (hits + misses) if hits + misses else 0:.0%})\n"
+            f"• Загрузок Excel: в пуле {metrics.workbook_loads.value('pool'):.0f}, "
+            f"в боте {metrics.workbook_loads.value('parser'):.0f}\n\n"
+            "📬 *Отправка:*\n"
+            f"• Рассылка: {metrics.notifications.value('mailing', 'ok'):.0f} успешно, "
+            f"{metrics.notifications.value('mailing', 'error'):.0f} ошибок\n"
+            f"• Уведомления об изменениях: {metrics.notifications.value('changes', 'ok'):.0f} успешно, "
+            f"{metrics.notifications.value('changes', 'error'):.0f} ошибок\n"
+            f"• RetryAfter: рассылка {metrics.retry_after.value('mailing'):.0f}, "
+            f"уведомления {metrics.retry_after.value('changes'):.0f}, ответы {metrics.retry_after.value('handler'):.0f}\n"
+        )
+        
+        await update.message.reply_text(text, parse_mode='Markdown')
+        
+    except Exception as e:
+        logger.error(f"Ошибка в команде metrics: {e}")
+        await update.message.reply_text("❌ Ошибка при получении метрик.")
+
+@admin_only
 async def kick_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выход бота из группы/канала"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-            return
-        
         if not context.args:
             await update.message.reply_text("❌ Использование: /kick <chat_id>")
             return
@@ -1469,6 +1686,8 @@ async def contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
         
     """Контактная информация"""
+    import platform
+    import socket
     try:
         await save_chat_info(update, context)
         # Получаем информацию о системе
@@ -1596,7 +1815,7 @@ async def update_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         
         if group:
             # Используем умный детектор для получения информации
-            cache_info = change_notifier.detector.get_cache_info_for_group(group)
+            cache_info = get_change_notifier().detector.get_cache_info_for_group(group)
             text = (
                 f"🔄 Информация об обновлениях для группы {group}\n\n"
                 f"📅 Последнее обновление файла: {last_update}\n"
@@ -1718,10 +1937,10 @@ async def day_select(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         
         if day == 'all_week':
             # Показать всю неделю
-            text = get_full_week_schedule(group, week_type)
+            text = await get_full_week_schedule(group, week_type)
         else:
             # Показать конкретный день
-            lessons = parser.get_day_schedule(group, week_type, day)
+            lessons = await parsing_service.get_day_schedule(group, week_type, day)
             text = parser.format_schedule_text(group, week_type, day, lessons)
         
         # Добавляем информацию о последнем обновлении
@@ -1743,7 +1962,7 @@ async def day_select(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("❌ Ошибка при получении расписания. Попробуйте позже.")
         return ConversationHandler.END
 
-def get_full_week_schedule(group, week_type):
+async def get_full_week_schedule(group, week_type):
         
     """Получить расписание на всю неделю"""
     try:
@@ -1751,7 +1970,7 @@ def get_full_week_schedule(group, week_type):
         week_type_text = "чётная" if week_type == 'even' else "нечётная"
         
         # Используем оптимизированную функцию
-        week_schedule = parser.get_week_schedule(group, week_type)
+        week_schedule = await parsing_service.get_week_schedule(group, week_type)
         
         text = f"📅 Расписание на {week_type_text} неделю - {group}:\n\n"
         
@@ -1775,8 +1994,6 @@ async def today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # ДОБАВЛЕНО: Проверка флага перезагрузки
         check_reload_flag()
         
-        from datetime import datetime
-        
         chat_id = update.message.chat_id
         group = group_manager.get_group(chat_id)
         
@@ -1786,18 +2003,19 @@ async def today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             )
             return
         
-        # Соответствие номеров дням недели (понедельник=0, воскресенье=6)
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        today_index = datetime.now().weekday()
+        today_info = academic_calendar.today()
         
-        if today_index >= len(days):  # Воскресенье
-            await update.message.reply_text("Сегодня воскресенье - занятий нет! 🎉")
+        if not today_info.is_school_day:
+            if today_info.is_holiday:
+                await update.message.reply_text("Сегодня выходной день - занятий нет! 🎉")
+            else:
+                await update.message.reply_text("Сегодня воскресенье - занятий нет! 🎉")
             return
         
-        day = days[today_index]
-        week_type = parser.get_week_type()
+        day = today_info.day_name
+        week_type = today_info.week_type
         
-        lessons = parser.get_day_schedule(group, week_type, day)
+        lessons = await parsing_service.get_day_schedule(group, week_type, day)
         text = parser.format_schedule_text(group, week_type, day, lessons)
         
         last_update = parser.get_last_update()
@@ -1822,8 +2040,6 @@ async def tomorrow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # ДОБАВЛЕНО: Проверка флага перезагрузки
         check_reload_flag()
         
-        from datetime import datetime, timedelta
-        
         chat_id = update.message.chat_id
         group = group_manager.get_group(chat_id)
         
@@ -1833,20 +2049,19 @@ async def tomorrow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             )
             return
         
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        tomorrow_index = (datetime.now() + timedelta(days=1)).weekday()
+        tomorrow_info = academic_calendar.tomorrow()
         
-        if tomorrow_index >= len(days):  # Воскресенье
-            await update.message.reply_text("Завтра воскресенье - занятий нет! 🎉")
+        if not tomorrow_info.is_school_day:
+            if tomorrow_info.is_holiday:
+                await update.message.reply_text("Завтра выходной день - занятий нет! 🎉")
+            else:
+                await update.message.reply_text("Завтра воскресенье - занятий нет! 🎉")
             return
         
-        day = days[tomorrow_index]
+        day = tomorrow_info.day_name
+        week_type = tomorrow_info.week_type
         
-        # Определяем тип недели для завтра
-        tomorrow_date = datetime.now() + timedelta(days=1)
-        week_type = parser.get_week_type_for_date(tomorrow_date)
-        
-        lessons = parser.get_day_schedule(group, week_type, day)
+        lessons = await parsing_service.get_day_schedule(group, week_type, day)
         text = parser.format_schedule_text(group, week_type, day, lessons)
         
         last_update = parser.get_last_update()
@@ -1882,7 +2097,7 @@ async def week_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         week_type = parser.get_week_type()
         
         # Используем оптимизированную функцию
-        week_schedule_data = parser.get_week_schedule(group, week_type)
+        week_schedule_data = await parsing_service.get_week_schedule(group, week_type)
         text = parser.format_week_schedule_text(group, week_type, week_schedule_data)
         
         last_update = parser.get_last_update()
@@ -1903,6 +2118,52 @@ async def week_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             "Попробуйте позже или используйте /update_info для проверки статуса."
         )
 
+async def week_image(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await check_flood_protection(update, context):
+        return
+        
+    """Картинка расписания на неделю"""
+    try:
+        await save_chat_info(update, context)
+        check_reload_flag()
+        
+        chat_id = update.message.chat_id
+        group = group_manager.get_group(chat_id)
+        
+        if not group:
+            await update.message.reply_text(
+                "❌ Сначала выберите группу с помощью команды /setgroup"
+            )
+            return
+        
+        week_type = context.args[0].lower() if context.args else parser.get_week_type()
+        if week_type not in ('even', 'odd'):
+            await update.message.reply_text(
+                "❌ Укажите неделю: /week_image even или /week_image odd"
+            )
+            return
+        
+        # Картинка рисуется в отдельном процессе один раз на версию файла расписания
+        info = await schedule_image_renderer.get_image(group, week_type)
+        if not info:
+            await update.message.reply_text("❌ Файл расписания не найден. Попробуйте позже.")
+            return
+        
+        file_id_cache.keep_version(info['version'])
+        week_name = "Четная" if week_type == 'even' else "Нечетная"
+        await send_document(
+            context.bot,
+            chat_id,
+            f"image:{info['version']}:{group}:{week_type}",
+            info['path'],
+            info['filename'],
+            f"📅 {week_name} неделя - {group}",
+            as_photo=True
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в команде week_image: {e}")
+        await update.message.reply_text("❌ Ошибка при создании картинки расписания. Попробуйте позже.")
+
 async def bells(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not await check_flood_protection(update, context):
         return
@@ -1910,17 +2171,7 @@ async def bells(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Расписание звонков"""
     try:
         await save_chat_info(update, context)
-        text = "🔔 Расписание звонков:\n\n"
-        
-        for day, pairs in BELLS_SCHEDULE.items():
-            text += f"**{day}:**\n"
-            for pair_info in pairs:
-                text += f"• {pair_info['pair']}:\n"
-                text += f"  Первая половина: {pair_info['first_half']}\n"
-                text += f"  Вторая половина: {pair_info['second_half']}\n"
-            text += "\n"
-        
-        await update.message.reply_text(text, parse_mode='Markdown')
+        await update.message.reply_text(bells_index.all_days_text, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Ошибка в команде bells: {e}")
         await update.message.reply_text("❌ Ошибка при получении расписания звонков.")
@@ -1932,37 +2183,127 @@ async def bells_today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     """Расписание звонков на сегодня"""
     try:
         await save_chat_info(update, context)
-        from datetime import datetime
         
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        today_index = datetime.now().weekday()
+        day = academic_calendar.today().day_name
         
-        if today_index >= len(days):  # Воскресенье
+        if not bells_index.get_pairs(day):  # Воскресенье
             await update.message.reply_text("Сегодня воскресенье - звонков нет! 🎉")
             return
         
-        day = days[today_index]
-        pairs = BELLS_SCHEDULE.get(day, [])
+        await update.message.reply_text(bells_index.day_text(day))
+    except Exception as e:
+        logger.error(f"Ошибка в команде bells_today: {e}")
+        await update.message.reply_text("❌ Ошибка при получении расписания звонков на сегодня.")
+
+async def now(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await check_flood_protection(update, context):
+        return
+        
+    """Текущая и следующая пара"""
+    try:
+        await save_chat_info(update, context)
+        check_reload_flag()
+        
+        moment = datetime.now(TOMSK_TZ)
+        minute = moment.hour * 60 + moment.minute
+        day_info = academic_calendar.resolve(moment.date())
+        
+        if not day_info.is_school_day:
+            await update.message.reply_text("Сегодня занятий нет! 🎉")
+            return
+        
+        position = bells_index.locate(day_info.day_name, minute)
+        
+        # Занятия группы по номерам пар
+        group = group_manager.get_group(update.message.chat_id)
+        lessons_by_pair = {}
+        if group:
+            for lesson in await parsing_service.get_day_schedule(group, day_info.week_type, day_info.day_name):
+                lessons_by_pair[pair_number(lesson.pair)] = lesson
+        
+        def lesson_text(pair):
+            if not group:
+                return ""
+            lesson = lessons_by_pair.get(pair.number)
+            return f"{lesson.discipline}\n" if lesson else "Занятия нет\n"
         
-        text = f"🔔 Расписание звонков на {day}:\n\n"
+        text = f"🕒 Сейчас {moment.strftime('%H:%M')}, {day_info.day_name}\n\n"
         
-        for pair_info in pairs:
-            text += f"• {pair_info['pair']}:\n"
-            text += f"  Первая половина: {pair_info['first_half']}\n"
-            text += f"  Вторая половина: {pair_info['second_half']}\n\n"
+        if position.current:
+            pair = position.current
+            if position.half is None:
+                state = f"перерыв, вторая половина с {format_minutes(pair.second_half[0])}"
+            else:
+                state = f"{position.half}-я половина, до конца пары {pair.end - minute} мин"
+            text += f"▶️ Идёт {pair.title} ({format_minutes(pair.start)}-{format_minutes(pair.end)}): {state}\n"
+            text += lesson_text(pair) + "\n"
+        
+        if position.next:
+            pair = position.next
+            text += f"⏭️ Следующая: {pair.title} в {format_minutes(pair.start)} (через {pair.start - minute} мин)\n"
+            text += lesson_text(pair)
+        elif not position.current:
+            text += "Пары на сегодня закончились 🎉\n"
+        
+        if not group:
+            text += "\nℹ️ Выберите группу через /setgroup, чтобы видеть занятия"
         
         await update.message.reply_text(text)
     except Exception as e:
-        logger.error(f"Ошибка в команде bells_today: {e}")
-        await update.message.reply_text("❌ Ошибка при получении расписания звонков на сегодня.")
+        logger.error(f"Ошибка в команде now: {e}")
+        await update.message.reply_text("❌ Ошибка при получении текущей пары.")
 
-async def find_user_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Расширенная информация о пользователе"""
+async def export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await check_flood_protection(update, context):
+        return
+        
+    """Выгрузка расписания группы в ics или json"""
     try:
-        if not db_manager.is_admin(str(update.effective_user.id)):
-            await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+        await save_chat_info(update, context)
+        check_reload_flag()
+        
+        group = group_manager.get_group(update.message.chat_id)
+        if not group:
+            await update.message.reply_text(
+                "❌ Сначала выберите группу с помощью команды /setgroup"
+            )
+            return
+        
+        fmt = context.args[0].lower() if context.args else 'ics'
+        if fmt not in EXPORT_FORMATS:
+            await update.message.reply_text(
+                "❌ Неизвестный формат. Используйте: /export ics или /export json"
+            )
             return
         
+        # Файл строится один раз на версию расписания, дальше берется с диска
+        info = await schedule_exporter.get_export(group, fmt)
+        if not info:
+            await update.message.reply_text("❌ Файл расписания не найден. Попробуйте позже.")
+            return
+        
+        file_id_cache.keep_version(info['version'])
+        caption = (
+            f"📅 Расписание группы {group}\n"
+            "Откройте файл в приложении календаря, чтобы импортировать занятия"
+            if fmt == 'ics' else f"📄 Расписание группы {group} в JSON"
+        )
+        await send_document(
+            context.bot,
+            update.message.chat_id,
+            f"export:{info['version']}:{group}:{fmt}",
+            info['path'],
+            info['filename'],
+            caption
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в команде export: {e}")
+        await update.message.reply_text("❌ Ошибка при выгрузке расписания. Попробуйте позже.")
+
+@admin_only
+async def find_user_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Расширенная информация о пользователе"""
+    try:
         if not context.args:
             await update.message.reply_text("❌ Использование: /find <ID_пользователя>")
             return
@@ -1979,7 +2320,7 @@ async def find_user_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE)
             user = await context.bot.get_chat(user_id)
             user_group = group_manager.get_group(str(user.id))
             mailing_info = mailing_manager.get_mailing_info(str(user.id))
-            notifications_status = change_notifier.is_notification_enabled(str(user.id))
+            notifications_status = get_change_notifier().is_notification_enabled(str(user.id))
             is_banned = db_manager.is_banned(str(user.id))
             
             # Получаем подробную информацию о бане
@@ -2093,30 +2434,17 @@ async def find_user_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE)
             user_info.append("🕒 *Последняя активность:*")
             try:
                 # Получаем последние запросы пользователя
-                conn = db_manager.get_connection()
-                if conn:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute("""
-                        SELECT command, timestamp 
-                        FROM request_stats 
-                        WHERE chat_id = %s 
-                        ORDER BY timestamp DESC 
-                        LIMIT 1
-                    """, (str(user.id),))
-                    last_activity = cursor.fetchone()
-                    
-                    if last_activity:
-                        last_time = last_activity['timestamp']
-                        if isinstance(last_time, str):
-                            last_time = datetime.fromisoformat(last_time)
-                        last_time_str = last_time.strftime("%d.%m.%Y в %H:%M:%S")
-                        user_info.append(f"   📅 Последний запрос: {last_time_str}")
-                        user_info.append(f"   🎯 Команда: {last_activity['command'] or 'Неизвестно'}")
-                    else:
-                        user_info.append("   📅 Активность: не зафиксирована")
-                    
-                    cursor.close()
-                    conn.close()
+                last_activity = db_manager.get_last_request(str(user.id))
+                
+                if last_activity:
+                    last_time = last_activity['timestamp']
+                    if isinstance(last_time, str):
+                        last_time = datetime.fromisoformat(last_time)
+                    last_time_str = last_time.strftime("%d.%m.%Y в %H:%M:%S")
+                    user_info.append(f"   📅 Последний запрос: {last_time_str}")
+                    user_info.append(f"   🎯 Команда: {last_activity['command'] or 'Неизвестно'}")
+                else:
+                    user_info.append("   📅 Активность: не зафиксирована")
             except Exception as e:
                 logger.error(f"Ошибка получения последней активности: {e}")
                 user_info.append("   📅 Активность: ошибка получения")
@@ -2345,7 +2673,7 @@ async def changes_management(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         await save_chat_info(update, context)
         chat_id = update.message.chat_id
-        status_text = change_notifier.get_notification_status(chat_id)
+        status_text = get_change_notifier().get_notification_status(chat_id)
         
         keyboard = [
             [InlineKeyboardButton("🔔 Включить уведомления", callback_data='changes_enable')],
@@ -2380,7 +2708,7 @@ async def changes_button_handler(update: Update, context: ContextTypes.DEFAULT_T
         action = query.data
         
         if action == 'changes_enable':
-            change_notifier.enable_notifications(chat_id)
+            get_change_notifier().enable_notifications(chat_id)
             await query.edit_message_text(
                 "🔔 *Уведомления об изменениях включены!*\n\n"
                 "Теперь бот будет присылать уведомление в этот чат при изменении расписания вашей группы.",
@@ -2388,18 +2716,18 @@ async def changes_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             )
             
         elif action == 'changes_disable':
-            change_notifier.disable_notifications(chat_id)
+            get_change_notifier().disable_notifications(chat_id)
             await query.edit_message_text(
                 "🔕 *Уведомления об изменениях выключены!*",
                 parse_mode='Markdown'
             )
             
         elif action == 'changes_status':
-            status_text = change_notifier.get_notification_status(chat_id)
+            status_text = get_change_notifier().get_notification_status(chat_id)
             await query.edit_message_text(status_text, parse_mode='Markdown')
             
         elif action == 'changes_stats':
-            stats = change_notifier.get_statistics()
+            stats = get_change_notifier().get_statistics()
             
             text = (
                 "📈 *Статистика уведомлений об изменениях*\n\n"
@@ -2424,43 +2752,51 @@ async def changes_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             if update.message:
                 await update.message.reply_text("❌ Ошибка при обработке уведомлений.")
 
+async def get_tomorrow_payload(group: str, tomorrow_info) -> Payload:
+    """Текст рассылки на завтра для группы (один на группу и версию файла)"""
+    day = tomorrow_info.day_name
+    week_type = tomorrow_info.week_type
+    lessons = await parsing_service.get_day_schedule(group, week_type, day)
+    
+    def render():
+        text = parser.format_schedule_text(group, week_type, day, lessons)
+        
+        last_update = parser.get_last_update()
+        text = f"📅 Расписание на завтра ({day}) - {group}:\n\n{text}"
+        text += f"\n\n🔄 Последнее обновление: {last_update}"
+        return Payload(text)
+    
+    # Чаты одной группы получают один и тот же текст - формируем его один раз
+    return payload_cache.get_or_render(
+        group, parser.get_file_version(), tomorrow_info.date.isoformat(), 'mailing', render
+    )
+
 async def send_tomorrow_schedule(context: ContextTypes.DEFAULT_TYPE, chat_id: str):
     """Отправка расписания на завтра"""
     try:
-        from datetime import datetime, timedelta
-        
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        tomorrow_index = (datetime.now() + timedelta(days=1)).weekday()
+        tomorrow_info = academic_calendar.tomorrow()
         
-        if tomorrow_index >= len(days):  # Воскресенье
+        if not tomorrow_info.is_school_day:
+            day_off = "выходной день" if tomorrow_info.is_holiday else "воскресенье"
             await context.bot.send_message(
                 chat_id=chat_id,
-                text="📅 Расписание на завтра:\n\nЗавтра воскресенье - занятий нет! 🎉"
+                text=f"📅 Расписание на завтра:\n\nЗавтра {day_off} - занятий нет! 🎉"
             )
+            metrics.record_send('mailing')
             return
         
-        day = days[tomorrow_index]
-        
         # Получаем группу пользователя
         group = group_manager.get_group(chat_id)
         if not group:
             logger.warning(f"Рассылка для {chat_id} пропущена - группа не выбрана")
             return
         
-        # Определяем тип недели для завтра
-        tomorrow_date = datetime.now() + timedelta(days=1)
-        week_type = parser.get_week_type_for_date(tomorrow_date)
-        
-        lessons = parser.get_day_schedule(group, week_type, day)
-        text = parser.format_schedule_text(group, week_type, day, lessons)
-        
-        last_update = parser.get_last_update()
-        text = f"📅 Расписание на завтра ({day}) - {group}:\n\n{text}"
-        text += f"\n\n🔄 Последнее обновление: {last_update}"
-        
-        await context.bot.send_message(chat_id=chat_id, text=text)
+        payload = await get_tomorrow_payload(group, tomorrow_info)
+        await context.bot.send_message(chat_id=chat_id, text=payload.text, parse_mode=payload.parse_mode)
+        metrics.record_send('mailing')
         
     except Exception as e:
+        metrics.record_send('mailing', e)
         logger.error(f"Ошибка отправки рассылки для {chat_id}: {e}")
 
 async def mailing_job_callback(context: ContextTypes.DEFAULT_TYPE):
@@ -2471,6 +2807,18 @@ async def mailing_job_callback(context: ContextTypes.DEFAULT_TYPE):
     if mailing_manager.is_mailing_enabled(chat_id):
         await send_tomorrow_schedule(context, chat_id)
 
+def schedule_mailing_job(job_queue, chat_id: str, hour: int, minute: int):
+    """Создание ежедневной job рассылки для чата"""
+    job_time = dt_time(hour, minute, tzinfo=TOMSK_TZ)
+    
+    job_queue.run_daily(
+        mailing_job_callback,
+        time=job_time,
+        days=tuple(range(7)),  # Все дни недели
+        chat_id=chat_id,
+        name=f"mailing_{chat_id}"
+    )
+
 async def restart_mailing_job(context: ContextTypes.DEFAULT_TYPE, chat_id: str):
     """Перезапуск job рассылки для чата"""
     # Удаляем существующую job
@@ -2479,18 +2827,7 @@ async def restart_mailing_job(context: ContextTypes.DEFAULT_TYPE, chat_id: str):
     # Создаем новую job
     if mailing_manager.is_mailing_enabled(chat_id):
         mailing_time = mailing_manager.get_mailing_time(chat_id)
-        
-        # ИСПРАВЛЕНИЕ: Используем datetime.time вместо модуля time
-        from datetime import time
-        job_time = time(mailing_time.hour, mailing_time.minute, tzinfo=TOMSK_TZ)
-        
-        context.job_queue.run_daily(
-            mailing_job_callback,
-            time=job_time,
-            days=tuple(range(7)),  # Все дни недели
-            chat_id=chat_id,
-            name=f"mailing_{chat_id}"
-        )
+        schedule_mailing_job(context.job_queue, chat_id, mailing_time.hour, mailing_time.minute)
         
         logger.info(f"Создана job рассылки для {chat_id} на {mailing_time}")
 
@@ -2503,14 +2840,53 @@ async def remove_mailing_job(context: ContextTypes.DEFAULT_TYPE, chat_id: str):
     if current_jobs:
         logger.info(f"Удалена job рассылки для {chat_id}")
 
+async def warm_mailing_texts(version: str):
+    """Шаг прогрева: тексты рассылки на завтра для всех групп"""
+    tomorrow_info = academic_calendar.tomorrow()
+    if not tomorrow_info.is_school_day:
+        return
+    for group in group_manager.get_available_groups():
+        await get_tomorrow_payload(group, tomorrow_info)
+
+async def warm_exports(version: str):
+    """Шаг прогрева: выгрузки ics/json всех групп"""
+    for group in group_manager.get_available_groups():
+        for fmt in EXPORT_FORMATS:
+            await schedule_exporter.get_export(group, fmt)
+
+async def warm_images(version: str):
+    """Шаг прогрева: картинки недель всех групп"""
+    for group in group_manager.get_available_groups():
+        for week_type in ('even', 'odd'):
+            await schedule_image_renderer.get_image(group, week_type)
+
+async def post_init(application: Application):
+    """Запуск jobs рассылки, фонового прогрева кэша и HTTP /metrics при старте бота"""
+    await init_mailing_jobs(application)
+    cache_warmup.schedule('startup')
+    
+    # За прокси webhook у каждого процесса свой порт метрик
+    metrics_port = int(os.getenv('METRICS_PORT', METRICS['port']))
+    if metrics_port:
+        await metrics.start_server(METRICS['listen'], metrics_port + int(os.getenv('WEBHOOK_WORKER', '0')))
+
 async def init_mailing_jobs(application: Application):
     """Инициализация jobs рассылки при старте бота"""
-    enabled_chats = mailing_manager.get_all_enabled_chats()
+    # Все подписчики рассылки одним запросом вместо двух запросов на каждый чат
+    subscribers = mailing_manager.get_all_subscribers()
     
-    for chat_id in enabled_chats:
-        await restart_mailing_job(application, chat_id)
+    # За прокси webhook каждый процесс ведет рассылку только своих чатов
+    subscribers = [subscriber for subscriber in subscribers if owns_chat(subscriber['chat_id'])]
     
-    logger.info(f"Инициализировано {len(enabled_chats)} jobs рассылки")
+    for subscriber in subscribers:
+        schedule_mailing_job(
+            application.job_queue,
+            subscriber['chat_id'],
+            subscriber['time']['hour'],
+            subscriber['time']['minute']
+        )
+    
+    logger.info(f"Инициализировано {len(subscribers)} jobs рассылки")
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отмена диалога"""
@@ -2548,9 +2924,11 @@ def main() -> None:
     if not os.path.exists('cache'):
         os.makedirs('cache')
 
-    migration_result = db_manager.migrate_from_json()
-    if any(migration_result.values()):
-        logger.info(f"✅ Мигрированы данные: {migration_result}")
+    # Недостающие миграции схемы; при актуальной схеме - только чтение ее версии
+    schema_migrations.run()
+    
+    # Загружаем список администраторов в память
+    admin_registry.load()
     
     # Проверяем доступные группы при старте
     available_groups = group_manager.get_available_groups()
@@ -2559,8 +2937,21 @@ def main() -> None:
     if not available_groups:
         logger.error("❌ В конфиге не найдено ни одной группы!")
     
-    # Создаем Application
-    application = Application.builder().token(TOKEN).build()
+    # Создаем Application (BOT_API_URL - другой адрес Bot API, например заглушка нагрузочного теста);
+    # обновления разных чатов обрабатываются параллельно, одного чата - по очереди
+    builder = Application.builder().token(TOKEN).concurrent_updates(update_processor)
+    bot_api_url = os.getenv('BOT_API_URL', WEBHOOK['bot_api_url'])
+    if bot_api_url:
+        builder = builder.base_url(bot_api_url)
+    application = builder.build()
+    
+    # Запись входящих обновлений для воспроизведения в benchmarks/webhook_load.py
+    record_file = os.getenv('UPDATES_RECORD', WEBHOOK['record_file'])
+    if record_file:
+        global _update_recorder
+        from webhook_server import UpdateRecorder
+        _update_recorder = UpdateRecorder(record_file)
+        application.add_handler(TypeHandler(Update, _update_recorder.record), group=-1)
 
     # Обработчики команд
     application.add_handler(CommandHandler("start", start))
@@ -2569,8 +2960,11 @@ def main() -> None:
     application.add_handler(CommandHandler("today", today))
     application.add_handler(CommandHandler("tomorrow", tomorrow))
     application.add_handler(CommandHandler("week", week_schedule))
+    application.add_handler(CommandHandler("week_image", week_image))
     application.add_handler(CommandHandler("bells", bells))
     application.add_handler(CommandHandler("bells_today", bells_today))
+    application.add_handler(CommandHandler("now", now))
+    application.add_handler(CommandHandler("export", export))
     application.add_handler(CommandHandler("mailing_status", mailing_status))
     application.add_handler(CommandHandler("changes", changes_management))
     application.add_handler(CommandHandler("find", find_user_detailed))
@@ -2583,11 +2977,13 @@ def main() -> None:
     application.add_handler(CommandHandler("stats", stats))
     application.add_handler(CommandHandler("crondownload", crondownload))
     application.add_handler(CommandHandler("settings_info", settings_info))
+    application.add_handler(CommandHandler("metrics", metrics_info))
     application.add_handler(CommandHandler("ban", ban_user))
     application.add_handler(CommandHandler("unban", unban_user))
     application.add_handler(CommandHandler("kick", kick_chat))
     application.add_handler(CommandHandler("delid", delid))
     application.add_handler(CommandHandler("startinfo", startinfo))
+    application.add_handler(CallbackQueryHandler(startinfo_page, pattern='^si:'))
     application.add_handler(CommandHandler("cleanup_chats", cleanup_chats))
     application.add_handler(CommandHandler("service_help", service_help))
     application.add_handler(CommandHandler("delmsg", delete_message))
@@ -2635,13 +3031,60 @@ def main() -> None:
     
     # Обработчик ошибок
     application.add_error_handler(error_handler)
+    
+    # Длительность каждого обработчика в метриках (bot_handler_seconds)
+    metrics.instrument_handlers(application)
+
+    # Инициализация jobs рассылки и прогрев кэша при старте
+    cache_warmup.add_step('mailing', warm_mailing_texts)
+    if CACHE_WARMUP['exports']:
+        cache_warmup.add_step('exports', warm_exports)
+    if CACHE_WARMUP['images']:
+        cache_warmup.add_step('images', warm_images)
+    application.post_init = post_init
+    
+    # Фоновая запись информации о чатах
+    application.job_queue.run_repeating(
+        flush_chat_tracker,
+        interval=CHAT_TRACKER['flush_interval'],
+        first=CHAT_TRACKER['flush_interval'],
+        name="chat_tracker_flush"
+    )
+    application.post_shutdown = shutdown_buffers
+    
+    # Фоновая запись счетчиков статистики запросов
+    application.job_queue.run_repeating(
+        flush_request_rollups,
+        interval=REQUEST_ROLLUPS['flush_interval'],
+        first=REQUEST_ROLLUPS['flush_interval'],
+        name="request_rollups_flush"
+    )
+    
+    # Архивация и удаление устаревших записей request_stats (за прокси webhook - только в первом процессе)
+    if os.getenv('WEBHOOK_WORKER', '0') == '0':
+        application.job_queue.run_repeating(
+            prune_request_stats,
+            interval=REQUEST_STATS_RETENTION['prune_interval'],
+            first=300,
+            name="request_stats_prune"
+        )
+    
+    # Периодическое обновление списка администраторов
+    application.job_queue.run_repeating(
+        refresh_admins,
+        interval=ADMIN_REGISTRY['refresh_interval'],
+        first=ADMIN_REGISTRY['refresh_interval'],
+        name="admin_registry_refresh"
+    )
 
-    # Инициализация jobs рассылки при старте
-    application.post_init = init_mailing_jobs
-
-    # Запуск бота
-    logger.info("Бот запущен...")
-    application.run_polling()
+    # Запуск бота: long polling или webhook (BOT_MODE=webhook)
+    if os.getenv('BOT_MODE', WEBHOOK['mode']) == 'webhook':
+        import webhook_server
+        logger.info("Бот запущен (webhook)...")
+        webhook_server.run(application)
+    else:
+        logger.info("Бот запущен...")
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
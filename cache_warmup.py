@@ -0,0 +1,152 @@
+import os
+import json
+import asyncio
+import time
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Any, Optional
+from parsing_service import parsing_service
+from schedule_parser import cache_from_json, cache_to_json
+from shared_state import shared_state
+from config import SHARED_STATE
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmup:
+    """
+    Прогрев кэша при старте и после каждой смены файла расписания:
+    все группы разбираются в фоне, кэш парсера подменяется целиком,
+    затем выполняются шаги прогрева (готовые тексты, выгрузки).
+    До подмены обработчики отвечают из старого кэша.
+    С общим состоянием (redis) версию разбирает один процесс, остальные
+    берут готовый снимок schedule:snapshot:<версия>.
+    """
+
+    def __init__(self, service=None, state=None):
+        self.service = service or parsing_service
+        self.state = state or shared_state
+        self._steps = []  # [(название, async функция(version))]
+        self._task = None
+        self.last_report = None
+        self.service.on_new_version = lambda: self.schedule('version_change')
+
+    def add_step(self, name: str, step: Callable[[str], Awaitable[Any]]):
+        """Шаг прогрева после подмены кэша, получает версию файла"""
+        self._steps.append((name, step))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule(self, reason: str) -> bool:
+        """Запуск прогрева в фоне; False, если нет работающего цикла событий"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        self.service.begin_refresh(self.service.parser.get_file_version())
+        if not self.running:
+            # Прогрев, который уже идет, сам повторится, если файл сменился еще раз
+            self._task = loop.create_task(self._run(reason))
+        return True
+
+    async def _run(self, reason: str):
+        while True:
+            version = self.service.parser.get_file_version()
+            started = time.perf_counter()
+            steps = {}
+
+            try:
+                cache = await self._build(version) if version else {}
+            except Exception as e:
+                # Без готовых данных просто начинаем с пустого кэша
+                logger.error(f"❌ Ошибка прогрева кэша расписания: {e}")
+                cache = {}
+            await asyncio.to_thread(self.service.swap, version, cache)
+            steps['parse'] = time.perf_counter() - started
+
+            for name, step in self._steps:
+                step_started = time.perf_counter()
+                try:
+                    await step(version)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка шага прогрева {name}: {e}")
+                steps[name] = time.perf_counter() - step_started
+
+            duration = time.perf_counter() - started
+            self.last_report = {
+                'reason': reason,
+                'version': version,
+                'finished_at': datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+                'duration': duration,
+                'entries': len(cache),
+                'steps': steps
+            }
+            logger.info(
+                f"🔥 Прогрев кэша ({reason}) за {duration:.2f} с: {len(cache)} записей, "
+                + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in steps.items())
+            )
+
+            if self.service.parser.get_file_version() == version:
+                break
+            reason = 'version_change'
+
+    async def _build(self, version: str) -> Dict[str, Any]:
+        """Разбор всех групп версии; с общим состоянием - не более одного разбора на все процессы"""
+        if not self.state.shared:
+            return await self.service.build_cache(version)
+
+        cache = await asyncio.to_thread(self._load_snapshot, version)
+        if cache is not None:
+            return cache
+
+        lock = f"schedule:build:{version}"
+        deadline = time.monotonic() + SHARED_STATE['snapshot_wait']
+        acquired = self.state.add(lock, str(os.getpid()), ttl=SHARED_STATE['snapshot_wait'])
+        while not acquired:
+            # Эту версию уже разбирает другой процесс - ждем его снимок, но не дольше snapshot_wait
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(SHARED_STATE['poll_interval'])
+            cache = await asyncio.to_thread(self._load_snapshot, version)
+            if cache is not None:
+                return cache
+            acquired = self.state.add(lock, str(os.getpid()), ttl=SHARED_STATE['snapshot_wait'])
+
+        try:
+            cache = await self.service.build_cache(version)
+            await asyncio.to_thread(self._publish_snapshot, version, cache)
+        finally:
+            # Блокировку другого процесса не трогаем: и если разбор начат после snapshot_wait,
+            # и если наша блокировка истекла и ее уже взял другой процесс
+            if acquired and self.state.get(lock) == str(os.getpid()):
+                self.state.delete(lock)
+        return cache
+
+    def _load_snapshot(self, version: str) -> Optional[Dict[str, Any]]:
+        data = self.state.get(f"schedule:snapshot:{version}")
+        if data is None:
+            return None
+        try:
+            cache = cache_from_json(json.loads(data))
+        except (ValueError, TypeError) as e:
+            logger.error(f"❌ Поврежденный снимок расписания {version}: {e}")
+            return None
+        logger.info(f"📥 Кэш расписания {version} взят из общего снимка: {len(cache)} записей")
+        return cache
+
+    def _publish_snapshot(self, version: str, cache: Dict[str, Any]):
+        """Снимок версии и указатель на текущую версию; предыдущий снимок удаляется"""
+        previous = self.state.get('schedule:snapshot')
+        self.state.set(f"schedule:snapshot:{version}", json.dumps(cache_to_json(cache), ensure_ascii=False),
+                       ttl=SHARED_STATE['snapshot_ttl'])
+        self.state.set('schedule:snapshot', version)
+        if previous and previous != version:
+            self.state.delete(f"schedule:snapshot:{previous}")
+
+    def get_last_report(self) -> Optional[Dict[str, Any]]:
+        return self.last_report
+
+# Глобальный экземпляр прогрева кэша
+cache_warmup = CacheWarmup()
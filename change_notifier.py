@@ -9,6 +9,10 @@ from change_detector import ChangeDetector
 from group_manager import GroupManager
 from config import RANGES
 from database_manager import db_manager
+from metrics import metrics
+from settings_cache import settings_cache
+from academic_calendar import academic_calendar
+from payload_cache import payload_cache, Payload
 
 class ChangeNotifier:
     def __init__(self, settings_file='change_notification_settings.json'):
@@ -41,7 +45,11 @@ class ChangeNotifier:
 
     def is_notification_enabled(self, chat_id: str) -> bool:
         """Проверка, включены ли уведомления для чата"""
-        return db_manager.get_change_notifications(str(chat_id))
+        return settings_cache.get_or_load(
+            'notifications', chat_id,
+            lambda: bool(db_manager.get_change_notifications(str(chat_id), raise_errors=True)),
+            fallback=False
+        )
 
     def get_all_enabled_chats(self) -> List[str]:
         """Получение всех чатов с включенными уведомлениями"""
@@ -64,25 +72,20 @@ class ChangeNotifier:
         """
         if start_date is None:
             start_date = datetime.now() + timedelta(days=1)
-            
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
         
-        # Ищем в течение 14 дней (2 недели)
-        for i in range(14):
-            current_date = start_date + timedelta(days=i)
-            day_index = current_date.weekday()
-            
-            # Пропускаем воскресенье (индекс 6)
-            if day_index >= len(days):
+        # Ищем в течение 14 дней (2 недели); воскресенья и праздники календарь пропускает сам
+        checked = set()
+        for day in academic_calendar.iter_school_days(start_date, max_days=14):
+            # Расписание зависит только от типа недели и дня, повторно не запрашиваем
+            if (day.week_type, day.day_name) in checked:
                 continue
-                
-            day_name = days[day_index]
-            week_type = self.parser.get_week_type_for_date(current_date)
-            lessons = self.parser.get_day_schedule(group, week_type, day_name)
+            checked.add((day.week_type, day.day_name))
+            
+            lessons = self.parser.get_day_schedule(group, day.week_type, day.day_name)
             
             # Если есть занятия, возвращаем этот день
             if lessons:
-                return day_name, week_type, lessons
+                return day.day_name, day.week_type, lessons
                 
         return None, None, []
 
@@ -128,9 +131,12 @@ class ChangeNotifier:
         except Exception as e:
             print(f"⚠️ Не удалось очистить кэш парсера: {e}")
         
-        # Получаем все чаты, подписанные на эту группу
-        group_chats = self.get_chats_for_group(group)
-        enabled_chats = [chat_id for chat_id in group_chats if self.is_notification_enabled(chat_id)]
+        # Получаем все чаты группы с настройками одним запросом
+        subscribers = db_manager.get_group_subscribers(group)
+        enabled_chats = [
+            subscriber['chat_id'] for subscriber in subscribers
+            if subscriber['notifications_enabled'] and not subscriber['is_banned']
+        ]
         
         if not enabled_chats:
             print(f"Нет включенных чатов для уведомлений группы {group}")
@@ -139,54 +145,60 @@ class ChangeNotifier:
         print(f"Найдено {len(enabled_chats)} чатов для уведомления группы {group}")
 
         # Получаем актуальное расписание (после очистки кэша)
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        tomorrow_index = (datetime.now() + timedelta(days=1)).weekday()
-        
-        day_name = None
-        week_type = None
-        lessons = []
-        schedule_text = ""
-        
-        if tomorrow_index >= len(days):  # Воскресенье
-            # Ищем следующий учебный день
-            day_name, week_type, lessons = self.find_next_school_day(group)
-            if day_name:
-                schedule_text = self.parser.format_schedule_text(group, week_type, day_name, lessons)
-                extra_info = f"\n\n💡 На завтра (воскресенье) занятий нет, поэтому показываем расписание на следующий учебный день: {day_name}"
-            else:
-                schedule_text = "Завтра воскресенье - занятий нет! 🎉"
-                day_name = "Воскресенье"
-                extra_info = ""
-        else:
-            day_name = days[tomorrow_index]
-            tomorrow_date = datetime.now() + timedelta(days=1)
-            week_type = self.parser.get_week_type_for_date(tomorrow_date)
-            lessons = self.parser.get_day_schedule(group, week_type, day_name)
-            
-            # Проверяем, есть ли занятия
-            if not lessons:
+        tomorrow_info = academic_calendar.tomorrow()
+        
+        def render():
+            day_name = None
+            week_type = None
+            lessons = []
+            schedule_text = ""
+        
+            if not tomorrow_info.is_school_day:  # Воскресенье или праздник
+                day_off = "выходной день" if tomorrow_info.is_holiday else "воскресенье"
                 # Ищем следующий учебный день
-                next_day_name, next_week_type, next_lessons = self.find_next_school_day(group)
-                if next_day_name:
-                    schedule_text = self.parser.format_schedule_text(group, next_week_type, next_day_name, next_lessons)
-                    extra_info = f"\n\n💡 На завтра ({day_name}) занятий нет, поэтому показываем расписание на следующий учебный день: {next_day_name}"
-                    day_name = next_day_name
-                    week_type = next_week_type
+                day_name, week_type, lessons = self.find_next_school_day(group)
+                if day_name:
+                    schedule_text = self.parser.format_schedule_text(group, week_type, day_name, lessons)
+                    extra_info = f"\n\n💡 На завтра ({day_off}) занятий нет, поэтому показываем расписание на следующий учебный день: {day_name}"
                 else:
-                    schedule_text = f"На {day_name} занятий нет"
+                    schedule_text = f"Завтра {day_off} - занятий нет! 🎉"
+                    day_name = tomorrow_info.day_name
                     extra_info = ""
             else:
-                schedule_text = self.parser.format_schedule_text(group, week_type, day_name, lessons)
-                extra_info = ""
+                day_name = tomorrow_info.day_name
+                week_type = tomorrow_info.week_type
+                lessons = self.parser.get_day_schedule(group, week_type, day_name)
+            
+                # Проверяем, есть ли занятия
+                if not lessons:
+                    # Ищем следующий учебный день
+                    next_day_name, next_week_type, next_lessons = self.find_next_school_day(group)
+                    if next_day_name:
+                        schedule_text = self.parser.format_schedule_text(group, next_week_type, next_day_name, next_lessons)
+                        extra_info = f"\n\n💡 На завтра ({day_name}) занятий нет, поэтому показываем расписание на следующий учебный день: {next_day_name}"
+                        day_name = next_day_name
+                        week_type = next_week_type
+                    else:
+                        schedule_text = f"На {day_name} занятий нет"
+                        extra_info = ""
+                else:
+                    schedule_text = self.parser.format_schedule_text(group, week_type, day_name, lessons)
+                    extra_info = ""
 
-        last_update = self.parser.get_last_update()
-        
-        message_text = (
-            "🔄 *ОБНОВЛЕНИЕ РАСПИСАНИЯ!*\n\n"
-            f"Расписание для группы {group} было обновлено! Вот актуальное расписание:\n\n"
-            f"{schedule_text}"
-            f"{extra_info}\n"
-            f"🔄 Последнее обновление: {last_update}"
+            last_update = self.parser.get_last_update()
+        
+            message_text = (
+                "🔄 *ОБНОВЛЕНИЕ РАСПИСАНИЯ!*\n\n"
+                f"Расписание для группы {group} было обновлено! Вот актуальное расписание:\n\n"
+                f"{schedule_text}"
+                f"{extra_info}\n"
+                f"🔄 Последнее обновление: {last_update}"
+            )
+            return Payload(message_text, 'Markdown')
+        
+        # Текст одинаков для всех чатов группы и повторных проверок той же версии файла
+        payload = payload_cache.get_or_render(
+            group, self.parser.get_file_version(), tomorrow_info.date.isoformat(), 'change', render
         )
 
         # Отправляем уведомления во все включенные чаты этой группы
@@ -198,12 +210,14 @@ class ChangeNotifier:
             try:
                 await bot.send_message(
                     chat_id=chat_id,
-                    text=message_text,
-                    parse_mode='Markdown'
+                    text=payload.text,
+                    parse_mode=payload.parse_mode
                 )
                 success_count += 1
+                metrics.record_send('changes')
                 print(f"✅ Уведомление для группы {group} отправлено в чат {chat_id}")
             except Exception as e:
+                metrics.record_send('changes', e)
                 error_msg = f"Ошибка отправки уведомления в чат {chat_id}: {e}"
                 print(f"❌ {error_msg}")
                 failed_chats.append((chat_id, str(e)))
@@ -331,14 +345,10 @@ class ChangeNotifier:
             # Получаем все чаты с группами из базы данных
             enabled_chats = self.get_all_enabled_chats()
             
-            # Статистика по группам
-            groups_stats = {}
+            # Статистика по группам (один агрегирующий запрос)
+            counts_by_group = db_manager.get_notification_counts_by_group()
             available_groups = self.group_manager.get_available_groups()
-            
-            for group in available_groups:
-                group_chats = self.get_chats_for_group(group)
-                enabled_in_group = len([chat_id for chat_id in group_chats if self.is_notification_enabled(chat_id)])
-                groups_stats[group] = enabled_in_group
+            groups_stats = {group: counts_by_group.get(group, 0) for group in available_groups}
             
             # Получаем общее количество чатов из базы данных
             try:
@@ -0,0 +1,100 @@
+import threading
+import logging
+from typing import Dict, Any
+from database_manager import db_manager
+from config import CHAT_TRACKER
+
+logger = logging.getLogger(__name__)
+
+class ChatTracker:
+    """
+    Отслеживание метаданных чатов (тип, username, имена, название).
+    В БД пишутся только новые или изменившиеся чаты, пачкой при flush().
+    """
+
+    def __init__(self, max_tracked: int = 50000):
+        self.max_tracked = max_tracked
+        self._fingerprints = {}  # chat_id -> метаданные, уже записанные в БД
+        self._pending = {}       # chat_id -> строка для записи
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.queued = 0
+        self.written = 0
+
+    @staticmethod
+    def _fingerprint(row: Dict[str, Any]):
+        return (row['chat_type'], row['username'], row['first_name'], row['last_name'], row['title'])
+
+    def track(self, chat_id: str, chat_type: str, username: str = None,
+              first_name: str = None, last_name: str = None, title: str = None) -> bool:
+        """Запомнить чат; возвращает True, если он поставлен в очередь на запись"""
+        row = {
+            'chat_id': str(chat_id),
+            'chat_type': chat_type,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'title': title
+        }
+        fingerprint = self._fingerprint(row)
+
+        with self._lock:
+            pending = self._pending.get(row['chat_id'])
+            if pending is not None:
+                if self._fingerprint(pending) == fingerprint:
+                    self.skipped += 1
+                    return False
+            elif self._fingerprints.get(row['chat_id']) == fingerprint:
+                self.skipped += 1
+                return False
+
+            self._pending[row['chat_id']] = row
+            self.queued += 1
+            return True
+
+    def forget(self, chat_id: str):
+        """Забыть чат (например, после удаления из bot_chats)"""
+        with self._lock:
+            self._fingerprints.pop(str(chat_id), None)
+            self._pending.pop(str(chat_id), None)
+
+    def flush(self) -> int:
+        """Записать накопленные изменения в БД одним пакетом"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        if not pending:
+            return 0
+
+        rows = list(pending.values())
+        if not db_manager.save_bot_chats(rows):
+            # Возвращаем в очередь, если за это время не пришли более свежие данные
+            with self._lock:
+                for chat_id, row in pending.items():
+                    self._pending.setdefault(chat_id, row)
+            return 0
+
+        with self._lock:
+            if len(self._fingerprints) + len(rows) > self.max_tracked:
+                # Проще переписать часть чатов повторно, чем держать неограниченный словарь
+                self._fingerprints.clear()
+            for row in rows:
+                self._fingerprints[row['chat_id']] = self._fingerprint(row)
+            self.written += len(rows)
+
+        logger.info(f"💾 Сохранена информация о {len(rows)} чатах")
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика трекера"""
+        return {
+            'tracked': len(self._fingerprints),
+            'pending': len(self._pending),
+            'skipped': self.skipped,
+            'queued': self.queued,
+            'written': self.written
+        }
+
+# Глобальный экземпляр трекера чатов
+chat_tracker = ChatTracker(max_tracked=CHAT_TRACKER['max_tracked'])
@@ -123,6 +123,152 @@ WEEK_CONFIG = {
     'base_week_number': 36      # Номер недели в году для базовой недели
 }
 
+# Учебный календарь
+ACADEMIC_CALENDAR = {
+    'year_start_month': 9,   # Начало учебного года (месяц)
+    'year_start_day': 1,     # Начало учебного года (день)
+    'holidays': [
+        # Дни без занятий: 'ГГГГ-ММ-ДД' или диапазон ('ГГГГ-ММ-ДД', 'ГГГГ-ММ-ДД')
+    ]
+}
+
+# Горячие запросы к БД (бан, группа, статистика, настройки)
+DATABASE_SESSION = {
+    'prepared_statements': True,   # Подготовленные запросы на долгоживущем соединении потока (False - соединение на запрос)
+    'max_statements': 32           # Максимум подготовленных запросов на соединение
+}
+
+# Встроенное хранилище SQLite (DB_BACKEND=sqlite, файл - DB_SQLITE_PATH)
+SQLITE_STORAGE = {
+    'busy_timeout_ms': 5000,   # Ожидание блокировки записи другим потоком/процессом
+    'synchronous': 'NORMAL',   # NORMAL в режиме WAL не теряет целостность при сбое, быстрее FULL
+    'cache_size_kb': 16384     # Кэш страниц на соединение
+}
+
+# Общее состояние нескольких процессов бота: лимиты анти-флуда, баны, версии кэшей
+SHARED_STATE = {
+    'backend': 'memory',                      # memory - в памяти процесса (один процесс), redis - общее (env SHARED_STATE)
+    'redis_url': 'redis://localhost:6379/0',  # Адрес Redis (env REDIS_URL)
+    'prefix': 'schedule_bot:',                # Префикс ключей
+    'poll_interval': 1,                       # Как часто процесс сверяет версию настроек и сигнал перезагрузки, секунд
+    'ban_cache_seconds': 30,                  # Сколько помнить результат проверки бана
+    'snapshot_ttl': 7 * 24 * 3600,            # Срок хранения разобранного расписания в общем состоянии
+    'snapshot_wait': 60                       # Сколько ждать разбор, который уже строит другой процесс, секунд
+}
+
+# Получение обновлений: long polling или webhook
+WEBHOOK = {
+    'mode': 'polling',             # polling или webhook (env BOT_MODE)
+    'listen': '0.0.0.0',           # Адрес HTTP сервера (env WEBHOOK_LISTEN)
+    'port': 8443,                  # Порт HTTP сервера (env WEBHOOK_PORT)
+    'path': 'telegram',            # Путь запроса от Telegram
+    'url': '',                     # Публичный https адрес без пути для setWebhook (env WEBHOOK_URL), пусто - не регистрировать
+    'secret_token': '',            # Заголовок X-Telegram-Bot-Api-Secret-Token (env WEBHOOK_SECRET), пусто - без проверки
+    'max_connections': 40,         # Одновременных соединений от Telegram
+    'workers': 1,                  # Процессов бота за локальным прокси (env WEBHOOK_WORKERS), больше 1 - лучше с SHARED_STATE=redis
+    'worker_port': 8450,           # Порт первого процесса за прокси, у следующих +1, +2...
+    'record_file': '',             # Запись входящих обновлений в JSONL для benchmarks/webhook_load.py (env UPDATES_RECORD)
+    'bot_api_url': ''              # Другой адрес Bot API (env BOT_API_URL), например заглушка нагрузочного теста
+}
+
+# Параллельная обработка входящих обновлений
+UPDATE_PROCESSING = {
+    'max_concurrent': 16,         # Сколько обновлений обрабатывается одновременно (1 - по очереди)
+    'max_pending': 1000,          # Сколько обновлений может одновременно ждать обработки
+    'per_chat_ordering': True,    # Обновления одного чата строго по очереди (диалоги /setgroup, /schedule, /mailing)
+    'slow_wait_seconds': 2,       # Предупреждение в лог, если обновление ждало обработки дольше
+    'stats_window': 1000          # По скольким последним обновлениям считать перцентили ожидания
+}
+
+# Метрики производительности бота (Prometheus /metrics и команда /metrics)
+METRICS = {
+    'listen': '127.0.0.1',        # Адрес HTTP /metrics (только локально)
+    'port': 9101,                 # Порт (env METRICS_PORT), за прокси webhook у процессов +1, +2...; 0 - без HTTP
+    'buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Границы гистограмм, секунд
+}
+
+# Кэш настроек чатов (группа, рассылка, уведомления)
+SETTINGS_CACHE = {
+    'ttl_seconds': 300,           # Время жизни записи в секундах
+    'max_size': 10000,            # Максимальное количество записей
+    'version_check_interval': 0   # Проверка версии настроек в БД раз в N секунд (0 - выключено, один процесс)
+}
+
+# Отложенная запись информации о чатах (bot_chats)
+CHAT_TRACKER = {
+    'flush_interval': 30,   # Интервал фоновой записи изменений в секундах
+    'max_tracked': 50000    # Максимум чатов, для которых хранится отпечаток метаданных
+}
+
+# Реестр администраторов в памяти
+ADMIN_REGISTRY = {
+    'refresh_interval': 300,      # Интервал обновления списка из БД в секундах
+    'version_check_interval': 0   # Проверка изменений списка другими процессами раз в N секунд
+                                  # (0 - выключено, один процесс; с общим состоянием Redis - poll_interval)
+}
+
+# Предагрегированная статистика запросов
+REQUEST_ROLLUPS = {
+    'flush_interval': 60,               # Интервал записи счетчиков в БД в секундах
+    'minute_retention_minutes': 2880,   # Срок хранения минутных срезов (более длинные окна - по часам)
+    'prune_interval': 3600              # Как часто удалять устаревшие минутные срезы, в секундах
+}
+
+# Хранение сырых записей request_stats
+REQUEST_STATS_RETENTION = {
+    'retention_days': 90,                     # Сколько дней хранить записи в БД
+    'archive': True,                          # Выгружать удаляемые записи в архив
+    'archive_dir': 'cache/request_archive',   # Каталог архива (gzip JSONL по дням)
+    'batch_size': 5000,                       # Записей за один DELETE
+    'batch_pause': 0.2,                       # Пауза между пачками в секундах
+    'prune_interval': 21600,                  # Интервал фоновой очистки в секундах
+    'dictionary_cache_size': 10000,           # Максимум id команд/user agent в памяти
+    'command_max_length': 64                  # Длина сохраняемого текста сообщений, которые не команды
+}
+
+# Приближенные топ команд и чатов в памяти (count-min sketch + space-saving)
+REQUEST_ANALYTICS = {
+    'bucket_seconds': 60,   # Длина среза
+    'buckets': 60,          # Срезов в окне (окно = bucket_seconds * buckets)
+    'sketch_width': 256,    # Ширина count-min sketch
+    'sketch_depth': 4,      # Количество хэш-функций
+    'capacity': 50          # Кандидатов в топ на срез
+}
+
+# Выгрузка расписания в iCalendar/JSON (/export)
+SCHEDULE_EXPORT = {
+    'export_dir': 'cache/export',   # Каталог файлов выгрузки
+    'timezone': 'Asia/Tomsk',       # Часовой пояс событий календаря
+    'utc_offset': '+0700'           # Смещение пояса от UTC
+}
+
+# Прогрев кэша при старте и после смены файла расписания
+CACHE_WARMUP = {
+    'exports': True,   # Заранее создавать выгрузки ics/json всех групп
+    'images': False    # Заранее рисовать картинки недель всех групп
+}
+
+# Разбор Excel-файла в отдельных процессах
+PARSING_SERVICE = {
+    'max_workers': 1   # Процессов разбора (каждый держит открытой последнюю книгу)
+}
+
+# Картинки расписания на неделю (/week_image)
+SCHEDULE_IMAGE = {
+    'image_dir': 'cache/images',   # Каталог готовых PNG
+    'max_workers': 2,              # Процессов для рисования
+    'font_path': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Шрифт с кириллицей
+    'font_size': 14
+}
+
+# Кэш готовых текстов рассылок и уведомлений
+PAYLOAD_CACHE = {
+    'max_entries': 500   # Максимум текстов в памяти (группа x день x вид)
+}
+
+# Количество чатов на странице /startinfo
+STARTINFO_PAGE_SIZE = 20
+
 # Пути к файлам
 EXCEL_FILE = 'cache/schedule.xlsx'
 CACHE_FILE = 'cache/schedule_hash.cache'
@@ -4,11 +4,9 @@ import sys
 import hashlib
 from datetime import datetime
 from config import EXCEL_FILE, LAST_UPDATE_FILE, TOKEN
-from change_notifier import ChangeNotifier
 import tempfile
 import shutil
 import logging
-from openpyxl import load_workbook
 
 # Настройка логирования
 logging.basicConfig(
@@ -54,6 +52,7 @@ def download_schedule():
         # ШАГ 2: Проверяем что файл валиден
         print("🔍 Проверка валидности Excel файла...")
         try:
+            from openpyxl import load_workbook
             wb = load_workbook(temp_path)
             sheet = wb.active
             
@@ -91,6 +90,7 @@ def download_schedule():
         
         # ШАГ 4: Проверяем изменения и отправляем уведомления (ПЕРЕД очисткой кэша)
         print("\n🔍 ПРОВЕРКА ИЗМЕНЕНИЙ ДЛЯ ВСЕХ ГРУПП...")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         
         # Принудительно проверяем изменения (новый файл против старого кэша)
@@ -113,6 +113,7 @@ def download_schedule():
         
         # ШАГ 6: Устанавливаем флаг перезагрузки для бота
         print("\n🔍 ПРОВЕРКА ИЗМЕНЕНИЙ ДЛЯ ВСЕХ ГРУПП...")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         changes_detected = notifier.check_changes_after_download(TOKEN)
 
@@ -123,9 +124,9 @@ def download_schedule():
             
         print("\n🔄 Установка флага перезагрузки кэша для бота...")
         try:
-            reload_flag = 'cache/reload_cache.flag'
-            with open(reload_flag, 'w') as f:
-                f.write(datetime.now().isoformat())
+            # Файл-флаг или счетчик в общем состоянии (SHARED_STATE=redis) - его видят все процессы бота
+            from shared_state import reload_signal
+            reload_signal.publish()
             print("✅ Флаг перезагрузки кэша установлен - бот обновит данные при следующем запросе")
         except Exception as e:
             print(f"⚠️ Не удалось установить флаг перезагрузки: {e}")
@@ -150,6 +151,7 @@ def check_changes_only():
             print("❌ Файл расписания не найден")
             return False
             
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         changes_detected = notifier.check_and_notify(TOKEN)
         
@@ -169,6 +171,7 @@ def force_check_changes():
     """Принудительная проверка изменений"""
     try:
         print("🎯 ПРИНУДИТЕЛЬНАЯ ПРОВЕРКА ИЗМЕНЕНИЙ")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         changes_detected = notifier.force_check_and_notify(TOKEN)
         
@@ -188,6 +191,7 @@ def show_statistics():
     """Показать статистику уведомлений"""
     try:
         print("=== Статистика уведомлений ===")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         stats = notifier.get_statistics()
         
@@ -213,6 +217,7 @@ def test_notification():
     """Тестовая отправка уведомления"""
     try:
         print("=== Тестовая отправка уведомления ===")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         return notifier.send_test_notification(TOKEN)
     except Exception as e:
@@ -225,6 +230,7 @@ def force_detect_changes():
     """Принудительная детекция изменений для всех групп"""
     try:
         print("🎯 ПРИНУДИТЕЛЬНАЯ ДЕТЕКЦИЯ ИЗМЕНЕНИЙ ДЛЯ ВСЕХ ГРУПП")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         return notifier.force_detect_changes()
     except Exception as e:
@@ -237,6 +243,7 @@ def debug_group(group_name):
     """Отладочная функция: показать ячейки группы"""
     try:
         print(f"🔍 ОТЛАДКА ГРУППЫ: {group_name}")
+        from change_notifier import ChangeNotifier
         notifier = ChangeNotifier()
         notifier.debug_group(group_name)
     except Exception as e:
@@ -11,6 +11,8 @@ class DatabaseConfig:
         self.password = os.getenv('DB_PASSWORD', 'password')
         self.database = os.getenv('DB_NAME', 'database')
         self.port = os.getenv('DB_PORT', 3306)
+        self.backend = os.getenv('DB_BACKEND', 'mysql')               # mysql или sqlite
+        self.sqlite_path = os.getenv('DB_SQLITE_PATH', 'bot.sqlite3')  # Файл базы для DB_BACKEND=sqlite
         
     def get_connection(self):
         """Получить соединение с базой данных"""
@@ -1,21 +1,159 @@
 import mysql.connector
 from mysql.connector import Error
 from database_config import db_config
+from settings_cache import settings_cache
+from shared_state import shared_state
+from metrics import metrics
+from config import SETTINGS_CACHE, REQUEST_ROLLUPS, REQUEST_STATS_RETENTION, DATABASE_SESSION, SHARED_STATE
 import logging
+import threading
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
+    """
+    Хранилище бота на MySQL. Публичные методы класса - интерфейс хранилища:
+    другие реализации (SQLiteManager) наследуют его и переопределяют запросы,
+    которые отличаются в их диалекте SQL.
+    """
+    BACKEND = 'mysql'
+    # Схема (create_tables, INDEXES, COLUMNS) - текущая: новая база получает ее целиком миграцией 1,
+    # а в базе, где миграция 1 уже записана, create_tables больше не выполняется.
+    # Поэтому любое изменение схемы - это еще и новая Migration в schema_migrations.py,
+    # которая безопасна и для базы, уже созданной с этим изменением.
+    # Покрывающие индексы для массовых выборок подписчиков: (таблица, имя, колонки)
+    INDEXES = [
+        ('user_groups', 'idx_group_chat', '(group_name, chat_id)'),
+        ('change_notifications', 'idx_enabled_chat', '(enabled, chat_id)'),
+        ('mailing_settings', 'idx_enabled_time', '(enabled, hour, minute, chat_id)'),
+        ('bot_chats', 'idx_created_id', '(created_at, id)'),
+        ('bot_chats', 'idx_type_created_id', '(chat_type, created_at, id)'),
+    ]
+    # Колонки, добавленные в существующие таблицы: (таблица, колонка, определение)
+    COLUMNS = [
+        ('request_stats', 'command_id', 'INT NULL AFTER chat_id'),
+        ('request_stats', 'user_agent_id', 'INT NULL AFTER command_id'),
+    ]
+    # Команда запроса: из словаря, а для старых несжатых строк - из текстовой колонки
+    REQUEST_COMMAND_SQL = "COALESCE(cmd.value, rs.command)"
+    REQUEST_COMMAND_JOIN = "LEFT JOIN request_dictionary cmd ON cmd.id = rs.command_id"
+    # Ошибки разрыва соединения, после которых подготовленный запрос повторяется на новом соединении
+    LOST_CONNECTION_ERRORS = (2006, 2013, 2055)
+    # Фрагменты SQL, которые отличаются в других хранилищах
+    INSERT_IGNORE = "INSERT IGNORE"
+    CHAT_TYPE_INDEX = "FORCE INDEX (idx_chat_type)"
+    ROLLUP_UPSERT = "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+
     def __init__(self):
         self.config = db_config
-        self.init_database()
-        self.create_tables()
+        self._dictionary_ids = {}  # (вид, значение) -> id в request_dictionary
+        self.prepared_statements = DATABASE_SESSION['prepared_statements']
+        self._session = threading.local()  # Соединение потока и его подготовленные запросы
+        # Таблицы не создаются при импорте: схему обновляют миграции (schema_migrations.py) при запуске бота
 
     def get_connection(self):
+        metrics.db_connections.inc()
         return self.config.get_connection()
 
+    # Горячие запросы: подготовленные операторы на долгоживущем соединении потока
+    def _session_connection(self):
+        """Соединение текущего потока (autocommit, чтобы чтения не держали старый снимок данных)"""
+        conn = getattr(self._session, 'conn', None)
+        if conn is None:
+            conn = self.get_connection()
+            if not conn:
+                return None
+            conn.autocommit = True
+            self._session.conn = conn
+            self._session.statements = {}  # текст запроса -> подготовленный курсор
+        return conn
+
+    def close_session(self):
+        """Закрытие соединения текущего потока вместе с подготовленными запросами"""
+        conn = getattr(self._session, 'conn', None)
+        statements = getattr(self._session, 'statements', {})
+        self._session.conn = None
+        self._session.statements = {}
+        for cursor in statements.values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        if conn is not None:
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def close(self):
+        """Закрытие соединений менеджера при остановке бота"""
+        self.close_session()
+
+    @staticmethod
+    def _fetch(cursor, fetch: Optional[str]):
+        if fetch is None:
+            return cursor.lastrowid
+        rows = cursor.fetchall()  # Дочитываем результат, иначе курсор нельзя выполнить снова
+        if fetch == 'all':
+            return rows
+        if not rows:
+            return None
+        if fetch == 'dict':
+            return dict(zip(cursor.column_names, rows[0]))
+        return rows[0]
+
+    def _execute_once(self, sql: str, params: tuple, fetch: Optional[str]):
+        """Выполнение на отдельном соединении (подготовленные запросы выключены)"""
+        metrics.db_queries.inc('once')
+        conn = self.get_connection()
+        if not conn:
+            raise Error(msg="Нет соединения с базой данных")
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            result = self._fetch(cursor, fetch)
+            conn.commit()
+            return result
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _execute_prepared(self, sql: str, params: tuple = (), fetch: Optional[str] = None):
+        """
+        Горячий запрос подготовленным оператором: текст отправляется и разбирается сервером
+        один раз на соединение потока, дальше передаются только параметры.
+        fetch: 'one' - кортеж, 'dict' - строка словарем, 'all' - все строки, None - lastrowid.
+        """
+        if not self.prepared_statements:
+            return self._execute_once(sql, params, fetch)
+
+        for attempt in range(2):
+            conn = self._session_connection()
+            if conn is None:
+                raise Error(msg="Нет соединения с базой данных")
+            statements = self._session.statements
+            try:
+                cursor = statements.get(sql)
+                if cursor is None:
+                    if len(statements) >= DATABASE_SESSION['max_statements']:
+                        for old_cursor in statements.values():
+                            old_cursor.close()
+                        statements.clear()
+                    cursor = conn.cursor(prepared=True)
+                    statements[sql] = cursor
+                metrics.db_queries.inc('prepared')
+                cursor.execute(sql, params)
+                return self._fetch(cursor, fetch)
+            except Error as e:
+                metrics.db_errors.inc()
+                self.close_session()
+                if attempt or e.errno not in self.LOST_CONNECTION_ERRORS:
+                    raise
+                logger.warning(f"⚠️ Соединение с базой потеряно, переподключение: {e}")
+
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
         try:
@@ -32,7 +170,7 @@ class DatabaseManager:
             return False
 
     def create_tables(self):
-        """Создание всех необходимых таблиц"""
+        """Создание всех необходимых таблиц (изменения схемы - через новую миграцию, см. комментарий к классу)"""
         tables = [
             """
             CREATE TABLE IF NOT EXISTS user_groups (
@@ -40,7 +178,8 @@ class DatabaseManager:
                 chat_id VARCHAR(255) UNIQUE NOT NULL,
                 group_name VARCHAR(50) NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_group_chat (group_name, chat_id)
             )
             """,
             """
@@ -52,7 +191,8 @@ class DatabaseManager:
                 minute INT DEFAULT 0,
                 timezone VARCHAR(50) DEFAULT 'Asia/Tomsk',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_enabled_time (enabled, hour, minute, chat_id)
             )
             """,
             """
@@ -61,7 +201,8 @@ class DatabaseManager:
                 chat_id VARCHAR(255) UNIQUE NOT NULL,
                 enabled BOOLEAN DEFAULT FALSE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_enabled_chat (enabled, chat_id)
             )
             """,
             """
@@ -95,6 +236,8 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS request_stats (
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 chat_id VARCHAR(255) NOT NULL,
+                command_id INT NULL,
+                user_agent_id INT NULL,
                 command VARCHAR(255),
                 user_agent TEXT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -124,7 +267,42 @@ class DatabaseManager:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 INDEX idx_chat_type (chat_type),
-                INDEX idx_created_at (created_at)
+                INDEX idx_created_at (created_at),
+                INDEX idx_created_id (created_at, id),
+                INDEX idx_type_created_id (chat_type, created_at, id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS settings_version (
+                id TINYINT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS request_rollup_minute (
+                dimension VARCHAR(16) NOT NULL,
+                bucket DATETIME NOT NULL,
+                item_key VARCHAR(255) NOT NULL,
+                count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, bucket, item_key),
+                INDEX idx_bucket (bucket)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS request_rollup_hour (
+                dimension VARCHAR(16) NOT NULL,
+                bucket DATETIME NOT NULL,
+                item_key VARCHAR(255) NOT NULL,
+                count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, bucket, item_key)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS request_dictionary (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                kind VARCHAR(16) NOT NULL,
+                value VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+                UNIQUE KEY uniq_kind_value (kind, value)
             )
             """
         ]
@@ -143,6 +321,13 @@ class DatabaseManager:
                 INSERT IGNORE INTO flood_settings (id, enabled, max_requests_per_minute, ban_duration_minutes) 
                 VALUES (1, TRUE, 30, 60)
             """)
+            cursor.execute("INSERT IGNORE INTO settings_version (id, version) VALUES (1, 0)")
+            
+            # Колонки и индексы для таблиц, созданных до их появления в схеме
+            for table, column, definition in self.COLUMNS:
+                self._ensure_column(cursor, table, column, definition)
+            for table, index_name, columns in self.INDEXES:
+                self._ensure_index(cursor, table, index_name, columns)
             
             conn.commit()
             logger.info("✅ Все таблицы созданы успешно")
@@ -155,6 +340,127 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    def _ensure_index(self, cursor, table: str, index_name: str, columns: str):
+        """Создание индекса, если его ещё нет (CREATE TABLE IF NOT EXISTS не добавляет индексы)"""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics 
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, index_name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} {columns}")
+            logger.info(f"✅ Добавлен индекс {index_name} для {table}")
+
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """Добавление колонки, если её ещё нет"""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns 
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"✅ Добавлена колонка {column} в {table}")
+
+    def set_dictionary_binary_collation(self) -> bool:
+        """Словарь запросов различает регистр и пробелы (/Today и /today - разные значения)"""
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                ALTER TABLE request_dictionary 
+                MODIFY value VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL
+            """)
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка изменения сравнения request_dictionary: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    # Миграции схемы
+    def create_migrations_table(self) -> bool:
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL,
+                    duration_ms INT DEFAULT 0,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка создания таблицы миграций: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_schema_version(self) -> Optional[int]:
+        """Номер последней примененной миграции (0 - база новая, None - нет соединения)"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+            return int(cursor.fetchone()[0])
+        except Error as e:
+            if e.errno != 1146:  # ER_NO_SUCH_TABLE - миграций еще не было
+                logger.error(f"❌ Ошибка чтения версии схемы: {e}")
+                return None
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_schema_migrations(self) -> List[Dict[str, Any]]:
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT version, name, duration_ms, applied_at FROM schema_migrations ORDER BY version")
+            return cursor.fetchall()
+        except Error as e:
+            if e.errno != 1146:
+                logger.error(f"❌ Ошибка получения списка миграций: {e}")
+            return []
+        finally:
+            cursor.close()
+            conn.close()
+
+    def record_schema_migration(self, version: int, name: str, duration_ms: int) -> bool:
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)
+            """, (version, name, duration_ms))
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка записи миграции {version}: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
     def save_bot_chat(self, chat_id: str, chat_type: str, username: str = None, 
                  first_name: str = None, last_name: str = None, title: str = None) -> bool:
         """Сохранение информации о чате/пользователе"""
@@ -184,6 +490,41 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    def save_bot_chats(self, chats: List[Dict[str, Any]]) -> bool:
+        """Пакетное сохранение информации о чатах"""
+        if not chats:
+            return True
+
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO bot_chats (chat_id, chat_type, username, first_name, last_name, title) 
+                VALUES (%s, %s, %s, %s, %s, %s) 
+                ON DUPLICATE KEY UPDATE 
+                chat_type = VALUES(chat_type),
+                username = VALUES(username),
+                first_name = VALUES(first_name),
+                last_name = VALUES(last_name),
+                title = VALUES(title),
+                updated_at = CURRENT_TIMESTAMP
+            """, [
+                (chat['chat_id'], chat['chat_type'], chat.get('username'),
+                 chat.get('first_name'), chat.get('last_name'), chat.get('title'))
+                for chat in chats
+            ])
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка пакетного сохранения информации о чатах: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
     def get_all_bot_chats(self, chat_type: str = None) -> List[Dict[str, Any]]:
         """Получение всех чатов (с фильтром по типу)"""
         conn = self.get_connection()
@@ -204,6 +545,51 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    def get_bot_chats_page(self, chat_type: str = None, cursor_key: Tuple[datetime, int] = None,
+                           direction: str = 'next', limit: int = 20) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Страница чатов от новых к старым с keyset-пагинацией по (created_at, id).
+        direction='next' - чаты старше cursor_key, 'prev' - новее.
+        Возвращает чаты страницы и признак, что в этом направлении есть ещё.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return [], False
+
+        conditions, params = [], []
+        if chat_type:
+            conditions.append("chat_type = %s")
+            params.append(chat_type)
+        if cursor_key:
+            created_at, chat_row_id = cursor_key
+            sign = '<' if direction == 'next' else '>'
+            conditions.append(f"(created_at {sign} %s OR (created_at = %s AND id {sign} %s))")
+            params.extend([created_at, created_at, chat_row_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if direction == 'next' else "ASC"
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT * FROM bot_chats 
+                {where} 
+                ORDER BY created_at {order}, id {order} 
+                LIMIT %s
+            """, (*params, limit + 1))
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if direction != 'next':
+                rows.reverse()
+            return rows, has_more
+        except Error as e:
+            logger.error(f"❌ Ошибка получения страницы чатов: {e}")
+            return [], False
+        finally:
+            cursor.close()
+            conn.close()
+
     def remove_admin(self, user_id: str) -> bool:
         """Удаление администратора"""
         conn = self.get_connection()
@@ -237,16 +623,13 @@ class DatabaseManager:
 
         try:
             cursor = conn.cursor()
-            counts = {}
+            counts = {'total': 0}
             
-            # Общее количество
-            cursor.execute("SELECT COUNT(*) FROM bot_chats")
-            counts['total'] = cursor.fetchone()[0]
-            
-            # По типам
-            cursor.execute("SELECT chat_type, COUNT(*) FROM bot_chats GROUP BY chat_type")
+            # По типам (читается только индекс idx_chat_type), общее количество - их сумма
+            cursor.execute(f"SELECT chat_type, COUNT(*) FROM bot_chats {self.CHAT_TYPE_INDEX} GROUP BY chat_type")
             for chat_type, count in cursor.fetchall():
                 counts[chat_type] = count
+                counts['total'] += count
                 
             return counts
         except Error as e:
@@ -273,45 +656,82 @@ class DatabaseManager:
         finally:
             cursor.close()
             conn.close()
-    # Методы для работы с группами пользователей
-    def set_user_group(self, chat_id: str, group_name: str) -> bool:
+    # Версия настроек чатов для сброса кэшей в нескольких процессах
+    def _settings_changed(self, chat_id: str, kind: str = None):
+        """Сброс кэша настроек чата после записи"""
+        settings_cache.invalidate(chat_id, kind)
+        settings_cache.publish_change()
+
+    def bump_settings_version(self) -> bool:
         conn = self.get_connection()
         if not conn:
             return False
 
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO user_groups (chat_id, group_name) 
-                VALUES (%s, %s) 
-                ON DUPLICATE KEY UPDATE group_name = %s, updated_at = CURRENT_TIMESTAMP
-            """, (chat_id, group_name, group_name))
+            cursor.execute("UPDATE settings_version SET version = version + 1 WHERE id = 1")
             conn.commit()
             return True
         except Error as e:
-            logger.error(f"❌ Ошибка установки группы: {e}")
+            logger.error(f"❌ Ошибка обновления версии настроек: {e}")
             return False
         finally:
             cursor.close()
             conn.close()
 
-    def get_user_group(self, chat_id: str) -> Optional[str]:
+    def get_settings_version(self) -> Optional[int]:
         conn = self.get_connection()
         if not conn:
             return None
 
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT group_name FROM user_groups WHERE chat_id = %s", (chat_id,))
+            cursor.execute("SELECT version FROM settings_version WHERE id = 1")
             result = cursor.fetchone()
             return result[0] if result else None
         except Error as e:
-            logger.error(f"❌ Ошибка получения группы: {e}")
+            logger.error(f"❌ Ошибка получения версии настроек: {e}")
             return None
         finally:
             cursor.close()
             conn.close()
 
+    # Методы для работы с группами пользователей
+    def set_user_group(self, chat_id: str, group_name: str) -> bool:
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO user_groups (chat_id, group_name) 
+                VALUES (%s, %s) 
+                ON DUPLICATE KEY UPDATE group_name = %s, updated_at = CURRENT_TIMESTAMP
+            """, (chat_id, group_name, group_name))
+            conn.commit()
+            self._settings_changed(chat_id, 'group')
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка установки группы: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_user_group(self, chat_id: str, raise_errors: bool = False) -> Optional[str]:
+        """Группа чата; raise_errors - ошибку БД не заменять на "группы нет" (для кэша настроек)"""
+        try:
+            result = self._execute_prepared(
+                "SELECT group_name FROM user_groups WHERE chat_id = %s", (chat_id,), 'one'
+            )
+            return result[0] if result else None
+        except Error as e:
+            logger.error(f"❌ Ошибка получения группы: {e}")
+            if raise_errors:
+                raise
+            return None
+
     def get_chats_by_group(self, group_name: str) -> List[str]:
         conn = self.get_connection()
         if not conn:
@@ -343,6 +763,7 @@ class DatabaseManager:
                 ON DUPLICATE KEY UPDATE enabled = %s, hour = %s, minute = %s, updated_at = CURRENT_TIMESTAMP
             """, (chat_id, enabled, hour, minute, enabled, hour, minute))
             conn.commit()
+            self._settings_changed(chat_id, 'mailing')
             return True
         except Error as e:
             logger.error(f"❌ Ошибка установки настроек рассылки: {e}")
@@ -351,15 +772,12 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
-    def get_mailing_settings(self, chat_id: str) -> Dict[str, Any]:
-        conn = self.get_connection()
-        if not conn:
-            return {'enabled': False, 'time': {'hour': 18, 'minute': 0}, 'timezone': 'Asia/Tomsk'}
-
+    def get_mailing_settings(self, chat_id: str, raise_errors: bool = False) -> Dict[str, Any]:
+        """Настройки рассылки чата; raise_errors - ошибку БД не заменять на настройки по умолчанию"""
         try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM mailing_settings WHERE chat_id = %s", (chat_id,))
-            result = cursor.fetchone()
+            result = self._execute_prepared(
+                "SELECT enabled, hour, minute, timezone FROM mailing_settings WHERE chat_id = %s", (chat_id,), 'dict'
+            )
             
             if result:
                 return {
@@ -371,10 +789,9 @@ class DatabaseManager:
                 return {'enabled': False, 'time': {'hour': 18, 'minute': 0}, 'timezone': 'Asia/Tomsk'}
         except Error as e:
             logger.error(f"❌ Ошибка получения настроек рассылки: {e}")
+            if raise_errors:
+                raise
             return {'enabled': False, 'time': {'hour': 18, 'minute': 0}, 'timezone': 'Asia/Tomsk'}
-        finally:
-            cursor.close()
-            conn.close()
 
     def get_enabled_mailing_chats(self) -> List[str]:
         conn = self.get_connection()
@@ -393,6 +810,102 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    # Массовые выборки подписчиков (один запрос вместо запроса на каждый чат)
+    def get_group_subscribers(self, group_name: str) -> List[Dict[str, Any]]:
+        """Все чаты группы с флагом уведомлений, временем рассылки и статусом бана"""
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT ug.chat_id,
+                       COALESCE(cn.enabled, FALSE) AS notifications_enabled,
+                       COALESCE(ms.enabled, FALSE) AS mailing_enabled,
+                       COALESCE(ms.hour, 18) AS hour,
+                       COALESCE(ms.minute, 0) AS minute,
+                       bu.id IS NOT NULL AS is_banned
+                FROM user_groups ug
+                LEFT JOIN change_notifications cn ON cn.chat_id = ug.chat_id
+                LEFT JOIN mailing_settings ms ON ms.chat_id = ug.chat_id
+                LEFT JOIN banned_users bu ON bu.chat_id = ug.chat_id 
+                    AND (bu.banned_until IS NULL OR bu.banned_until > %s)
+                WHERE ug.group_name = %s
+            """, (datetime.now(), group_name))
+            return [
+                {
+                    'chat_id': row['chat_id'],
+                    'notifications_enabled': bool(row['notifications_enabled']),
+                    'mailing_enabled': bool(row['mailing_enabled']),
+                    'time': {'hour': row['hour'], 'minute': row['minute']},
+                    'is_banned': bool(row['is_banned'])
+                }
+                for row in cursor.fetchall()
+            ]
+        except Error as e:
+            logger.error(f"❌ Ошибка получения подписчиков группы: {e}")
+            return []
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_mailing_subscribers(self) -> List[Dict[str, Any]]:
+        """Все чаты с включенной рассылкой вместе с группой, временем и статусом бана"""
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT ms.chat_id, ms.hour, ms.minute, ug.group_name,
+                       bu.id IS NOT NULL AS is_banned
+                FROM mailing_settings ms
+                LEFT JOIN user_groups ug ON ug.chat_id = ms.chat_id
+                LEFT JOIN banned_users bu ON bu.chat_id = ms.chat_id 
+                    AND (bu.banned_until IS NULL OR bu.banned_until > %s)
+                WHERE ms.enabled = TRUE
+            """, (datetime.now(),))
+            return [
+                {
+                    'chat_id': row['chat_id'],
+                    'group': row['group_name'],
+                    'time': {'hour': row['hour'], 'minute': row['minute']},
+                    'is_banned': bool(row['is_banned'])
+                }
+                for row in cursor.fetchall()
+            ]
+        except Error as e:
+            logger.error(f"❌ Ошибка получения подписчиков рассылки: {e}")
+            return []
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_notification_counts_by_group(self) -> Dict[str, int]:
+        """Количество чатов с включенными уведомлениями по группам"""
+        conn = self.get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT ug.group_name, COUNT(*) 
+                FROM user_groups ug
+                JOIN change_notifications cn ON cn.chat_id = ug.chat_id
+                WHERE cn.enabled = TRUE
+                GROUP BY ug.group_name
+            """)
+            return {group_name: count for group_name, count in cursor.fetchall()}
+        except Error as e:
+            logger.error(f"❌ Ошибка получения статистики уведомлений по группам: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.close()
+
     # Методы для уведомлений об изменениях
     def set_change_notifications(self, chat_id: str, enabled: bool) -> bool:
         conn = self.get_connection()
@@ -407,6 +920,7 @@ class DatabaseManager:
                 ON DUPLICATE KEY UPDATE enabled = %s, updated_at = CURRENT_TIMESTAMP
             """, (chat_id, enabled, enabled))
             conn.commit()
+            self._settings_changed(chat_id, 'notifications')
             return True
         except Error as e:
             logger.error(f"❌ Ошибка установки уведомлений: {e}")
@@ -415,9 +929,12 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
-    def get_change_notifications(self, chat_id: str) -> bool:
+    def get_change_notifications(self, chat_id: str, raise_errors: bool = False) -> bool:
+        """Включены ли уведомления чата; raise_errors - не заменять ошибку БД на "выключено" (для кэша настроек)"""
         conn = self.get_connection()
         if not conn:
+            if raise_errors:
+                raise Error(msg="Нет соединения с базой данных")
             return False
 
         try:
@@ -427,6 +944,8 @@ class DatabaseManager:
             return result[0] if result else False
         except Error as e:
             logger.error(f"❌ Ошибка получения уведомлений: {e}")
+            if raise_errors:
+                raise
             return False
         finally:
             cursor.close()
@@ -487,6 +1006,23 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    def get_admin_ids(self) -> Optional[set]:
+        """ID всех администраторов; None, если БД недоступна"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_id FROM admins")
+            return {str(row[0]) for row in cursor.fetchall()}
+        except Error as e:
+            logger.error(f"❌ Ошибка получения списка администраторов: {e}")
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+
     def get_all_admins(self) -> List[Dict[str, Any]]:
         conn = self.get_connection()
         if not conn:
@@ -505,21 +1041,12 @@ class DatabaseManager:
 
     # Методы для анти-флуда
     def get_flood_settings(self) -> Dict[str, Any]:
-        conn = self.get_connection()
-        if not conn:
-            return {'enabled': True, 'max_requests_per_minute': 30, 'ban_duration_minutes': 60}
-
         try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM flood_settings WHERE id = 1")
-            result = cursor.fetchone()
+            result = self._execute_prepared("SELECT * FROM flood_settings WHERE id = 1", (), 'dict')
             return result if result else {'enabled': True, 'max_requests_per_minute': 30, 'ban_duration_minutes': 60}
         except Error as e:
             logger.error(f"❌ Ошибка получения настроек анти-флуда: {e}")
             return {'enabled': True, 'max_requests_per_minute': 30, 'ban_duration_minutes': 60}
-        finally:
-            cursor.close()
-            conn.close()
 
     def update_flood_settings(self, enabled: bool = None, max_requests: int = None, ban_duration: int = None) -> bool:
         conn = self.get_connection()
@@ -607,24 +1134,15 @@ class DatabaseManager:
             conn.close()
 
     def is_banned(self, chat_id: str) -> bool:
-        conn = self.get_connection()
-        if not conn:
-            return False
-
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
+            result = self._execute_prepared("""
                 SELECT id FROM banned_users 
-                WHERE chat_id = %s AND (banned_until IS NULL OR banned_until > %s)
-            """, (chat_id, datetime.now()))
-            result = cursor.fetchone()
+                WHERE chat_id = %s AND (banned_until IS NULL OR banned_until > %s) LIMIT 1
+            """, (chat_id, datetime.now()), 'one')
             return result is not None
         except Error as e:
             logger.error(f"❌ Ошибка проверки бана: {e}")
             return False
-        finally:
-            cursor.close()
-            conn.close()
 
     def get_banned_users(self) -> List[Dict[str, Any]]:
         conn = self.get_connection()
@@ -643,31 +1161,120 @@ class DatabaseManager:
             conn.close()
 
     # Методы для статистики
+    @staticmethod
+    def normalize_command(text: Optional[str]) -> Optional[str]:
+        """
+        Ключ запроса для статистики: у команды - сама команда без аргументов и @имени бота,
+        произвольный текст обрезается, чтобы словарь запросов не рос от каждого сообщения
+        """
+        if text is None:
+            return None
+        text = text.strip()
+        if text.startswith('/'):
+            return text.split(maxsplit=1)[0].split('@', 1)[0]
+        return text[:REQUEST_STATS_RETENTION['command_max_length']]
+
     def log_request(self, chat_id: str, command: str = None, user_agent: str = None) -> bool:
+        # Время запроса - локальное время бота, а не часовой пояс сессии MySQL:
+        # с ним сравниваются окна статистики, агрегаты и очистка старых записей
+        try:
+            self._execute_prepared("""
+                INSERT INTO request_stats (chat_id, command_id, user_agent_id, timestamp) 
+                VALUES (%s, %s, %s, %s)
+            """, (chat_id, self._dictionary_id('command', self.normalize_command(command)),
+                  self._dictionary_id('user_agent', user_agent), datetime.now()))
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка логирования запроса: {e}")
+            return False
+
+    def _dictionary_id(self, kind: str, value: Optional[str]) -> Optional[int]:
+        """id значения в request_dictionary (значение добавляется при первом использовании)"""
+        if value is None:
+            return None
+        key = (kind, value[:255])
+        dictionary_id = self._dictionary_ids.get(key)
+        if dictionary_id is not None:
+            return dictionary_id
+
+        dictionary_id = self._insert_dictionary_value(key)
+        if len(self._dictionary_ids) >= REQUEST_STATS_RETENTION['dictionary_cache_size']:
+            self._dictionary_ids.clear()
+        self._dictionary_ids[key] = dictionary_id
+        return dictionary_id
+
+    def _insert_dictionary_value(self, key: Tuple[str, str]) -> int:
+        """Добавление (вид, значение) в request_dictionary; id новой или уже существующей строки"""
+        return self._execute_prepared("""
+            INSERT INTO request_dictionary (kind, value) VALUES (%s, %s) 
+            ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+        """, key)
+
+    def get_request_stats(self, time_period_minutes: int = 60) -> Dict[str, Any]:
+        """
+        Статистика запросов по предагрегированным таблицам.
+        Окна в пределах хранения минутных срезов считаются по минутам, более длинные - по часам.
+        """
         conn = self.get_connection()
         if not conn:
-            return False
+            return {}
+
+        since = datetime.now() - timedelta(minutes=time_period_minutes)
+        if time_period_minutes <= REQUEST_ROLLUPS['minute_retention_minutes']:
+            table = 'request_rollup_minute'
+        else:
+            table = 'request_rollup_hour'
+            since = since.replace(minute=0, second=0, microsecond=0)
 
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO request_stats (chat_id, command, user_agent) 
-                VALUES (%s, %s, %s)
-            """, (chat_id, command, user_agent))
-            conn.commit()
-            return True
+            
+            # Общее количество запросов
+            cursor.execute("SELECT COALESCE(SUM(count), 0) FROM request_rollup_hour WHERE dimension = 'total'")
+            total_requests = int(cursor.fetchone()[0])
+            
+            # Запросы за указанный период
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(count), 0) FROM {table} 
+                WHERE dimension = 'total' AND bucket >= %s
+            """, (since,))
+            recent_requests = int(cursor.fetchone()[0])
+            
+            # Популярные команды и активные пользователи
+            top = {}
+            for dimension in ('command', 'chat'):
+                cursor.execute(f"""
+                    SELECT item_key, SUM(count) AS total 
+                    FROM {table} 
+                    WHERE dimension = %s AND bucket >= %s
+                    GROUP BY item_key 
+                    ORDER BY total DESC 
+                    LIMIT 10
+                """, (dimension, since))
+                top[dimension] = [(key, int(count)) for key, count in cursor.fetchall()]
+            
+            return {
+                'total_requests': total_requests,
+                'recent_requests': recent_requests,
+                'popular_commands': top['command'],
+                'active_users': top['chat'],
+                'time_period_minutes': time_period_minutes
+            }
         except Error as e:
-            logger.error(f"❌ Ошибка логирования запроса: {e}")
-            return False
+            logger.error(f"❌ Ошибка получения статистики: {e}")
+            return {}
         finally:
             cursor.close()
             conn.close()
 
-    def get_request_stats(self, time_period_minutes: int = 60) -> Dict[str, Any]:
+    def get_request_stats_exact(self, time_period_minutes: int = 60) -> Dict[str, Any]:
+        """Точная статистика по сырым записям request_stats (медленно на больших таблицах)"""
         conn = self.get_connection()
         if not conn:
             return {}
 
+        since = datetime.now() - timedelta(minutes=time_period_minutes)
+
         try:
             cursor = conn.cursor()
             
@@ -678,30 +1285,31 @@ class DatabaseManager:
             # Запросы за указанный период
             cursor.execute("""
                 SELECT COUNT(*) FROM request_stats 
-                WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-            """, (time_period_minutes,))
+                WHERE timestamp >= %s
+            """, (since,))
             recent_requests = cursor.fetchone()[0]
             
             # Популярные команды
-            cursor.execute("""
-                SELECT command, COUNT(*) as count 
-                FROM request_stats 
-                WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-                GROUP BY command 
+            cursor.execute(f"""
+                SELECT {self.REQUEST_COMMAND_SQL} AS command_text, COUNT(*) as count 
+                FROM request_stats rs 
+                {self.REQUEST_COMMAND_JOIN} 
+                WHERE rs.timestamp >= %s
+                GROUP BY command_text 
                 ORDER BY count DESC 
                 LIMIT 10
-            """, (time_period_minutes,))
+            """, (since,))
             popular_commands = cursor.fetchall()
             
             # Активные пользователи
             cursor.execute("""
                 SELECT chat_id, COUNT(*) as request_count 
                 FROM request_stats 
-                WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
+                WHERE timestamp >= %s
                 GROUP BY chat_id 
                 ORDER BY request_count DESC 
                 LIMIT 10
-            """, (time_period_minutes,))
+            """, (since,))
             active_users = cursor.fetchall()
             
             return {
@@ -718,6 +1326,293 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+    def save_request_rollups(self, counts: Dict[Tuple[datetime, str, str], int]) -> bool:
+        """Прибавление накопленных счетчиков (минута, измерение, ключ) к минутным и часовым срезам"""
+        if not counts:
+            return True
+
+        hourly = {}
+        for (bucket, dimension, item_key), count in counts.items():
+            hour_key = (bucket.replace(minute=0, second=0, microsecond=0), dimension, item_key)
+            hourly[hour_key] = hourly.get(hour_key, 0) + count
+
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            for table, rows in (('request_rollup_minute', counts), ('request_rollup_hour', hourly)):
+                cursor.executemany(f"""
+                    INSERT INTO {table} (dimension, bucket, item_key, count) 
+                    VALUES (%s, %s, %s, %s) 
+                    {self.ROLLUP_UPSERT}
+                """, [
+                    (dimension, bucket, item_key, count)
+                    for (bucket, dimension, item_key), count in rows.items()
+                ])
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка сохранения агрегатов статистики: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def prune_request_rollups(self, retention_minutes: int) -> int:
+        """Удаление минутных срезов старше срока хранения (часовые хранятся всегда)"""
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM request_rollup_minute 
+                WHERE bucket < %s
+            """, (datetime.now() - timedelta(minutes=retention_minutes),))
+            conn.commit()
+            return cursor.rowcount
+        except Error as e:
+            logger.error(f"❌ Ошибка очистки минутных агрегатов: {e}")
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def backfill_request_rollups(self, cutoff: datetime) -> Dict[str, int]:
+        """
+        Пересчет агрегатов из сырых записей request_stats для всех срезов раньше cutoff.
+        Повторный запуск безопасен: пересчитанные срезы перезаписываются, а не дополняются.
+        """
+        cutoff = cutoff.replace(second=0, microsecond=0)
+        cutoff_hour = cutoff.replace(minute=0)
+        dimensions = (
+            ('total', "'total'"),
+            ('command', f"LEFT(COALESCE({self.REQUEST_COMMAND_SQL}, 'Unknown'), 255)"),
+            ('chat', 'rs.chat_id'),
+        )
+
+        conn = self.get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(timestamp) FROM request_stats")
+            first = cursor.fetchone()[0]
+            if first is None:
+                return {'minute_rows': 0, 'hour_rows': 0}
+
+            # Срезы раньше первой сырой записи не трогаем: их данные могли быть удалены ретеншеном
+            since_hour = first.replace(minute=0, second=0, microsecond=0)
+            minute_since = max(since_hour, cutoff - timedelta(minutes=REQUEST_ROLLUPS['minute_retention_minutes']))
+            minute_rows = hour_rows = 0
+
+            cursor.execute("""
+                DELETE FROM request_rollup_minute WHERE bucket >= %s AND bucket < %s
+            """, (minute_since, cutoff))
+            cursor.execute("""
+                DELETE FROM request_rollup_hour WHERE bucket >= %s AND bucket <= %s
+            """, (since_hour, cutoff_hour))
+
+            for dimension, key_expr in dimensions:
+                cursor.execute(f"""
+                    INSERT INTO request_rollup_minute (dimension, bucket, item_key, count) 
+                    SELECT %s, DATE_FORMAT(rs.timestamp, '%%Y-%%m-%%d %%H:%%i:00') AS minute_bucket, 
+                           {key_expr} AS item, COUNT(*) 
+                    FROM request_stats rs 
+                    {self.REQUEST_COMMAND_JOIN} 
+                    WHERE rs.timestamp >= %s AND rs.timestamp < %s 
+                    GROUP BY minute_bucket, item
+                """, (dimension, minute_since, cutoff))
+                minute_rows += cursor.rowcount
+
+                # Часы до cutoff - из сырых записей, текущий час дополняется живыми минутными срезами
+                cursor.execute(f"""
+                    INSERT INTO request_rollup_hour (dimension, bucket, item_key, count) 
+                    SELECT %s, hour_bucket, item, SUM(cnt) FROM (
+                        SELECT DATE_FORMAT(rs.timestamp, '%%Y-%%m-%%d %%H:00:00') AS hour_bucket, 
+                               {key_expr} AS item, COUNT(*) AS cnt 
+                        FROM request_stats rs 
+                        {self.REQUEST_COMMAND_JOIN} 
+                        WHERE rs.timestamp >= %s AND rs.timestamp < %s 
+                        GROUP BY hour_bucket, item 
+                        UNION ALL 
+                        SELECT DATE_FORMAT(bucket, '%%Y-%%m-%%d %%H:00:00'), item_key, SUM(count) 
+                        FROM request_rollup_minute 
+                        WHERE dimension = %s AND bucket >= %s AND bucket < DATE_ADD(%s, INTERVAL 1 HOUR) 
+                        GROUP BY item_key
+                    ) AS merged 
+                    GROUP BY hour_bucket, item
+                """, (dimension, since_hour, cutoff, dimension, cutoff, cutoff_hour))
+                hour_rows += cursor.rowcount
+
+            conn.commit()
+            logger.info(f"✅ Агрегаты статистики пересчитаны: {minute_rows} минутных, {hour_rows} часовых срезов")
+            return {'minute_rows': minute_rows, 'hour_rows': hour_rows}
+        except Error as e:
+            conn.rollback()
+            logger.error(f"❌ Ошибка пересчета агрегатов статистики: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_last_request(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Последний запрос чата: команда и время"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {self.REQUEST_COMMAND_SQL} AS command, rs.timestamp 
+                FROM request_stats rs 
+                {self.REQUEST_COMMAND_JOIN} 
+                WHERE rs.chat_id = %s 
+                ORDER BY rs.timestamp DESC 
+                LIMIT 1
+            """, (chat_id,))
+            return cursor.fetchone()
+        except Error as e:
+            logger.error(f"❌ Ошибка получения последнего запроса: {e}")
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+
+    # Хранение и очистка request_stats
+    def get_table_size(self, table: str) -> Dict[str, int]:
+        """Размер таблицы по information_schema (оценка InnoDB)"""
+        conn = self.get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT table_rows, data_length, index_length 
+                FROM information_schema.tables 
+                WHERE table_schema = DATABASE() AND table_name = %s
+            """, (table,))
+            row = cursor.fetchone()
+            if not row:
+                return {}
+            return {
+                'rows': int(row['table_rows'] or 0),
+                'data_bytes': int(row['data_length'] or 0),
+                'index_bytes': int(row['index_length'] or 0),
+                'total_bytes': int((row['data_length'] or 0) + (row['index_length'] or 0))
+            }
+        except Error as e:
+            logger.error(f"❌ Ошибка получения размера таблицы {table}: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_expired_requests(self, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Пачка записей request_stats старше cutoff (с раскрытыми значениями словаря)"""
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT rs.id, rs.chat_id, {self.REQUEST_COMMAND_SQL} AS command, 
+                       COALESCE(ua.value, rs.user_agent) AS user_agent, rs.timestamp 
+                FROM request_stats rs 
+                {self.REQUEST_COMMAND_JOIN} 
+                LEFT JOIN request_dictionary ua ON ua.id = rs.user_agent_id 
+                WHERE rs.timestamp < %s 
+                ORDER BY rs.id 
+                LIMIT %s
+            """, (cutoff, limit))
+            return cursor.fetchall()
+        except Error as e:
+            logger.error(f"❌ Ошибка выборки устаревших запросов: {e}")
+            return []
+        finally:
+            cursor.close()
+            conn.close()
+
+    def delete_requests_range(self, first_id: int, last_id: int, cutoff: datetime) -> int:
+        """Удаление диапазона id из request_stats (только записи старше cutoff)"""
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM request_stats 
+                WHERE id >= %s AND id <= %s AND timestamp < %s
+            """, (first_id, last_id, cutoff))
+            conn.commit()
+            return cursor.rowcount
+        except Error as e:
+            logger.error(f"❌ Ошибка удаления устаревших запросов: {e}")
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_request_id_range(self) -> Tuple[Optional[int], Optional[int]]:
+        """Минимальный и максимальный id в request_stats"""
+        conn = self.get_connection()
+        if not conn:
+            return None, None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(id), MAX(id) FROM request_stats")
+            return cursor.fetchone()
+        except Error as e:
+            logger.error(f"❌ Ошибка получения диапазона id запросов: {e}")
+            return None, None
+        finally:
+            cursor.close()
+            conn.close()
+
+    def compact_requests_range(self, first_id: int, last_id: int) -> int:
+        """Перевод текстовых command/user_agent в id словаря для диапазона записей"""
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            updated = 0
+            for kind, column, id_column in (('command', 'command', 'command_id'),
+                                            ('user_agent', 'user_agent', 'user_agent_id')):
+                cursor.execute(f"""
+                    INSERT IGNORE INTO request_dictionary (kind, value) 
+                    SELECT DISTINCT %s, CONVERT(LEFT({column}, 255) USING utf8mb4) COLLATE utf8mb4_bin 
+                    FROM request_stats 
+                    WHERE id >= %s AND id <= %s AND {column} IS NOT NULL
+                """, (kind, first_id, last_id))
+                cursor.execute(f"""
+                    UPDATE request_stats rs 
+                    JOIN request_dictionary d 
+                        ON d.kind = %s AND d.value = CONVERT(LEFT(rs.{column}, 255) USING utf8mb4) COLLATE utf8mb4_bin 
+                    SET rs.{id_column} = d.id, rs.{column} = NULL 
+                    WHERE rs.id >= %s AND rs.id <= %s AND rs.{column} IS NOT NULL
+                """, (kind, first_id, last_id))
+                updated += cursor.rowcount
+            conn.commit()
+            return updated
+        except Error as e:
+            conn.rollback()
+            logger.error(f"❌ Ошибка сжатия записей запросов: {e}")
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
+
     def get_user_request_count(self, chat_id: str, time_period_minutes: int = 1) -> int:
         conn = self.get_connection()
         if not conn:
@@ -727,8 +1622,8 @@ class DatabaseManager:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT COUNT(*) FROM request_stats 
-                WHERE chat_id = %s AND timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-            """, (chat_id, time_period_minutes))
+                WHERE chat_id = %s AND timestamp >= %s
+            """, (chat_id, datetime.now() - timedelta(minutes=time_period_minutes)))
             result = cursor.fetchone()
             return result[0] if result else 0
         except Error as e:
@@ -777,54 +1672,49 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
-    # Миграция данных из JSON файлов
-    def migrate_from_json(self) -> Dict[str, int]:
-        """Миграция данных из JSON файлов в базу данных"""
-        migration_stats = {
-            'user_groups': 0,
-            'mailing_settings': 0,
-            'change_notifications': 0
-        }
+    # Разовый импорт настроек чатов (миграция старых JSON файлов)
+    def import_chat_settings(self, groups: List[Tuple[str, str]], mailing: List[Tuple[str, bool, int, int]],
+                             notifications: List[Tuple[str, bool]], batch_size: int = 500) -> Optional[Dict[str, int]]:
+        """
+        Пакетная вставка настроек чатов через executemany.
+        Уже существующие строки не перезаписываются: данные в базе новее JSON файлов,
+        поэтому после ошибки импорт можно просто повторить.
+        Возвращает количество вставленных строк по таблицам или None при ошибке.
+        """
+        stats = {'user_groups': 0, 'mailing_settings': 0, 'change_notifications': 0}
+        conn = self.get_connection()
+        if not conn:
+            return None
 
-        try:
-            # Миграция group_settings.json
-            if os.path.exists('group_settings.json'):
-                with open('group_settings.json', 'r', encoding='utf-8') as f:
-                    group_data = json.load(f)
-                
-                for chat_id, group_name in group_data.items():
-                    if self.set_user_group(chat_id, group_name):
-                        migration_stats['user_groups'] += 1
-
-            # Миграция mailing_settings.json
-            if os.path.exists('mailing_settings.json'):
-                with open('mailing_settings.json', 'r', encoding='utf-8') as f:
-                    mailing_data = json.load(f)
-                
-                for chat_id, settings in mailing_data.items():
-                    if self.set_mailing_settings(
-                        chat_id, 
-                        settings.get('enabled', False),
-                        settings.get('time', {}).get('hour', 18),
-                        settings.get('time', {}).get('minute', 0)
-                    ):
-                        migration_stats['mailing_settings'] += 1
-
-            # Миграция change_notification_settings.json
-            if os.path.exists('change_notification_settings.json'):
-                with open('change_notification_settings.json', 'r', encoding='utf-8') as f:
-                    notification_data = json.load(f)
-                
-                for chat_id, enabled in notification_data.items():
-                    if self.set_change_notifications(chat_id, enabled):
-                        migration_stats['change_notifications'] += 1
+        statements = [
+            ('user_groups', f"{self.INSERT_IGNORE} INTO user_groups (chat_id, group_name) VALUES (%s, %s)", groups),
+            ('mailing_settings', f"""
+                {self.INSERT_IGNORE} INTO mailing_settings (chat_id, enabled, hour, minute) VALUES (%s, %s, %s, %s)
+            """, mailing),
+            ('change_notifications',
+             f"{self.INSERT_IGNORE} INTO change_notifications (chat_id, enabled) VALUES (%s, %s)", notifications),
+        ]
 
-            logger.info(f"✅ Миграция завершена: {migration_stats}")
-            return migration_stats
+        failed = False
+        try:
+            cursor = conn.cursor()
+            for table, sql, rows in statements:
+                for start in range(0, len(rows), batch_size):
+                    cursor.executemany(sql, rows[start:start + batch_size])
+                    stats[table] += cursor.rowcount
+                    conn.commit()
+        except Error as e:
+            failed = True
+            logger.error(f"❌ Ошибка импорта настроек чатов: {e}")
+        finally:
+            cursor.close()
+            conn.close()
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка миграции: {e}")
-            return migration_stats
+        # Часть пачек могла успеть записаться и до ошибки
+        if any(stats.values()):
+            settings_cache.clear()
+            settings_cache.publish_change()
+        return None if failed else stats
 
     # Получение информации о настройках
     def get_settings_info(self) -> Dict[str, Any]:
@@ -867,5 +1757,24 @@ class DatabaseManager:
             cursor.close()
             conn.close()
 
+def create_db_manager(backend: str = None) -> DatabaseManager:
+    """Менеджер базы данных выбранного хранилища (DB_BACKEND: mysql или sqlite)"""
+    backend = backend or db_config.backend
+    if backend == 'sqlite':
+        from sqlite_manager import SQLiteManager
+        return SQLiteManager(db_config.sqlite_path)
+    if backend != 'mysql':
+        raise ValueError(f"Неизвестное хранилище DB_BACKEND={backend}")
+    return DatabaseManager()
+
 # Глобальный экземпляр менеджера базы данных
-db_manager = DatabaseManager()
\ No newline at end of file
+db_manager = create_db_manager()
+# Версия настроек для нескольких процессов: в общем состоянии (redis) или в БД
+if shared_state.shared:
+    settings_cache.set_version_source(
+        lambda: shared_state.get_int('settings_version'),
+        lambda: shared_state.incr('settings_version'),
+        check_interval=SETTINGS_CACHE['version_check_interval'] or SHARED_STATE['poll_interval']
+    )
+else:
+    settings_cache.set_version_source(db_manager.get_settings_version, db_manager.bump_settings_version)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import json
+import threading
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class FileIdCache:
+    """
+    Telegram file_id уже загруженных файлов.
+    Повторная отправка по file_id не загружает файл заново.
+    """
+
+    def __init__(self, cache_file: str = 'cache/file_ids.json'):
+        self.cache_file = cache_file
+        self._file_ids = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self._file_ids = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки кэша file_id: {e}")
+            self._file_ids = {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._file_ids, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения кэша file_id: {e}")
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._file_ids.get(key)
+
+    def set(self, key: str, file_id: str):
+        with self._lock:
+            self._file_ids[key] = file_id
+            self._save()
+
+    def invalidate(self, key: str):
+        """Забыть file_id (например, если Telegram его больше не принимает)"""
+        with self._lock:
+            if self._file_ids.pop(key, None) is not None:
+                self._save()
+
+    def keep_version(self, version: str):
+        """Удалить file_id всех версий файла расписания, кроме текущей"""
+        with self._lock:
+            stale = [key for key in self._file_ids if f":{version}:" not in key]
+            for key in stale:
+                del self._file_ids[key]
+            if stale:
+                self._save()
+
+# Глобальный экземпляр кэша file_id
+file_id_cache = FileIdCache()
\ No newline at end of file
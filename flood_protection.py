@@ -1,14 +1,35 @@
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from mysql.connector import Error
 from database_manager import db_manager
+from shared_state import shared_state
+from config import SHARED_STATE
 import logging
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
 class FloodProtection:
-    def __init__(self):
-        self.user_requests = {}  # Кэш запросов пользователей
+    """
+    Анти-флуд: окно запросов за минуту и кэш бана живут в shared_state -
+    в памяти процесса по умолчанию или в Redis, общие для всех процессов бота.
+    """
+
+    def __init__(self, state=None):
+        self.state = state or shared_state
+
+    def is_banned(self, chat_id: str) -> bool:
+        """Проверка бана с кэшем на ban_cache_seconds, чтобы не ходить в БД на каждый запрос"""
+        key = f"ban:{chat_id}"
+        cached = self.state.get(key)
+        if cached is not None:
+            return cached == '1'
+        banned = db_manager.is_banned(chat_id)
+        self.state.set(key, '1' if banned else '0', ttl=SHARED_STATE['ban_cache_seconds'])
+        return banned
+
+    def forget(self, chat_id: str):
+        """Сбросить кэш бана и окно запросов (после бана/разбана администратором)"""
+        self.state.delete(f"ban:{chat_id}", f"flood:{chat_id}")
 
     def check_flood(self, chat_id: str) -> Dict[str, Any]:
         """
@@ -21,7 +42,7 @@ class FloodProtection:
             return {'allowed': True, 'reason': 'flood_disabled'}
         
         # Проверяем бан и получаем информацию о нем
-        if db_manager.is_banned(chat_id):
+        if self.is_banned(chat_id):
             ban_info = self.get_ban_info(chat_id)
             return {
                 'allowed': False, 
@@ -29,48 +50,29 @@ class FloodProtection:
                 'ban_info': ban_info
             }
         
-        current_time = time.time()
-        user_key = str(chat_id)
-        
-        # Инициализация данных пользователя
-        if user_key not in self.user_requests:
-            self.user_requests[user_key] = {
-                'timestamps': [],
-                'last_cleanup': current_time
-            }
-        
-        user_data = self.user_requests[user_key]
-        
-        # Очистка старых записей (раз в минуту для пользователя)
-        if current_time - user_data['last_cleanup'] > 60:
-            user_data['timestamps'] = [
-                ts for ts in user_data['timestamps'] 
-                if current_time - ts < 60
-            ]
-            user_data['last_cleanup'] = current_time
-        
-        # Добавляем текущий запрос
-        user_data['timestamps'].append(current_time)
+        # Отмечаем текущий запрос в окне за последнюю минуту
+        requests_count = self.state.hit(f"flood:{chat_id}", 60)
         
         max_requests = settings.get('max_requests_per_minute', 30)
         
-        if len(user_data['timestamps']) > max_requests:
+        if requests_count > max_requests:
             # Превышен лимит - бан
             ban_duration = settings.get('ban_duration_minutes', 60)
             db_manager.ban_user(
                 chat_id, 
-                f"Flood protection: {len(user_data['timestamps'])} requests in 1 minute",
+                f"Flood protection: {requests_count} requests in 1 minute",
                 ban_duration
             )
             
-            # Очищаем историю
-            user_data['timestamps'] = []
+            # Очищаем историю, бан сразу виден всем процессам
+            self.state.delete(f"flood:{chat_id}")
+            self.state.set(f"ban:{chat_id}", '1', ttl=SHARED_STATE['ban_cache_seconds'])
             
             logger.warning(f"🚫 User {chat_id} banned for flood")
             return {
                 'allowed': False, 
                 'reason': 'flood_detected',
-                'requests_count': len(user_data['timestamps']),
+                'requests_count': requests_count,
                 'max_requests': max_requests,
                 'ban_duration': ban_duration
             }
@@ -78,7 +80,7 @@ class FloodProtection:
         return {
             'allowed': True,
             'reason': 'within_limits',
-            'requests_count': len(user_data['timestamps']),
+            'requests_count': requests_count,
             'max_requests': max_requests
         }
 
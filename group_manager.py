@@ -1,4 +1,5 @@
 from database_manager import db_manager
+from settings_cache import settings_cache
 from config import AVAILABLE_GROUPS
 
 class GroupManager:
@@ -14,7 +15,10 @@ class GroupManager:
 
     def get_group(self, chat_id: str) -> str:
         """Получение группы для чата"""
-        return db_manager.get_user_group(str(chat_id)) or ''
+        return settings_cache.get_or_load(
+            'group', chat_id, lambda: db_manager.get_user_group(str(chat_id), raise_errors=True) or '',
+            fallback=''
+        )
 
     def get_all_chats_with_group(self, group: str):
         """Получение всех чатов с определенной группой"""
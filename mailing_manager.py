@@ -1,4 +1,5 @@
 from database_manager import db_manager
+from settings_cache import settings_cache
 from datetime import datetime, time, timedelta
 import pytz
 
@@ -23,16 +24,19 @@ class MailingManager:
 
     def get_mailing_info(self, chat_id: str):
         """Получение информации о рассылке для чата"""
-        return db_manager.get_mailing_settings(str(chat_id))
+        return settings_cache.get_or_load(
+            'mailing', chat_id, lambda: db_manager.get_mailing_settings(str(chat_id), raise_errors=True),
+            fallback={'enabled': False, 'time': {'hour': 18, 'minute': 0}, 'timezone': 'Asia/Tomsk'}
+        )
 
     def is_mailing_enabled(self, chat_id: str) -> bool:
         """Проверка, включена ли рассылка для чата"""
-        settings = db_manager.get_mailing_settings(str(chat_id))
+        settings = self.get_mailing_info(chat_id)
         return settings.get('enabled', False)
 
     def get_mailing_time(self, chat_id: str) -> time:
         """Получение времени рассылки для чата"""
-        settings = db_manager.get_mailing_settings(str(chat_id))
+        settings = self.get_mailing_info(chat_id)
         time_settings = settings.get('time', {'hour': 18, 'minute': 0})
         return time(time_settings['hour'], time_settings['minute'])
 
@@ -40,6 +44,10 @@ class MailingManager:
         """Получение всех чатов с включенной рассылкой"""
         return db_manager.get_enabled_mailing_chats()
 
+    def get_all_subscribers(self):
+        """Получение всех чатов с включенной рассылкой вместе с группой и временем"""
+        return db_manager.get_mailing_subscribers()
+
     def get_next_mailing_datetime(self, chat_id: str) -> datetime:
         """Получение следующего времени рассылки"""
         mailing_time = self.get_mailing_time(chat_id)
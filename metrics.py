@@ -0,0 +1,246 @@
+import time
+import bisect
+import logging
+import functools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import METRICS
+
+logger = logging.getLogger(__name__)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Монотонный счетчик с метками (в формате Prometheus - *_total)"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+                for values, value in self.items()]
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами корзин, секунд"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets or METRICS['buckets']))
+        self._series = {}  # метки -> [счетчики корзин..., +Inf], сумма
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        with self._lock:
+            return {values: (list(series[0]), series[1]) for values, series in self._series.items()}
+
+    def quantile(self, q: float, counts: List[int]) -> float:
+        """Оценка квантиля по корзинам (линейно внутри корзины, как histogram_quantile)"""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, (counts, total_seconds) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {repr(total_seconds)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+class Metrics:
+    """
+    Метрики процесса бота: счетчики и гистограммы в памяти, текст в формате
+    Prometheus на локальном HTTP /metrics и сводка для администратора.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # (имя, справка, тип, функция -> {метки: значение})
+        self._runner = None
+
+        self.handler_seconds = self.histogram('bot_handler_seconds', 'Длительность обработчиков команд и кнопок', ('handler',))
+        self.handler_errors = self.counter('bot_handler_errors_total', 'Исключения в обработчиках', ('handler',))
+        self.db_queries = self.counter('bot_db_queries_total', 'Горячие запросы к БД: prepared - на соединении потока, once - на отдельном соединении', ('path',))
+        self.db_errors = self.counter('bot_db_errors_total', 'Ошибки горячих запросов к БД')
+        self.db_connections = self.counter('bot_db_connections_total', 'Открытые соединения с БД (остальные запросы открывают соединение на вызов)')
+        self.parser_cache = self.counter('bot_parser_cache_total', 'Запросы расписания: hit - из кэша, miss - разбор файла', ('result',))
+        self.workbook_loads = self.counter('bot_workbook_loads_total', 'Загрузки Excel файла расписания', ('where',))
+        self.workbook_load_seconds = self.histogram('bot_workbook_load_seconds', 'Длительность загрузки Excel файла', ('where',))
+        self.notifications = self.counter('bot_notifications_total', 'Отправка рассылок и уведомлений об изменениях', ('kind', 'result'))
+        self.retry_after = self.counter('bot_retry_after_total', 'Ответы Telegram RetryAfter (превышен лимит отправки)', ('where',))
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=None) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, help_text: str, kind: str, labels: Tuple[str, ...],
+                      collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Значения, которые читаются из других модулей в момент запроса /metrics"""
+        self._collectors.append((name, help_text, kind, labels, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, help_text, kind, labels, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.error(f"❌ Ошибка сбора метрики {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels, key)} {_format_value(value)}"
+                         for key, value in sorted(values.items()))
+        return '\n'.join(lines) + '\n'
+
+    def record_send(self, kind: str, error: Optional[BaseException] = None):
+        """Результат отправки рассылки/уведомления; RetryAfter считается отдельно"""
+        self.notifications.inc(kind, 'error' if error else 'ok')
+        if error is not None and self.is_retry_after(error):
+            self.retry_after.inc(kind)
+
+    @staticmethod
+    def is_retry_after(error: BaseException) -> bool:
+        from telegram.error import RetryAfter
+        return isinstance(error, RetryAfter)
+
+    def timed(self, name: str):
+        """Декоратор обработчика: длительность в bot_handler_seconds{handler=name}"""
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await handler(*args, **kwargs)
+                except Exception as e:
+                    self.handler_errors.inc(name)
+                    if self.is_retry_after(e):
+                        self.retry_after.inc('handler')
+                    raise
+                finally:
+                    self.handler_seconds.observe(time.perf_counter() - started, name)
+            wrapper.metrics_timed = True
+            return wrapper
+        return decorator
+
+    def instrument_handlers(self, application) -> int:
+        """Обернуть timed все зарегистрированные обработчики, включая шаги ConversationHandler"""
+        from telegram.ext import ConversationHandler
+
+        def wrap(handler) -> int:
+            if isinstance(handler, ConversationHandler):
+                nested = list(handler.entry_points) + list(handler.fallbacks)
+                for state_handlers in handler.states.values():
+                    nested.extend(state_handlers)
+                return sum(wrap(item) for item in nested)
+            callback = getattr(handler, 'callback', None)
+            if callback is None or getattr(callback, 'metrics_timed', False):
+                return 0
+            handler.callback = self.timed(callback.__name__)(callback)
+            return 1
+
+        count = sum(wrap(handler) for handlers in application.handlers.values() for handler in handlers)
+        logger.info(f"⏱️ Замер длительности подключен к {count} обработчикам")
+        return count
+
+    def handler_summary(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Обработчики с наибольшим суммарным временем: вызовы, среднее, p50/p95 в секундах"""
+        rows = []
+        for (name,), (counts, total_seconds) in self.handler_seconds.snapshot().items():
+            calls = sum(counts)
+            rows.append({
+                'handler': name,
+                'calls': calls,
+                'total': total_seconds,
+                'avg': total_seconds / calls if calls else 0.0,
+                'p50': self.handler_seconds.quantile(0.5, counts),
+                'p95': self.handler_seconds.quantile(0.95, counts),
+                'errors': self.handler_errors.value(name)
+            })
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows[:limit]
+
+    async def start_server(self, listen: str, port: int):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, listen, port).start()
+        except OSError as e:
+            logger.error(f"❌ Не удалось открыть /metrics на {listen}:{port}: {e}")
+            await self.stop_server()
+            return
+        logger.info(f"📈 Метрики: http://{listen}:{port}/metrics")
+
+    async def stop_server(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+# Глобальный экземпляр метрик процесса
+metrics = Metrics()
@@ -0,0 +1,213 @@
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Tuple
+from schedule_parser import ScheduleParser, read_day
+from schedule_model import DAYS, lessons_to_json, lessons_from_json
+from config import RANGES, EXCEL_FILE, PARSING_SERVICE
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Состояние процесса пула: последняя загруженная книга остается открытой
+_worker_workbook = None
+_worker_version = None
+
+def _worker_sheet(excel_file: str, version: str):
+    """Лист книги версии version и время ее загрузки в секундах (None - книга уже была открыта)"""
+    global _worker_workbook, _worker_version
+    load_seconds = None
+    if _worker_workbook is None or _worker_version != version:
+        from openpyxl import load_workbook
+        if _worker_workbook is not None:
+            _worker_workbook.close()
+        started = time.perf_counter()
+        _worker_workbook = load_workbook(excel_file, data_only=True)
+        load_seconds = time.perf_counter() - started
+        _worker_version = version
+    return _worker_workbook.active, load_seconds
+
+def extract_days(excel_file: str, version: str, days_ranges: Dict[str, Dict[str, str]]) -> Tuple[Dict[str, list], Optional[float]]:
+    """
+    Разбор дней в процессе пула; результат - словари занятий, которые дешево передаются
+    между процессами, и время загрузки книги (метрики процесса пула в боте не видны)
+    """
+    worksheet, load_seconds = _worker_sheet(excel_file, version)
+    return {day: lessons_to_json(read_day(worksheet, day_ranges)) for day, day_ranges in days_ranges.items()}, load_seconds
+
+def _record_workbook_load(load_seconds: Optional[float]):
+    if load_seconds is not None:
+        metrics.workbook_loads.inc('pool')
+        metrics.workbook_load_seconds.observe(load_seconds, 'pool')
+
+class ParsingService:
+    """
+    Разбор Excel-файла вне цикла событий бота.
+    Промахи кэша парсера уходят в пул процессов с "теплой" книгой,
+    одновременные запросы одного ключа ждут один и тот же разбор.
+    """
+
+    def __init__(self, parser: ScheduleParser = None, max_workers: int = 1):
+        self._parser = parser
+        self.max_workers = max_workers
+        self._executor = None
+        self._version = None  # Версия файла, для которой заполнен кэш парсера
+        self._pending_version = None  # Прогреваемая версия: пока прогрев идет, отвечаем из старого кэша
+        self.on_new_version = None    # Запуск фонового прогрева при смене файла; True - прогрев запущен
+        self._inflight = {}   # ключ -> asyncio.Future разбора
+        self.hits = 0
+        self.extractions = 0
+        self.coalesced = 0
+
+    @property
+    def parser(self) -> ScheduleParser:
+        # Парсер создается при первом использовании, чтобы процессы пула не загружали его кэш при импорте
+        if self._parser is None:
+            self._parser = ScheduleParser()
+        return self._parser
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _sync_version(self) -> Optional[str]:
+        """
+        Реакция на смену файла расписания: если удалось запустить прогрев, старый кэш
+        продолжает отвечать до подмены, иначе кэш в памяти сбрасывается сразу.
+        """
+        version = self.parser.get_file_version()
+        if version != self._version and version != self._pending_version:
+            warming = self._version is not None and self.on_new_version is not None and self.on_new_version()
+            if not warming:
+                if self._version is not None:
+                    self.parser.drop_memory_cache()
+                self._version = version
+        return version
+
+    @property
+    def version(self) -> Optional[str]:
+        """Версия файла, из которой сейчас отвечает кэш парсера"""
+        return self._version
+
+    def served_version(self) -> Optional[str]:
+        """
+        Версия, данные которой вернут get_*_schedule: файл проверяется (смена файла запускает прогрев),
+        и пока новая версия прогревается, это прежняя версия
+        """
+        file_version = self._sync_version()
+        return self._version or file_version
+
+    @property
+    def pending_version(self) -> Optional[str]:
+        return self._pending_version
+
+    def begin_refresh(self, version: Optional[str]):
+        """Отметить, что версия прогревается и старый кэш отдается до swap()"""
+        self._pending_version = version
+
+    def swap(self, version: Optional[str], cache: Dict[str, Any]):
+        """Подмена кэша парсера готовыми данными версии version"""
+        self.parser.replace_cache(cache)
+        self._version = version
+        if self._pending_version == version:
+            self._pending_version = None
+
+    async def build_cache(self, version: str, groups=None) -> Dict[str, Any]:
+        """Разбор всех групп версии в пуле без изменения текущего кэша (для прогрева)"""
+        loop = asyncio.get_running_loop()
+        cache = {}
+        for group in groups or RANGES:
+            for week_type in ('even', 'odd'):
+                days_ranges = {day: RANGES[group][week_type][day] for day in DAYS}
+                raw, load_seconds = await loop.run_in_executor(self._get_executor(), extract_days, EXCEL_FILE, version, days_ranges)
+                _record_workbook_load(load_seconds)
+                self.extractions += 1
+                week = {day: lessons_from_json(lessons) for day, lessons in raw.items()}
+                cache[f"{group}_{week_type}_full"] = week
+                for day, lessons in week.items():
+                    cache[f"{group}_{week_type}_{day}"] = lessons
+        return cache
+
+    async def get_day_schedule(self, group: str, week_type: str, day: str) -> Tuple:
+        """Занятия группы на день"""
+        result = await self._get(group, week_type, day)
+        return result.get(day, ()) if result else ()
+
+    async def get_week_schedule(self, group: str, week_type: str) -> Dict[str, Tuple]:
+        """Занятия группы на неделю по дням"""
+        return await self._get(group, week_type, None) or {}
+
+    async def _get(self, group: str, week_type: str, day: Optional[str]) -> Dict[str, Tuple]:
+        if group not in RANGES:
+            raise ValueError(f"Группа {group} не найдена в конфигурации")
+
+        version = self._sync_version()
+        cached = self.parser.get_cached(group, week_type, day)
+        if cached is not None:
+            self.hits += 1
+            metrics.parser_cache.inc('hit')
+            return {day: cached} if day else cached
+        metrics.parser_cache.inc('miss')
+
+        if not version:
+            logger.error("❌ Файл расписания не найден")
+            return {}
+
+        key = (version, group, week_type, day)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._extract(version, group, week_type, day))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    async def _extract(self, version: str, group: str, week_type: str, day: Optional[str]) -> Dict[str, Tuple]:
+        days = (day,) if day else DAYS
+        days_ranges = {name: RANGES[group][week_type][name] for name in days}
+        try:
+            raw, load_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), extract_days, EXCEL_FILE, version, days_ranges
+            )
+        except BrokenProcessPool as e:
+            # Процесс пула упал - следующий запрос создаст пул заново
+            logger.error(f"❌ Пул разбора расписания остановлен: {e}")
+            self.shutdown()
+            return {}
+        except Exception as e:
+            logger.error(f"❌ Ошибка при разборе расписания для группы {group}: {e}")
+            return {}
+        self.extractions += 1
+        _record_workbook_load(load_seconds)
+
+        result = {name: lessons_from_json(lessons) for name, lessons in raw.items()}
+
+        # Файл мог смениться, пока шел разбор - тогда результат в кэш не кладем
+        if version == self._version:
+            value = result[day] if day else result
+            await asyncio.to_thread(self.parser.store, group, week_type, day, value)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'extractions': self.extractions,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight)
+        }
+
+# Глобальный экземпляр сервиса разбора расписания
+parsing_service = ParsingService(max_workers=PARSING_SERVICE['max_workers'])
@@ -0,0 +1,100 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Any, NamedTuple, Optional
+from file_id_cache import file_id_cache
+from config import PAYLOAD_CACHE
+
+logger = logging.getLogger(__name__)
+
+class Payload(NamedTuple):
+    """Готовое исходящее сообщение"""
+    text: str
+    parse_mode: Optional[str] = None
+
+class PayloadCache:
+    """
+    Готовые тексты рассылок и уведомлений по ключу (группа, версия файла, день, вид).
+    Текст формируется один раз и отправляется всем чатам группы без повторного рендеринга.
+    """
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._payloads = OrderedDict()
+        self._version = None  # Версия файла расписания, для которой хранятся тексты
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, group: str, version: Optional[str], day: str, kind: str,
+                      render: Callable[[], Payload]) -> Payload:
+        """Текст из кэша или результат render(); при новой версии файла старые тексты сбрасываются"""
+        key = (group, version, day, kind)
+        with self._lock:
+            if version != self._version:
+                self._payloads.clear()
+                self._version = version
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+
+        payload = Payload(*render())
+
+        # Без версии (файла нет) текст не кэшируем
+        if version is not None:
+            with self._lock:
+                if version == self._version:
+                    self._payloads[key] = payload
+                    if len(self._payloads) > self.max_entries:
+                        self._payloads.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+            self._version = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._payloads),
+            'max_size': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'file_ids': len(file_id_cache)
+        }
+
+async def send_document(bot, chat_id, key: str, path: str, filename: str,
+                        caption: str = None, as_photo: bool = False):
+    """
+    Отправка файла один раз с загрузкой, дальше - по сохраненному file_id.
+    key должен содержать версию файла расписания (см. FileIdCache.keep_version).
+    """
+    file_id = file_id_cache.get(key)
+    if file_id:
+        try:
+            if as_photo:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            return await bot.send_document(chat_id=chat_id, document=file_id, caption=caption)
+        except Exception as e:
+            logger.warning(f"⚠️ file_id для {key} не принят, загружаем файл заново: {e}")
+            file_id_cache.invalidate(key)
+
+    with open(path, 'rb') as f:
+        if as_photo:
+            sent = await bot.send_photo(chat_id=chat_id, photo=f, caption=caption)
+        else:
+            sent = await bot.send_document(chat_id=chat_id, document=f, filename=filename, caption=caption)
+
+    if as_photo and sent.photo:
+        file_id_cache.set(key, sent.photo[-1].file_id)
+    elif sent.document:
+        file_id_cache.set(key, sent.document.file_id)
+    return sent
+
+# Глобальный экземпляр кэша исходящих сообщений
+payload_cache = PayloadCache(max_entries=PAYLOAD_CACHE['max_entries'])
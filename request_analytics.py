@@ -0,0 +1,153 @@
+import time
+import threading
+from array import array
+from typing import Dict, Any, List, Tuple
+from config import REQUEST_ANALYTICS
+
+class CountMinSketch:
+    """Count-min sketch: оценка частоты ключа сверху с фиксированной памятью depth x width"""
+    __slots__ = ('width', 'depth', 'rows')
+
+    def __init__(self, width: int = 256, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('L', bytes(array('L').itemsize * width)) for _ in range(depth)]
+
+    def _cells(self, key: str):
+        for seed in range(self.depth):
+            yield seed, hash((seed, key)) % self.width
+
+    def add(self, key: str, count: int = 1):
+        for seed, cell in self._cells(key):
+            self.rows[seed][cell] += count
+
+    def estimate(self, key: str) -> int:
+        return min(self.rows[seed][cell] for seed, cell in self._cells(key))
+
+class SpaceSaving:
+    """Space-saving: не более capacity кандидатов в самые частые ключи"""
+    __slots__ = ('capacity', 'counts')
+
+    def __init__(self, capacity: int = 50):
+        self.capacity = capacity
+        self.counts = {}  # ключ -> оценка сверху
+
+    def add(self, key: str, count: int = 1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+        else:
+            # Вытесняем самый редкий ключ, новый наследует его счетчик
+            victim = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(victim) + count
+
+    def floor(self) -> int:
+        """Оценка сверху для ключа вне кандидатов: пока места есть, таких ключей не было"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+class _Bucket:
+    """Срез за bucket_seconds: счетчик, скетчи и кандидаты по командам и чатам"""
+    __slots__ = ('start', 'total', 'sketches', 'heavy')
+
+    def __init__(self, start: int, width: int, depth: int, capacity: int):
+        self.start = start
+        self.total = 0
+        self.sketches = {'command': CountMinSketch(width, depth), 'chat': CountMinSketch(width, depth)}
+        self.heavy = {'command': SpaceSaving(capacity), 'chat': SpaceSaving(capacity)}
+
+class RequestAnalytics:
+    """
+    Приближенные топ-K команд и чатов за последние N минут.
+    Память ограничена числом срезов в окне и не зависит от количества запросов.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, buckets: int = 60, sketch_width: int = 256,
+                 sketch_depth: int = 4, capacity: int = 50):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.capacity = capacity
+        self._ring = [None] * buckets
+        self._lock = threading.Lock()
+        self.started = time.time()  # Запросы раньше этого момента в срезах не учтены
+
+    @property
+    def window_minutes(self) -> int:
+        """Максимальное окно, на которое отвечает модуль"""
+        return self.bucket_seconds * self.buckets // 60
+
+    def _bucket(self, now: float) -> _Bucket:
+        start = int(now // self.bucket_seconds)
+        slot = start % self.buckets
+        bucket = self._ring[slot]
+        if bucket is None or bucket.start != start:
+            bucket = _Bucket(start, self.sketch_width, self.sketch_depth, self.capacity)
+            self._ring[slot] = bucket
+        return bucket
+
+    def record(self, chat_id: str, command: str = None):
+        """Учесть запрос"""
+        command = command or 'Unknown'
+        chat_id = str(chat_id)
+        with self._lock:
+            bucket = self._bucket(time.time())
+            bucket.total += 1
+            bucket.sketches['command'].add(command)
+            bucket.heavy['command'].add(command)
+            bucket.sketches['chat'].add(chat_id)
+            bucket.heavy['chat'].add(chat_id)
+
+    def covers(self, minutes: int) -> bool:
+        """Есть ли в памяти все запросы этого процесса за последние minutes минут"""
+        return minutes <= self.window_minutes and self.started <= time.time() - minutes * 60
+
+    def _window(self, minutes: int) -> List[_Bucket]:
+        newest = int(time.time() // self.bucket_seconds)
+        count = min(self.buckets, max(1, -(-minutes * 60 // self.bucket_seconds)))
+        return [bucket for bucket in self._ring
+                if bucket is not None and newest - count < bucket.start <= newest]
+
+    def top(self, dimension: str, minutes: int = 60, k: int = 10) -> List[Tuple[str, int]]:
+        """Топ-K ключей измерения ('command' или 'chat') за последние minutes минут"""
+        with self._lock:
+            window = self._window(minutes)
+            candidates = {}
+            for bucket in window:
+                for key, count in bucket.heavy[dimension].counts.items():
+                    candidates[key] = candidates.get(key, 0) + count
+
+            # В каждом срезе обе оценки завышены, поэтому берем меньшую и суммируем по срезам
+            floors = [bucket.heavy[dimension].floor() for bucket in window]
+            result = []
+            for key in candidates:
+                count = 0
+                for bucket, floor in zip(window, floors):
+                    heavy_count = bucket.heavy[dimension].counts.get(key, floor)
+                    count += min(heavy_count, bucket.sketches[dimension].estimate(key))
+                result.append((key, count))
+
+        result.sort(key=lambda item: item[1], reverse=True)
+        return result[:k]
+
+    def total(self, minutes: int = 60) -> int:
+        """Количество запросов за последние minutes минут"""
+        with self._lock:
+            return sum(bucket.total for bucket in self._window(minutes))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика модуля"""
+        return {
+            'window_minutes': self.window_minutes,
+            'active_buckets': sum(1 for bucket in self._ring if bucket is not None)
+        }
+
+# Глобальный экземпляр потоковой аналитики запросов
+request_analytics = RequestAnalytics(
+    bucket_seconds=REQUEST_ANALYTICS['bucket_seconds'],
+    buckets=REQUEST_ANALYTICS['buckets'],
+    sketch_width=REQUEST_ANALYTICS['sketch_width'],
+    sketch_depth=REQUEST_ANALYTICS['sketch_depth'],
+    capacity=REQUEST_ANALYTICS['capacity']
+)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import sys
+import gzip
+import json
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from database_manager import db_manager
+from config import REQUEST_STATS_RETENTION
+
+logger = logging.getLogger(__name__)
+
+class RequestRetention:
+    """
+    Очистка request_stats: записи старше retention_days выгружаются в архив
+    (gzip JSONL по дням) и удаляются небольшими пачками по диапазону id.
+    """
+    REPORT_KEY = 'request_stats_retention'
+
+    def __init__(self, retention_days: int = 90, archive: bool = True, archive_dir: str = 'cache/request_archive',
+                 batch_size: int = 5000, batch_pause: float = 0.2):
+        self.retention_days = retention_days
+        self.archive = archive
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self._lock = threading.Lock()
+
+    def get_cutoff(self) -> datetime:
+        """Граница хранения, выровненная по часу (как часовые агрегаты статистики)"""
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        return cutoff.replace(minute=0, second=0, microsecond=0)
+
+    def _archive_rows(self, rows: List[Dict[str, Any]]):
+        """Дописать записи в архивные файлы по дням"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['timestamp'].strftime('%Y-%m-%d'), []).append(row)
+
+        for day, day_rows in by_day.items():
+            path = os.path.join(self.archive_dir, f"request_stats_{day}.jsonl.gz")
+            # Дозапись создает новый gzip-член в том же файле, gzip читает такие файлы целиком
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for row in day_rows:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+    def prune(self) -> Optional[Dict[str, Any]]:
+        """Удалить устаревшие записи; возвращает отчет или None, если очистка уже идет"""
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            started = time.monotonic()
+            cutoff = self.get_cutoff()
+            size_before = db_manager.get_table_size('request_stats')
+            deleted = archived = 0
+
+            while True:
+                rows = db_manager.get_expired_requests(cutoff, self.batch_size)
+                if not rows:
+                    break
+
+                if self.archive:
+                    self._archive_rows(rows)
+                    archived += len(rows)
+
+                removed = db_manager.delete_requests_range(rows[0]['id'], rows[-1]['id'], cutoff)
+                if not removed:
+                    logger.error("❌ Очистка request_stats остановлена: пачка не удалена")
+                    break
+                deleted += removed
+
+                if len(rows) < self.batch_size:
+                    break
+                time.sleep(self.batch_pause)
+
+            report = {
+                'finished_at': datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+                'cutoff': cutoff.strftime("%d.%m.%Y %H:%M"),
+                'deleted': deleted,
+                'archived': archived,
+                'size_before': size_before,
+                'size_after': db_manager.get_table_size('request_stats'),
+                'duration_seconds': round(time.monotonic() - started, 1)
+            }
+            db_manager.set_bot_setting(self.REPORT_KEY, json.dumps(report, ensure_ascii=False),
+                                       "Отчет последней очистки request_stats")
+            if deleted:
+                logger.info(f"🗑️ Из request_stats удалено {deleted} записей старше {report['cutoff']}")
+            return report
+        finally:
+            self._lock.release()
+
+    def compact(self) -> int:
+        """Перевести старые текстовые command/user_agent в словарь (разово после обновления схемы)"""
+        first_id, last_id = db_manager.get_request_id_range()
+        if first_id is None:
+            return 0
+
+        updated = 0
+        for start in range(first_id, last_id + 1, self.batch_size):
+            updated += db_manager.compact_requests_range(start, min(start + self.batch_size - 1, last_id))
+            time.sleep(self.batch_pause)
+        return updated
+
+    def get_last_report(self) -> Optional[Dict[str, Any]]:
+        """Отчет последней очистки"""
+        value = db_manager.get_bot_setting(self.REPORT_KEY)
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+# Глобальный экземпляр очистки статистики
+request_retention = RequestRetention(
+    retention_days=REQUEST_STATS_RETENTION['retention_days'],
+    archive=REQUEST_STATS_RETENTION['archive'],
+    archive_dir=REQUEST_STATS_RETENTION['archive_dir'],
+    batch_size=REQUEST_STATS_RETENTION['batch_size'],
+    batch_pause=REQUEST_STATS_RETENTION['batch_pause']
+)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "help"
+    if command == "prune":
+        report = request_retention.prune()
+        print(json.dumps(report, ensure_ascii=False, indent=2) if report else "⚠️ Очистка уже выполняется")
+    elif command == "compact":
+        print(f"✅ Сжато значений: {request_retention.compact()}")
+    else:
+        print("Доступные команды:")
+        print("  python request_retention.py prune   - архивировать и удалить записи старше срока хранения")
+        print("  python request_retention.py compact - перевести старые текстовые записи в словарь")
\ No newline at end of file
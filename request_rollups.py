@@ -0,0 +1,94 @@
+import sys
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any
+from database_manager import db_manager
+from config import REQUEST_ROLLUPS
+
+logger = logging.getLogger(__name__)
+
+class RequestRollups:
+    """
+    Счетчики запросов в памяти по минутам: всего, по командам и по чатам.
+    Пачкой прибавляются к таблицам request_rollup_minute/request_rollup_hour при flush().
+    """
+
+    def __init__(self, minute_retention_minutes: int = 2880, prune_interval: int = 3600):
+        self.minute_retention_minutes = minute_retention_minutes
+        self.prune_interval = prune_interval
+        self._pending = {}  # (минута, измерение, ключ) -> количество
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.recorded = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def record(self, chat_id: str, command: str = None):
+        """Учесть запрос"""
+        bucket = datetime.now().replace(second=0, microsecond=0)
+        command = (command or 'Unknown')[:255]
+        with self._lock:
+            for key in ((bucket, 'total', 'total'), (bucket, 'command', command), (bucket, 'chat', str(chat_id))):
+                self._pending[key] = self._pending.get(key, 0) + 1
+            self.recorded += 1
+
+    def flush(self) -> int:
+        """Записать накопленные счетчики в БД одним пакетом"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        if pending:
+            if not db_manager.save_request_rollups(pending):
+                # Возвращаем счетчики, чтобы не потерять их до следующей записи
+                with self._lock:
+                    for key, count in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + count
+                    self.failed_flushes += 1
+                return 0
+            self.flushed += len(pending)
+
+        now = time.monotonic()
+        if now - self._last_prune >= self.prune_interval:
+            self._last_prune = now
+            removed = db_manager.prune_request_rollups(self.minute_retention_minutes)
+            if removed:
+                logger.info(f"🗑️ Удалено устаревших минутных срезов статистики: {removed}")
+
+        return len(pending)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика агрегатора"""
+        return {
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'flushed': self.flushed,
+            'failed_flushes': self.failed_flushes
+        }
+
+# Глобальный экземпляр агрегатора статистики
+request_rollups = RequestRollups(
+    minute_retention_minutes=REQUEST_ROLLUPS['minute_retention_minutes'],
+    prune_interval=REQUEST_ROLLUPS['prune_interval']
+)
+
+def backfill():
+    """Пересчет агрегатов из существующих записей request_stats"""
+    # Счетчики моложе двух интервалов записи могут еще лежать в памяти работающего бота
+    cutoff = datetime.now() - timedelta(seconds=REQUEST_ROLLUPS['flush_interval'] * 2)
+    print(f"🔄 Пересчет агрегатов статистики до {cutoff.strftime('%d.%m.%Y %H:%M')}...")
+    result = db_manager.backfill_request_rollups(cutoff)
+    if not result:
+        print("❌ Не удалось пересчитать агрегаты")
+        return False
+    print(f"✅ Минутных срезов: {result['minute_rows']}, часовых срезов: {result['hour_rows']}")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        sys.exit(0 if backfill() else 1)
+    else:
+        print("Доступные команды:")
+        print("  python request_rollups.py backfill - пересчитать агрегаты статистики из request_stats")
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import json
+import shutil
+import asyncio
+import threading
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional
+from schedule_model import DAYS
+from academic_calendar import academic_calendar
+from bells_index import bells_index, pair_number, parse_interval, format_minutes
+from parsing_service import parsing_service
+from config import SCHEDULE_EXPORT
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ics', 'json')
+
+def _ics_escape(text: str) -> str:
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def _ics_fold(line: str) -> str:
+    """Перенос длинных строк iCalendar (не более 75 октетов в строке)"""
+    parts = []
+    current = ''
+    for char in line:
+        if len((current + char).encode('utf-8')) > 75:
+            parts.append(current)
+            current = ' ' + char
+        else:
+            current += char
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+class ScheduleExporter:
+    """
+    Выгрузка расписания группы в iCalendar и JSON.
+    Файлы строятся один раз на версию файла расписания и лежат в export_dir/<версия>/.
+    Занятия берутся из общего кэша parsing_service, своего парсера у выгрузки нет.
+    """
+
+    def __init__(self, export_dir: str = 'cache/export', timezone: str = 'Asia/Tomsk', utc_offset: str = '+0700'):
+        self.export_dir = export_dir
+        self.timezone = timezone
+        self.utc_offset = utc_offset
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.served_from_disk = 0
+
+    def _lesson_times(self, day: str, lesson) -> Optional[tuple]:
+        """Начало и конец занятия в минутах: по звонкам, а если пары нет в звонках - из ячейки времени"""
+        number = pair_number(lesson.pair)
+        for pair in bells_index.get_pairs(day):
+            if pair.number == number:
+                return pair.start, pair.end
+        try:
+            return parse_interval(lesson.time)
+        except (ValueError, AttributeError):
+            return None
+
+    def build_data(self, group: str, version: str, week_schedules: Dict[str, Dict[str, tuple]]) -> Dict[str, Any]:
+        """Расписание группы на обе недели со временем занятий (week_schedules - тип недели -> занятия по дням)"""
+        weeks = {}
+        for week_type in ('even', 'odd'):
+            weeks[week_type] = {}
+            week_schedule = week_schedules.get(week_type) or {}
+            for day in DAYS:
+                lessons = []
+                for lesson in week_schedule.get(day, ()):
+                    times = self._lesson_times(day, lesson)
+                    lessons.append({
+                        'pair': lesson.pair,
+                        'time': lesson.time,
+                        'start': format_minutes(times[0]) if times else None,
+                        'end': format_minutes(times[1]) if times else None,
+                        'discipline': lesson.discipline
+                    })
+                weeks[week_type][day] = lessons
+        return {
+            'group': group,
+            'version': version,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'weeks': weeks
+        }
+
+    def _first_date(self, since: date, week_type: str, day: str) -> date:
+        """Первая дата начиная с since с заданными типом недели и днем"""
+        for offset in range(14):
+            info = academic_calendar.resolve(since + timedelta(days=offset))
+            if info.week_type == week_type and info.day_name == day:
+                return info.date
+        raise ValueError(f"Нет даты для {week_type} {day}")
+
+    def build_ics(self, data: Dict[str, Any]) -> str:
+        """iCalendar: каждое занятие - событие с повтором раз в две недели до конца учебного года"""
+        today = date.today()
+        since = today - timedelta(days=today.weekday())
+        _, year_end = academic_calendar.year_bounds(today)
+        # При DTSTART с TZID граница UNTIL по RFC 5545 указывается в UTC
+        sign = -1 if self.utc_offset.startswith('-') else 1
+        offset = timedelta(hours=int(self.utc_offset[1:3]), minutes=int(self.utc_offset[3:5])) * sign
+        until = (datetime.combine(year_end, datetime.max.time()) - offset).strftime('%Y%m%dT%H%M%SZ')
+        holidays = academic_calendar.holidays_between(since, year_end)
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+
+        lines = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//college-schedule-bot//RU',
+            'CALSCALE:GREGORIAN',
+            f"X-WR-CALNAME:{_ics_escape('Расписание ' + data['group'])}",
+            'BEGIN:VTIMEZONE',
+            f'TZID:{self.timezone}',
+            'BEGIN:STANDARD',
+            'DTSTART:19700101T000000',
+            f'TZOFFSETFROM:{self.utc_offset}',
+            f'TZOFFSETTO:{self.utc_offset}',
+            'END:STANDARD',
+            'END:VTIMEZONE',
+        ]
+
+        for week_type, days in data['weeks'].items():
+            for day, lessons in days.items():
+                first = self._first_date(since, week_type, day)
+                for lesson in lessons:
+                    if not lesson['start']:
+                        continue
+                    start = datetime.combine(first, datetime.strptime(lesson['start'], '%H:%M').time())
+                    end = datetime.combine(first, datetime.strptime(lesson['end'], '%H:%M').time())
+                    summary = lesson['discipline'].split('\n')[0]
+                    lines += [
+                        'BEGIN:VEVENT',
+                        f"UID:{data['group']}-{week_type}-{DAYS.index(day)}-{lesson['pair']}-{data['version']}@schedule",
+                        f'DTSTAMP:{stamp}',
+                        f"DTSTART;TZID={self.timezone}:{start.strftime('%Y%m%dT%H%M%S')}",
+                        f"DTEND;TZID={self.timezone}:{end.strftime('%Y%m%dT%H%M%S')}",
+                        f'RRULE:FREQ=WEEKLY;INTERVAL=2;UNTIL={until}',
+                        f'SUMMARY:{_ics_escape(summary)}',
+                        f"DESCRIPTION:{_ics_escape(lesson['discipline'])}",
+                    ]
+                    exdates = [
+                        datetime.combine(holiday, start.time()).strftime('%Y%m%dT%H%M%S')
+                        for holiday in holidays
+                        if holiday >= first and (holiday - first).days % 14 == 0
+                    ]
+                    if exdates:
+                        lines.append(f"EXDATE;TZID={self.timezone}:{','.join(exdates)}")
+                    lines.append('END:VEVENT')
+
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(_ics_fold(line) for line in lines) + '\r\n'
+
+    def get_export_path(self, group: str, fmt: str, version: str) -> str:
+        return os.path.join(self.export_dir, version, f"{group}.{fmt}")
+
+    def _export_info(self, group: str, fmt: str, version: str) -> Dict[str, str]:
+        return {'path': self.get_export_path(group, fmt, version), 'version': version,
+                'filename': f"schedule_{group}.{fmt}"}
+
+    async def get_export(self, group: str, fmt: str) -> Optional[Dict[str, str]]:
+        """
+        Путь к файлу выгрузки для версии, из которой отвечает кэш (создается при первом запросе).
+        Возвращает {'path', 'version', 'filename'} или None, если файла расписания нет.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+        # Пока новая версия прогревается, кэш отвечает данными старой - и выгрузка берется под ее версией
+        version = parsing_service.served_version()
+        if not version:
+            return None
+
+        result = self._export_info(group, fmt, version)
+        if os.path.exists(result['path']):
+            self.served_from_disk += 1
+            return result
+
+        week_schedules = {week_type: await parsing_service.get_week_schedule(group, week_type)
+                          for week_type in ('even', 'odd')}
+        return await asyncio.to_thread(self._write_export, group, fmt, version, week_schedules)
+
+    def _write_export(self, group: str, fmt: str, version: str, week_schedules) -> Dict[str, str]:
+        result = self._export_info(group, fmt, version)
+        path = result['path']
+        with self._lock:
+            if os.path.exists(path):
+                return result
+
+            data = self.build_data(group, version, week_schedules)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            if fmt == 'json':
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            else:
+                with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                    f.write(self.build_ics(data))
+            os.replace(tmp_path, path)
+            self.generated += 1
+
+            if version == parsing_service.parser.get_file_version():
+                self._remove_old_versions(version)
+            logger.info(f"📤 Создана выгрузка {fmt} для группы {group} (версия {version})")
+        return result
+
+    def _remove_old_versions(self, version: str):
+        """Удаление выгрузок прошлых версий файла расписания"""
+        for name in os.listdir(self.export_dir):
+            path = os.path.join(self.export_dir, name)
+            if name != version and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'generated': self.generated, 'served_from_disk': self.served_from_disk}
+
+# Глобальный экземпляр выгрузки расписания
+schedule_exporter = ScheduleExporter(
+    export_dir=SCHEDULE_EXPORT['export_dir'],
+    timezone=SCHEDULE_EXPORT['timezone'],
+    utc_offset=SCHEDULE_EXPORT['utc_offset']
+)
\ No newline at end of file
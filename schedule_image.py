@@ -0,0 +1,262 @@
+import io
+import os
+import shutil
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from schedule_model import DAYS
+from bells_index import bells_index, pair_number, parse_interval, format_minutes
+from parsing_service import parsing_service
+from config import SCHEDULE_IMAGE
+
+logger = logging.getLogger(__name__)
+
+WEEK_TITLES = {'even': 'четная неделя', 'odd': 'нечетная неделя'}
+
+# Размеры и цвета таблицы
+CELL_WIDTH = 250
+TIME_WIDTH = 70
+HEADER_HEIGHT = 40
+TITLE_HEIGHT = 50
+LINE_HEIGHT = 18
+CELL_PADDING = 6
+BACKGROUND = (255, 255, 255)
+HEADER_BACKGROUND = (225, 235, 250)
+EMPTY_BACKGROUND = (245, 245, 245)
+GRID_COLOR = (170, 170, 170)
+TEXT_COLOR = (20, 20, 20)
+MUTED_COLOR = (110, 110, 110)
+
+def _wrap(draw, text: str, font, width: int) -> List[str]:
+    """Перенос текста по словам под ширину ячейки"""
+    lines = []
+    for paragraph in text.split('\n'):
+        current = ''
+        for word in paragraph.split():
+            candidate = f"{current} {word}".strip()
+            if current and draw.textlength(candidate, font=font) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        lines.append(current)
+    return lines
+
+def render_week_png(group: str, week_type: str, rows: List[Tuple[int, List[Optional[Tuple[str, str]]]]],
+                    font_path: str = None, font_size: int = 14) -> bytes:
+    """
+    Рисует сетку недели в PNG. Выполняется в отдельном процессе, поэтому принимает только простые данные:
+    rows - [(номер пары, [(время, дисциплина) или None по каждому дню])].
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.truetype(font_path, font_size)
+        bold = ImageFont.truetype(font_path, font_size + 2)
+    except (OSError, TypeError, AttributeError):
+        font = bold = ImageFont.load_default()
+
+    measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    text_width = CELL_WIDTH - 2 * CELL_PADDING
+
+    # Высота строки - по самой длинной ячейке
+    wrapped_rows = []
+    heights = []
+    for number, cells in rows:
+        wrapped = []
+        lines_count = 1
+        for cell in cells:
+            if cell:
+                lines = _wrap(measure, cell[1], font, text_width)
+                wrapped.append((cell[0], lines))
+                lines_count = max(lines_count, len(lines) + 1)
+            else:
+                wrapped.append(None)
+        wrapped_rows.append((number, wrapped))
+        heights.append(lines_count * LINE_HEIGHT + 2 * CELL_PADDING)
+
+    width = TIME_WIDTH + CELL_WIDTH * len(DAYS)
+    height = TITLE_HEIGHT + HEADER_HEIGHT + sum(heights)
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    draw.text((CELL_PADDING * 2, 15), f"Расписание {group} - {WEEK_TITLES.get(week_type, week_type)}",
+              font=bold, fill=TEXT_COLOR)
+
+    # Заголовок с днями
+    top = TITLE_HEIGHT
+    draw.rectangle([0, top, width - 1, top + HEADER_HEIGHT], fill=HEADER_BACKGROUND, outline=GRID_COLOR)
+    draw.text((CELL_PADDING, top + 12), "Пара", font=bold, fill=TEXT_COLOR)
+    for index, day in enumerate(DAYS):
+        left = TIME_WIDTH + index * CELL_WIDTH
+        draw.rectangle([left, top, left + CELL_WIDTH, top + HEADER_HEIGHT], outline=GRID_COLOR)
+        draw.text((left + CELL_PADDING, top + 12), day, font=bold, fill=TEXT_COLOR)
+
+    top += HEADER_HEIGHT
+    for (number, cells), row_height in zip(wrapped_rows, heights):
+        draw.rectangle([0, top, TIME_WIDTH, top + row_height], fill=HEADER_BACKGROUND, outline=GRID_COLOR)
+        draw.text((CELL_PADDING, top + CELL_PADDING), str(number), font=bold, fill=TEXT_COLOR)
+        for index, cell in enumerate(cells):
+            left = TIME_WIDTH + index * CELL_WIDTH
+            box = [left, top, left + CELL_WIDTH, top + row_height]
+            if not cell:
+                draw.rectangle(box, fill=EMPTY_BACKGROUND, outline=GRID_COLOR)
+                continue
+            draw.rectangle(box, fill=BACKGROUND, outline=GRID_COLOR)
+            time_text, lines = cell
+            y = top + CELL_PADDING
+            draw.text((left + CELL_PADDING, y), time_text, font=font, fill=MUTED_COLOR)
+            for line in lines:
+                y += LINE_HEIGHT
+                draw.text((left + CELL_PADDING, y), line, font=font, fill=TEXT_COLOR)
+        top += row_height
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def build_rows(week_schedule: Dict[str, Any]) -> List[Tuple[int, List[Optional[Tuple[str, str]]]]]:
+    """Строки сетки: пары по звонкам каждого дня и занятия группы на их местах"""
+    by_day = {}
+    numbers = set()
+    for day in DAYS:
+        times = {pair.number: f"{format_minutes(pair.start)}-{format_minutes(pair.end)}"
+                 for pair in bells_index.get_pairs(day)}
+        cells = {}
+        for lesson in week_schedule.get(day, ()):
+            number = pair_number(lesson.pair)
+            if number is None:
+                continue
+            time_text = times.get(number)
+            if time_text is None:
+                try:
+                    start, end = parse_interval(lesson.time)
+                    time_text = f"{format_minutes(start)}-{format_minutes(end)}"
+                except (ValueError, AttributeError):
+                    time_text = ''
+            cells[number] = (time_text, lesson.discipline)
+            numbers.add(number)
+        by_day[day] = cells
+
+    if not numbers:
+        return []
+    return [
+        (number, [by_day[day].get(number) for day in DAYS])
+        for number in range(min(numbers), max(numbers) + 1)
+    ]
+
+class ScheduleImageRenderer:
+    """
+    Картинка расписания группы на неделю.
+    Рисование идет в пуле процессов, готовые PNG лежат в image_dir/<версия файла>/,
+    одновременные запросы одной картинки ждут один и тот же рендер.
+    Занятия берутся из общего кэша parsing_service, в пул уходят только готовые строки таблицы.
+    """
+
+    def __init__(self, image_dir: str = 'cache/images', max_workers: int = 2,
+                 font_path: str = None, font_size: int = 14, service=None):
+        self.image_dir = image_dir
+        self.service = service or parsing_service
+        self.max_workers = max_workers
+        self.font_path = font_path
+        self.font_size = font_size
+        self._executor = None
+        self._inflight = {}  # ключ -> asyncio.Future рендера
+        self.renders = 0
+        self.hits = 0
+        self.render_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def get_image_path(self, group: str, week_type: str, version: str) -> str:
+        return os.path.join(self.image_dir, version, f"{group}_{week_type}.png")
+
+    def _image_info(self, group: str, week_type: str, version: str) -> Dict[str, str]:
+        return {'path': self.get_image_path(group, week_type, version), 'version': version,
+                'filename': f"schedule_{group}_{week_type}.png"}
+
+    async def get_image(self, group: str, week_type: str) -> Optional[Dict[str, str]]:
+        """
+        PNG расписания для версии, из которой отвечает кэш: {'path', 'version', 'filename'}
+        или None, если файла расписания нет.
+        """
+        # Пока новая версия прогревается, кэш отвечает данными старой - и картинка берется под ее версией
+        version = self.service.served_version()
+        if not version:
+            return None
+
+        result = self._image_info(group, week_type, version)
+        if os.path.exists(result['path']):
+            self.hits += 1
+            return result
+
+        key = (group, week_type, version)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(group, week_type, version))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.hits += 1
+        return await asyncio.shield(future)
+
+    async def _render(self, group: str, week_type: str, version: str) -> Dict[str, str]:
+        loop = asyncio.get_running_loop()
+        rows = build_rows(await self.service.get_week_schedule(group, week_type))
+        result = self._image_info(group, week_type, version)
+        path = result['path']
+
+        started = loop.time()
+        png = await loop.run_in_executor(
+            self._get_executor(), render_week_png, group, week_type, rows, self.font_path, self.font_size
+        )
+        self.render_seconds += loop.time() - started
+        self.renders += 1
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+        if version == self.service.parser.get_file_version():
+            self._remove_old_versions(version)
+        logger.info(f"🖼️ Нарисовано расписание {group} ({week_type}), {len(png)} байт")
+        return result
+
+    def _remove_old_versions(self, version: str):
+        """Удаление картинок прошлых версий файла расписания"""
+        for name in os.listdir(self.image_dir):
+            path = os.path.join(self.image_dir, name)
+            if name != version and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.renders
+        return {
+            'renders': self.renders,
+            'hits': self.hits,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'avg_render_ms': self.render_seconds / self.renders * 1000 if self.renders else 0.0
+        }
+
+# Глобальный экземпляр рендера картинок расписания
+schedule_image_renderer = ScheduleImageRenderer(
+    image_dir=SCHEDULE_IMAGE['image_dir'],
+    max_workers=SCHEDULE_IMAGE['max_workers'],
+    font_path=SCHEDULE_IMAGE['font_path'],
+    font_size=SCHEDULE_IMAGE['font_size']
+)
@@ -0,0 +1,111 @@
+import sys
+from typing import Dict, List, Tuple
+
+# Дни недели с занятиями в порядке следования
+DAYS = ('Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота')
+
+def intern_text(value) -> str:
+    """Приведение значения ячейки к строке с интернированием (одинаковые строки хранятся один раз)"""
+    if value is None:
+        return ''
+    text = str(value).strip()
+    return sys.intern(text) if text else ''
+
+class Lesson:
+    """Занятие: номер пары, время и дисциплина (вместе с преподавателем и аудиторией)"""
+    __slots__ = ('pair', 'time', 'discipline')
+
+    def __init__(self, pair: str = '', time: str = '', discipline: str = ''):
+        self.pair = intern_text(pair)
+        self.time = intern_text(time)
+        self.discipline = intern_text(discipline)
+
+    # Доступ по ключу для кода, который работал со словарями занятий
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'pair': self.pair, 'time': self.time, 'discipline': self.discipline}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str]) -> 'Lesson':
+        return cls(data.get('pair', ''), data.get('time', ''), data.get('discipline', ''))
+
+    def __eq__(self, other):
+        if not isinstance(other, Lesson):
+            return NotImplemented
+        return (self.pair, self.time, self.discipline) == (other.pair, other.time, other.discipline)
+
+    def __hash__(self):
+        return hash((self.pair, self.time, self.discipline))
+
+    def __repr__(self):
+        return f"Lesson(pair={self.pair!r}, time={self.time!r}, discipline={self.discipline!r})"
+
+def build_day_lessons(pair_numbers: List[List[str]], time_data: List[List[str]],
+                      schedule_data: List[List[str]]) -> Tuple[Lesson, ...]:
+    """Сборка занятий дня из значений диапазонов pair_numbers, time и schedule"""
+    lessons = []
+    for i, row in enumerate(schedule_data):
+        pair = pair_numbers[i][0] if i < len(pair_numbers) and pair_numbers[i][0] else ""
+        time_val = time_data[i][0] if i < len(time_data) and time_data[i][0] else ""
+
+        content = [str(cell).strip() for cell in row if cell and str(cell).strip() != '']
+        if content:
+            lessons.append(Lesson(pair, time_val, '\n'.join(content)))
+    return tuple(lessons)
+
+def lessons_to_json(lessons) -> List[Dict[str, str]]:
+    """Занятия в формате файлового кэша"""
+    return [lesson.to_dict() for lesson in lessons]
+
+def lessons_from_json(data) -> Tuple[Lesson, ...]:
+    """Занятия из формата файлового кэша"""
+    return tuple(Lesson.from_dict(item) for item in data)
+
+class CellGrid:
+    """
+    Диапазон ячеек листа: хранит только непустые ячейки и размеры.
+    to_rows() восстанавливает исходную сетку со всеми пустыми строками.
+    """
+    __slots__ = ('rows', 'cols', 'cells')
+
+    def __init__(self, rows: int, cols: int, cells: Tuple[Tuple[int, int, str], ...]):
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+
+    @classmethod
+    def from_rows(cls, rows: List[List[str]]) -> 'CellGrid':
+        cols = max((len(row) for row in rows), default=0)
+        cells = tuple(
+            (r, c, intern_text(value))
+            for r, row in enumerate(rows)
+            for c, value in enumerate(row)
+            if value
+        )
+        return cls(len(rows), cols, cells)
+
+    def to_rows(self) -> List[List[str]]:
+        grid = [[""] * self.cols for _ in range(self.rows)]
+        for r, c, value in self.cells:
+            grid[r][c] = value
+        return grid
+
+    def to_json(self) -> list:
+        return [self.rows, self.cols, [list(cell) for cell in self.cells]]
+
+    @classmethod
+    def from_json(cls, data: list) -> 'CellGrid':
+        rows, cols, cells = data
+        return cls(rows, cols, tuple((r, c, intern_text(value)) for r, c, value in cells))
+
+    def __eq__(self, other):
+        if not isinstance(other, CellGrid):
+            return NotImplemented
+        return (self.rows, self.cols, self.cells) == (other.rows, other.cols, other.cells)
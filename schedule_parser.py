@@ -3,7 +3,47 @@ from openpyxl import load_workbook
 from datetime import datetime
 import os
 import json
+import time
 from config import RANGES, WEEK_CONFIG, EXCEL_FILE, LAST_UPDATE_FILE
+from schedule_model import DAYS, build_day_lessons, lessons_to_json, lessons_from_json
+from academic_calendar import academic_calendar
+from single_flight import SingleFlight
+from metrics import metrics
+
+def read_cell_range(worksheet, cell_range):
+    """Значения ячеек диапазона строками"""
+    values = []
+    for row in worksheet[cell_range]:
+        values.append([str(cell.value).strip() if cell.value is not None else "" for cell in row])
+    return values
+
+def read_day(worksheet, day_ranges):
+    """Чтение занятий одного дня из листа"""
+    pair_numbers = read_cell_range(worksheet, day_ranges['pair_numbers'])
+    time_data = read_cell_range(worksheet, day_ranges['time'])
+    schedule_data = read_cell_range(worksheet, day_ranges['schedule'])
+    return build_day_lessons(pair_numbers, time_data, schedule_data)
+
+def cache_from_json(data):
+    """Файловый кэш (словари занятий) -> компактные записи Lesson"""
+    cache = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            cache[key] = {day: lessons_from_json(lessons) for day, lessons in value.items()}
+        else:
+            cache[key] = lessons_from_json(value)
+    return cache
+
+def cache_to_json(cache):
+    """Компактные записи Lesson -> формат файлового кэша (и снимка в общем состоянии)"""
+    data = {}
+    # Снимок: кэш может пополняться из другого потока во время сохранения
+    for key, value in list(cache.items()):
+        if isinstance(value, dict):
+            data[key] = {day: lessons_to_json(lessons) for day, lessons in value.items()}
+        else:
+            data[key] = lessons_to_json(value)
+    return data
 
 class ScheduleParser:
     def __init__(self):
@@ -11,6 +51,7 @@ class ScheduleParser:
         self.week_config = WEEK_CONFIG
         self._cache = {}
         self._cache_file = 'cache/schedule_data.cache'
+        self._flight = SingleFlight()  # Один разбор на ключ при одновременных промахах кэша
         self._load_cache()
 
     def _load_cache(self):
@@ -18,7 +59,7 @@ class ScheduleParser:
         try:
             if os.path.exists(self._cache_file):
                 with open(self._cache_file, 'r', encoding='utf-8') as f:
-                    self._cache = json.load(f)
+                    self._cache = self._cache_from_json(json.load(f))
                 print(f"✅ Загружен кэш из файла: {len(self._cache)} записей")
         except Exception as e:
             print(f"❌ Ошибка загрузки кэша: {e}")
@@ -28,48 +69,52 @@ class ScheduleParser:
         """Сохранение кэша в файл"""
         try:
             with open(self._cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self._cache, f, ensure_ascii=False, indent=2)
+                json.dump(self._cache_to_json(), f, ensure_ascii=False, indent=2)
             print(f"💾 Кэш сохранен в файл: {len(self._cache)} записей")
         except Exception as e:
             print(f"❌ Ошибка сохранения кэша: {e}")
 
+    def _cache_from_json(self, data):
+        return cache_from_json(data)
+
+    def _cache_to_json(self):
+        return cache_to_json(self._cache)
+
     def get_week_type(self):
         """Определение типа текущей недели"""
         return self.get_week_type_for_date(datetime.now())
 
     def get_week_type_for_date(self, date):
         """Определение типа недели для конкретной даты"""
-        try:
-            target_week = date.isocalendar()[1]
-            base_week_type = self.week_config['base_week_type']
-            base_week_number = self.week_config['base_week_number']
-            
-            weeks_difference = target_week - base_week_number
-            
-            if base_week_type == 'even':
-                return 'even' if weeks_difference % 2 == 0 else 'odd'
-            else:
-                return 'odd' if weeks_difference % 2 == 0 else 'even'
-        except:
-            return 'even' if date.isocalendar()[1] % 2 == 0 else 'odd'
+        return academic_calendar.week_type(date)
 
     def load_workbook(self):
         """Загрузка Excel файла"""
         if not os.path.exists(EXCEL_FILE):
             raise Exception('Файл расписания не найден')
-        return load_workbook(EXCEL_FILE, data_only=True)
+        started = time.perf_counter()
+        workbook = load_workbook(EXCEL_FILE, data_only=True)
+        metrics.workbook_loads.inc('parser')
+        metrics.workbook_load_seconds.observe(time.perf_counter() - started, 'parser')
+        return workbook
 
     def get_cell_range(self, worksheet, cell_range):
         """Получение значений из диапазона ячеек"""
-        cells = worksheet[cell_range]
-        values = []
-        for row in cells:
-            row_values = []
-            for cell in row:
-                value = str(cell.value).strip() if cell.value is not None else ""
-                row_values.append(value)
-            values.append(row_values)
-        return values
+        return read_cell_range(worksheet, cell_range)
+
+    def _read_day(self, worksheet, day_ranges):
+        """Чтение занятий одного дня из листа"""
+        return read_day(worksheet, day_ranges)
+
+    def get_cached(self, group, week_type, day=None):
+        """Занятия дня (или вся неделя при day=None) из кэша в памяти, None если их там нет"""
+        return self._cache.get(f"{group}_{week_type}_{day or 'full'}")
+
+    def store(self, group, week_type, day, value, save=True):
+        """Запись результата разбора в кэш (day=None - вся неделя)"""
+        self._cache[f"{group}_{week_type}_{day or 'full'}"] = value
+        if save:
+            self._save_cache()
 
     def get_day_schedule(self, group, week_type, day):
         """Получение расписания для конкретной группы, недели и дня"""
@@ -81,6 +126,16 @@ class ScheduleParser:
         # Проверяем кэш
         if cache_key in self._cache:
             return self._cache[cache_key]
+        
+        return self._flight.do((self.get_file_version(), cache_key), self._load_day, group, week_type, day)
+
+    def _load_day(self, group, week_type, day):
+        """Разбор дня из файла (выполняется один раз на ключ, см. SingleFlight)"""
+        cache_key = f"{group}_{week_type}_{day}"
+        
+        # Разбор в другом потоке мог закончиться между проверкой кэша и этим вызовом
+        if cache_key in self._cache:
+            return self._cache[cache_key]
             
         try:
             wb = self.load_workbook()
@@ -88,28 +143,7 @@ class ScheduleParser:
             
             day_ranges = self.ranges[group][week_type][day]
             
-            pair_numbers = self.get_cell_range(ws, day_ranges['pair_numbers'])
-            time_data = self.get_cell_range(ws, day_ranges['time'])
-            schedule_data = self.get_cell_range(ws, day_ranges['schedule'])
-            
-            lessons = []
-            for i in range(len(schedule_data)):
-                pair = pair_numbers[i][0] if i < len(pair_numbers) and pair_numbers[i][0] else ""
-                time_val = time_data[i][0] if i < len(time_data) and time_data[i][0] else ""
-                
-                row = schedule_data[i]
-                content = []
-                for cell in row:
-                    if cell and str(cell).strip() != '':
-                        content.append(str(cell).strip())
-                
-                if content:
-                    discipline = '\n'.join(content)
-                    lessons.append({
-                        'pair': pair,
-                        'time': time_val,
-                        'discipline': discipline
-                    })
+            lessons = self._read_day(ws, day_ranges)
             
             wb.close()
             
@@ -121,7 +155,7 @@ class ScheduleParser:
             
         except Exception as e:
             print(f"Ошибка при получении расписания для группы {group}: {e}")
-            return []
+            return ()
 
     def get_week_schedule(self, group, week_type):
         """Получение расписания на всю неделю (оптимизированная версия)"""
@@ -130,6 +164,15 @@ class ScheduleParser:
             
         cache_key = f"{group}_{week_type}_full"
         
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        
+        return self._flight.do((self.get_file_version(), cache_key), self._load_week, group, week_type)
+
+    def _load_week(self, group, week_type):
+        """Разбор недели из файла (выполняется один раз на ключ, см. SingleFlight)"""
+        cache_key = f"{group}_{week_type}_full"
+        
         if cache_key in self._cache:
             return self._cache[cache_key]
             
@@ -138,35 +181,10 @@ class ScheduleParser:
             ws = wb.active
             
             week_schedule = {}
-            days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
             
-            for day in days:
+            for day in DAYS:
                 day_ranges = self.ranges[group][week_type][day]
-                
-                pair_numbers = self.get_cell_range(ws, day_ranges['pair_numbers'])
-                time_data = self.get_cell_range(ws, day_ranges['time'])
-                schedule_data = self.get_cell_range(ws, day_ranges['schedule'])
-                
-                lessons = []
-                for i in range(len(schedule_data)):
-                    pair = pair_numbers[i][0] if i < len(pair_numbers) and pair_numbers[i][0] else ""
-                    time_val = time_data[i][0] if i < len(time_data) and time_data[i][0] else ""
-                    
-                    row = schedule_data[i]
-                    content = []
-                    for cell in row:
-                        if cell and str(cell).strip() != '':
-                            content.append(str(cell).strip())
-                    
-                    if content:
-                        discipline = '\n'.join(content)
-                        lessons.append({
-                            'pair': pair,
-                            'time': time_val,
-                            'discipline': discipline
-                        })
-                
-                week_schedule[day] = lessons
+                week_schedule[day] = self._read_day(ws, day_ranges)
             
             wb.close()
             
@@ -190,12 +208,12 @@ class ScheduleParser:
         text = f"📅 {day} ({week_type_text} неделя) - {group}\n\n"
         
         for lesson in lessons:
-            if lesson['pair']:
-                text += f"🔹 {lesson['pair']} пара"
-                if lesson['time']:
-                    text += f" ({lesson['time']})"
+            if lesson.pair:
+                text += f"🔹 {lesson.pair} пара"
+                if lesson.time:
+                    text += f" ({lesson.time})"
                 text += f"\n"
-            text += f"{lesson['discipline']}\n\n"
+            text += f"{lesson.discipline}\n\n"
         
         return text
 
@@ -211,17 +229,25 @@ class ScheduleParser:
                 text += "Занятий нет\n\n"
             else:
                 for lesson in lessons:
-                    if lesson['pair']:
-                        text += f"🔹 {lesson['pair']} пара"
-                        if lesson['time']:
-                            text += f" ({lesson['time']})"
+                    if lesson.pair:
+                        text += f"🔹 {lesson.pair} пара"
+                        if lesson.time:
+                            text += f" ({lesson.time})"
                         text += f"\n"
-                    text += f"{lesson['discipline']}\n"
+                    text += f"{lesson.discipline}\n"
                 text += "\n"
             text += "─" * 30 + "\n\n"
         
         return text
 
+    def get_file_version(self):
+        """Версия файла расписания: меняется при каждой новой загрузке файла"""
+        try:
+            stat = os.stat(EXCEL_FILE)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
     def get_last_update(self):
         """Получение времени последнего обновления"""
         if os.path.exists(LAST_UPDATE_FILE):
@@ -229,6 +255,19 @@ class ScheduleParser:
                 return f.read().strip()
         return "Неизвестно"
 
+    def replace_cache(self, cache):
+        """Подмена кэша целиком (прогрев новой версии файла) с сохранением в файл"""
+        self._cache = cache
+        self._save_cache()
+
+    def get_flight_stats(self):
+        """Сколько разборов выполнено и сколько одновременных запросов дождались чужого"""
+        return self._flight.get_stats()
+
+    def drop_memory_cache(self):
+        """Сброс кэша в памяти (файловый кэш не трогается)"""
+        self._cache = {}
+
     def clear_cache(self):
         """Очистка кэша в памяти и файлового кэша"""
         self._cache = {}
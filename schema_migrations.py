@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import logging
+from typing import Callable, Dict, Any, List, NamedTuple, Optional
+from database_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+class Migration(NamedTuple):
+    """Разовая миграция: номер, название и функция, возвращающая True при успехе"""
+    version: int
+    name: str
+    apply: Callable[[Any], bool]
+
+def _base_schema(db) -> bool:
+    """
+    Все таблицы, индексы и колонки (CREATE TABLE IF NOT EXISTS - безопасно для существующей базы).
+    create_tables всегда создает текущую схему: в базе, где эта миграция уже записана,
+    ее изменения не появятся - для них нужна следующая миграция.
+    """
+    return db.create_tables()
+
+def _read_json(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _import_json_settings(db) -> bool:
+    """Перенос старых group_settings.json, mailing_settings.json и change_notification_settings.json"""
+    try:
+        groups = [(chat_id, group) for chat_id, group in _read_json('group_settings.json').items()]
+        mailing = [
+            (chat_id, settings.get('enabled', False),
+             settings.get('time', {}).get('hour', 18), settings.get('time', {}).get('minute', 0))
+            for chat_id, settings in _read_json('mailing_settings.json').items()
+        ]
+        notifications = [(chat_id, bool(enabled))
+                         for chat_id, enabled in _read_json('change_notification_settings.json').items()]
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"❌ Не удалось прочитать JSON настройки: {e}")
+        return False
+
+    if groups or mailing or notifications:
+        stats = db.import_chat_settings(groups, mailing, notifications)
+        if stats is None:
+            # Миграция не записывается и повторится при следующем запуске
+            return False
+        logger.info(f"✅ Импортированы настройки из JSON: {stats}")
+    return True
+
+def _dictionary_binary_collation(db) -> bool:
+    """request_dictionary с побайтным сравнением значений, как в SQLite"""
+    return db.set_dictionary_binary_collation()
+
+# Порядок менять нельзя, новые миграции добавляются в конец со следующим номером.
+# Каждое изменение create_tables/INDEXES/COLUMNS (MySQL) и TABLES (SQLite) требует новой миграции.
+# Новая база получает уже текущую схему из миграции 1, а затем выполняет и все следующие,
+# поэтому миграция должна проверять, что изменение еще не сделано (как _ensure_column/_ensure_index)
+MIGRATIONS = [
+    Migration(1, 'base_schema', _base_schema),
+    Migration(2, 'import_json_settings', _import_json_settings),
+    Migration(3, 'dictionary_binary_collation', _dictionary_binary_collation),
+]
+
+class SchemaMigrations:
+    """
+    Версионированные миграции схемы. При обычном старте выполняется один SELECT
+    версии; DDL и перенос данных идут только для еще не примененных миграций.
+    """
+
+    def __init__(self, db=None, migrations: List[Migration] = None):
+        self.db = db or db_manager
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration.version)
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1].version if self.migrations else 0
+
+    def pending(self, current: int) -> List[Migration]:
+        return [migration for migration in self.migrations if migration.version > current]
+
+    def run(self) -> Optional[int]:
+        """Применить недостающие миграции; возвращает версию схемы (None - база недоступна)"""
+        current = self.db.get_schema_version()
+        if current is None:
+            logger.error("❌ Миграции не выполнены: нет соединения с базой данных")
+            return None
+        if current >= self.latest_version:
+            return current
+
+        if not self.db.create_migrations_table():
+            return current
+
+        for migration in self.pending(current):
+            started = time.perf_counter()
+            logger.info(f"🛠️ Миграция {migration.version}: {migration.name}")
+            if not migration.apply(self.db):
+                logger.error(f"❌ Миграция {migration.version} ({migration.name}) не выполнена, остальные пропущены")
+                break
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            if not self.db.record_schema_migration(migration.version, migration.name, duration_ms):
+                break
+            current = migration.version
+            logger.info(f"✅ Миграция {migration.version} выполнена за {duration_ms} мс")
+        return current
+
+    def status(self) -> Dict[str, Any]:
+        applied = self.db.get_schema_migrations()
+        current = max((row['version'] for row in applied), default=0)
+        return {
+            'current': current,
+            'latest': self.latest_version,
+            'applied': applied,
+            'pending': [migration.name for migration in self.pending(current)]
+        }
+
+# Глобальный экземпляр миграций схемы
+schema_migrations = SchemaMigrations()
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "help"
+    if command == "migrate":
+        version = schema_migrations.run()
+        print(f"✅ Версия схемы: {version}")
+        sys.exit(0 if version == schema_migrations.latest_version else 1)
+    elif command == "status":
+        status = schema_migrations.status()
+        print(f"Версия схемы: {status['current']} из {status['latest']}")
+        for row in status['applied']:
+            print(f"  {row['version']:3d} {row['name']} ({row['duration_ms']} мс, {row['applied_at']})")
+        if status['pending']:
+            print(f"Ожидают: {', '.join(status['pending'])}")
+    else:
+        print("Доступные команды:")
+        print("  python schema_migrations.py migrate - применить недостающие миграции")
+        print("  python schema_migrations.py status  - показать примененные миграции")
@@ -0,0 +1,145 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from config import SETTINGS_CACHE
+
+logger = logging.getLogger(__name__)
+
+class SettingsCache:
+    """
+    Read-through кэш настроек чатов в памяти процесса.
+    Записи живут ttl_seconds, при переполнении вытесняются давно не использованные.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_size: int = 10000, version_check_interval: int = 0):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()  # (тип, chat_id) -> (истекает, значение)
+        self._lock = threading.Lock()
+        self._version_source = None
+        self._version_bump = None
+        self._known_version = None
+        self._last_version_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.load_errors = 0
+
+    def get_or_load(self, kind: str, chat_id, loader: Callable[[], Any], fallback: Any = None) -> Any:
+        """
+        Получить значение из кэша или загрузить его через loader.
+        Если loader упал (ошибка БД), возвращается fallback и в кэш ничего не пишется:
+        следующий запрос снова пойдет в базу.
+        """
+        self._check_version()
+        key = (kind, str(chat_id))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            value = loader()
+        except Exception as e:
+            self.load_errors += 1
+            logger.error(f"❌ Настройки {kind} для {chat_id} не загружены, в кэш не попадут: {e}")
+            return fallback
+        self.set(kind, chat_id, value)
+        return value
+
+    def set(self, kind: str, chat_id, value: Any):
+        """Сохранить значение в кэш"""
+        key = (kind, str(chat_id))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, chat_id, kind: Optional[str] = None):
+        """Сбросить настройки чата (все или только указанного типа)"""
+        chat_id = str(chat_id)
+        with self._lock:
+            keys = [key for key in self._entries if key[1] == chat_id and (kind is None or key[0] == kind)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._entries.clear()
+
+    def set_version_source(self, version_source: Callable[[], Optional[int]],
+                           version_bump: Callable[[], Any] = None, check_interval: int = None):
+        """
+        Источник версии настроек для нескольких процессов (БД или общее состояние).
+        Если версия изменилась, кэш сбрасывается целиком; version_bump увеличивает версию после записи.
+        """
+        self._version_source = version_source
+        self._version_bump = version_bump
+        if check_interval is not None:
+            self.version_check_interval = check_interval
+
+    def publish_change(self):
+        """Сообщить другим процессам об изменении настроек (если проверка версии включена)"""
+        if not self._version_bump or self.version_check_interval <= 0:
+            return
+        try:
+            self._version_bump()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления версии настроек: {e}")
+
+    def _check_version(self):
+        """Проверка версии настроек не чаще version_check_interval секунд"""
+        if not self._version_source or self.version_check_interval <= 0:
+            return
+
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return
+        self._last_version_check = now
+
+        try:
+            version = self._version_source()
+        except Exception as e:
+            logger.error(f"❌ Ошибка проверки версии настроек: {e}")
+            return
+
+        if version is None:
+            return
+        if self._known_version is not None and version != self._known_version:
+            self.clear()
+            logger.info(f"🔄 Кэш настроек сброшен: версия {self._known_version} -> {version}")
+        self._known_version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'load_errors': self.load_errors
+        }
+
+# Глобальный экземпляр кэша настроек
+settings_cache = SettingsCache(
+    ttl_seconds=SETTINGS_CACHE['ttl_seconds'],
+    max_size=SETTINGS_CACHE['max_size'],
+    version_check_interval=SETTINGS_CACHE['version_check_interval']
+)
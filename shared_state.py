@@ -0,0 +1,209 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+from config import SHARED_STATE
+
+logger = logging.getLogger(__name__)
+
+class MemoryState:
+    """
+    Общее состояние в памяти процесса - вариант по умолчанию для одного процесса бота.
+    Тот же интерфейс, что у RedisState: строковые значения со сроком жизни,
+    счетчики и скользящее окно запросов.
+    """
+    shared = False
+
+    def __init__(self):
+        self._values = {}   # ключ -> (истекает или None, значение)
+        self._windows = {}  # ключ -> deque отметок времени запросов
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _alive(self, key: str, now: float) -> Optional[tuple]:
+        entry = self._values.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            return entry[1] if entry else None
+
+    def get_int(self, key: str) -> Optional[int]:
+        value = self.get(key)
+        return int(value) if value is not None else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl if ttl else None, str(value))
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Записать значение, только если ключа нет (блокировка на ttl секунд)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._alive(key, now):
+                return False
+            self._values[key] = (now + ttl if ttl else None, str(value))
+            return True
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._windows.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            value = int(entry[1]) + 1 if entry else 1
+            self._values[key] = (entry[0] if entry else None, str(value))
+            return value
+
+    def hit(self, key: str, window: float) -> int:
+        """Отметить запрос и вернуть количество запросов по ключу за последние window секунд"""
+        now = time.monotonic()
+        with self._lock:
+            timestamps = self._windows.setdefault(key, deque())
+            timestamps.append(now)
+            while timestamps[0] <= now - window:
+                timestamps.popleft()
+            count = len(timestamps)
+            if now - self._last_sweep > window:
+                self._sweep(now, window)
+            return count
+
+    def _sweep(self, now: float, window: float):
+        """Удаление окон и значений, в которых не осталось живых данных"""
+        self._last_sweep = now
+        for key in [key for key, timestamps in self._windows.items() if timestamps[-1] <= now - window]:
+            del self._windows[key]
+        for key in [key for key, entry in self._values.items() if entry[0] is not None and entry[0] <= now]:
+            del self._values[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'backend': 'memory', 'keys': len(self._values), 'windows': len(self._windows)}
+
+class RedisState:
+    """
+    Общее состояние в Redis (или совместимом сервере) для нескольких процессов бота.
+    При недоступности сервера методы пишут ошибку в лог и возвращают нейтральный
+    результат: анти-флуд пропускает запрос, кэши считаются пустыми.
+    """
+    shared = True
+
+    def __init__(self, url: str = None, prefix: str = '', client=None):
+        import redis
+        # client - готовый клиент (например, fakeredis.FakeRedis для проверок без сервера)
+        self.client = client or redis.Redis.from_url(url, decode_responses=True, socket_timeout=1)
+        self.prefix = prefix
+        self.errors = 0
+        self._error_types = (redis.RedisError, OSError)
+
+    def _call(self, default, fn: Callable, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except self._error_types as e:
+            self.errors += 1
+            logger.error(f"❌ Ошибка общего состояния Redis: {e}")
+            return default
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._call(None, self.client.get, self._key(key))
+        return value.decode() if isinstance(value, bytes) else value
+
+    def get_int(self, key: str) -> Optional[int]:
+        value = self.get(key)
+        return int(value) if value is not None else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._call(None, self.client.set, self._key(key), value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """SET NX: записать значение, только если ключа нет (блокировка на ttl секунд)"""
+        return bool(self._call(False, self.client.set, self._key(key), value,
+                               nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, *keys: str):
+        if keys:
+            self._call(None, self.client.delete, *(self._key(key) for key in keys))
+
+    def incr(self, key: str) -> int:
+        return self._call(0, self.client.incr, self._key(key))
+
+    def hit(self, key: str, window: float) -> int:
+        """Скользящее окно на отсортированном множестве: одна транзакция на запрос"""
+        now = time.time()
+        key = self._key(key)
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.zremrangebyscore(key, 0, now - window)
+        pipeline.zadd(key, {uuid.uuid4().hex: now})
+        pipeline.zcard(key)
+        pipeline.pexpire(key, int(window * 1000))
+        result = self._call(None, pipeline.execute)
+        return result[2] if result else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': 'redis', 'keys': self._call(None, self.client.dbsize), 'errors': self.errors}
+
+class ReloadSignal:
+    """
+    Сигнал крона "файл расписания обновлен". В памяти процесса - файл-флаг, который
+    забирает один процесс; в общем состоянии - счетчик, изменение которого видит каждый процесс.
+    """
+
+    def __init__(self, state, flag_path: str = 'cache/reload_cache.flag', poll_interval: float = 1):
+        self.state = state
+        self.flag_path = flag_path
+        self.poll_interval = poll_interval
+        self._seen = None
+        self._last_poll = 0.0
+
+    def publish(self):
+        if self.state.shared:
+            self.state.incr('schedule_reload')
+        else:
+            with open(self.flag_path, 'w') as f:
+                f.write(time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    def consume(self) -> bool:
+        """True, если с прошлой проверки расписание обновлялось"""
+        if not self.state.shared:
+            if not os.path.exists(self.flag_path):
+                return False
+            os.remove(self.flag_path)
+            return True
+
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+
+        generation = self.state.get_int('schedule_reload') or 0
+        changed = self._seen is not None and generation != self._seen
+        self._seen = generation
+        return changed
+
+def create_shared_state(backend: str = None):
+    """Общее состояние выбранного типа (переменные окружения SHARED_STATE и REDIS_URL важнее config)"""
+    backend = backend or os.getenv('SHARED_STATE', SHARED_STATE['backend'])
+    if backend == 'redis':
+        url = os.getenv('REDIS_URL', SHARED_STATE['redis_url'])
+        logger.info("🔗 Общее состояние процессов: Redis")
+        return RedisState(url, SHARED_STATE['prefix'])
+    if backend != 'memory':
+        raise ValueError(f"Неизвестное общее состояние SHARED_STATE={backend}")
+    return MemoryState()
+
+# Глобальный экземпляр общего состояния процессов
+shared_state = create_shared_state()
+reload_signal = ReloadSignal(shared_state, poll_interval=SHARED_STATE['poll_interval'])
@@ -0,0 +1,67 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+class _Call:
+    """Выполняющийся вызов и его результат"""
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Схлопывание одновременных вызовов: пока вычисление по ключу идет,
+    остальные потоки с тем же ключом ждут его результат, а не считают заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # ключ -> _Call
+        self.executed = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """Результат fn(*args); одновременные вызовы с одним ключом получают один и тот же результат"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            inflight = len(self._calls)
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'max_waiters': self.max_waiters,
+            'inflight': inflight
+        }
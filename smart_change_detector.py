@@ -4,6 +4,7 @@ import os
 from datetime import datetime
 from openpyxl import load_workbook
 from config import RANGES, EXCEL_FILE
+from schedule_model import DAYS, CellGrid
 import difflib
 
 class SmartChangeDetector:
@@ -44,7 +45,7 @@ class SmartChangeDetector:
                     print(f"  📅 Обработка {day} ({week_type} неделя)")
                     
                     day_data = {
-                        'schedule': []  # ТОЛЬКО schedule данные
+                        'schedule': CellGrid(0, 0, ())  # ТОЛЬКО schedule данные
                     }
                     
                     # Читаем ТОЛЬКО schedule диапазон
@@ -61,7 +62,7 @@ class SmartChangeDetector:
                                     row_data.append(clean_value)
                                 # Сохраняем даже пустые строки для точного сравнения
                                 range_data.append(row_data)
-                            day_data['schedule'] = range_data
+                            day_data['schedule'] = CellGrid.from_rows(range_data)
                             print(f"    📊 schedule ({cell_range}): {len(range_data)} строк")
                             
                             # Показать содержимое для отладки
@@ -71,7 +72,7 @@ class SmartChangeDetector:
                                     
                         except Exception as e:
                             print(f"    ❌ Ошибка чтения {cell_range}: {e}")
-                            day_data['schedule'] = []
+                            day_data['schedule'] = CellGrid(0, 0, ())
                     
                     schedule_data['weeks'][week_type][day] = day_data
             
@@ -83,15 +84,41 @@ class SmartChangeDetector:
             print(f"❌ Критическая ошибка извлечения данных для {group}: {e}")
             return None
 
-    def calculate_smart_hash(self, group: str):
+    def _weeks_to_json(self, weeks: dict, compact: bool):
+        """Недели с сетками ячеек -> JSON (компактные сетки или полные строки)"""
+        return {
+            week_type: {
+                day: {'grid': day_data['schedule'].to_json()} if compact
+                else {'schedule': day_data['schedule'].to_rows()}
+                for day, day_data in days.items()
+            }
+            for week_type, days in weeks.items()
+        }
+
+    def _weeks_from_json(self, weeks: dict):
+        """JSON из кэша -> недели с сетками ячеек (поддерживается и старый формат со строками)"""
+        result = {}
+        for week_type, days in weeks.items():
+            result[week_type] = {}
+            for day, day_data in days.items():
+                if 'grid' in day_data:
+                    grid = CellGrid.from_json(day_data['grid'])
+                else:
+                    grid = CellGrid.from_rows(day_data.get('schedule', []))
+                result[week_type][day] = {'schedule': grid}
+        return result
+
+    def calculate_smart_hash(self, group: str, schedule_data: dict = None):
         """Умный расчет хэша - ТОЛЬКО schedule данные"""
-        schedule_data = self.extract_schedule_data(group)
+        if schedule_data is None:
+            schedule_data = self.extract_schedule_data(group)
         if not schedule_data:
             return None
         
-        # Создаем строку для хэширования, исключая метаданные
+        # Создаем строку для хэширования, исключая метаданные.
+        # Хэш считается по полным строкам, чтобы совпадать с ранее сохраненными
         hash_data = {
-            'weeks': schedule_data['weeks']
+            'weeks': self._weeks_to_json(schedule_data['weeks'], compact=False)
         }
         
         data_string = json.dumps(hash_data, sort_keys=True, ensure_ascii=False)
@@ -104,7 +131,8 @@ class SmartChangeDetector:
         """Проверка изменений - ТОЛЬКО schedule данные"""
         print(f"\n🎯 ПРОВЕРКА ИЗМЕНЕНИЙ: {group}")
         
-        current_hash = self.calculate_smart_hash(group)
+        current_data = self.extract_schedule_data(group)
+        current_hash = self.calculate_smart_hash(group, current_data)
         if not current_hash:
             print("❌ Не удалось вычислить хэш")
             return False, "Не удалось вычислить хэш"
@@ -113,7 +141,7 @@ class SmartChangeDetector:
         
         if not old_data or 'hash' not in old_data:
             print(f"📝 Первый запуск для {group}, сохраняем данные")
-            self.save_schedule_data(group, self.extract_schedule_data(group), current_hash)
+            self.save_schedule_data(group, current_data, current_hash)
             return False, "Первый запуск"
         
         old_hash = old_data.get('hash')
@@ -127,8 +155,7 @@ class SmartChangeDetector:
         print(f"   Новый хэш:  {current_hash[:16]}...")
         
         # Детальный анализ изменений
-        current_data = self.extract_schedule_data(group)
-        changes = self.analyze_changes(group, old_data, current_data)
+        changes = self.analyze_changes(group, old_data.get('data') or {}, current_data)
         
         # Сохраняем новые данные
         self.save_schedule_data(group, current_data, current_hash)
@@ -142,21 +169,23 @@ class SmartChangeDetector:
         try:
             for week_type in ['even', 'odd']:
                 if week_type in old_data.get('weeks', {}) and week_type in new_data.get('weeks', {}):
-                    for day in ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']:
+                    for day in DAYS:
                         if day in old_data['weeks'][week_type] and day in new_data['weeks'][week_type]:
                             old_day_data = old_data['weeks'][week_type][day]
                             new_day_data = new_data['weeks'][week_type][day]
                             
                             # Сравниваем ТОЛЬКО schedule данные
-                            old_schedule = old_day_data.get('schedule', [])
-                            new_schedule = new_day_data.get('schedule', [])
+                            old_grid = old_day_data['schedule']
+                            new_grid = new_day_data['schedule']
                             
-                            if old_schedule != new_schedule:
+                            if old_grid != new_grid:
                                 change_desc = f"{week_type}_{day}"
                                 changes.append(change_desc)
                                 print(f"   📝 Изменения в {day} ({week_type} неделя)")
                                 
                                 # Детальное сравнение значений
+                                old_schedule = old_grid.to_rows()
+                                new_schedule = new_grid.to_rows()
                                 max_rows = max(len(old_schedule), len(new_schedule))
                                 for i in range(max_rows):
                                     old_row = old_schedule[i] if i < len(old_schedule) else []
@@ -179,7 +208,10 @@ class SmartChangeDetector:
             if os.path.exists(self.cache_file):
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    return data.get(cache_key)
+                    group_data = data.get(cache_key)
+                    if group_data and group_data.get('data'):
+                        group_data['data']['weeks'] = self._weeks_from_json(group_data['data'].get('weeks', {}))
+                    return group_data
         except Exception as e:
             print(f"❌ Ошибка чтения старых данных: {e}")
         return None
@@ -193,8 +225,11 @@ class SmartChangeDetector:
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
                     cache_data = json.load(f)
             
+            stored_data = dict(schedule_data)
+            stored_data['weeks'] = self._weeks_to_json(schedule_data['weeks'], compact=True)
+            
             cache_data[cache_key] = {
-                'data': schedule_data,
+                'data': stored_data,
                 'hash': hash_value,
                 'last_update': datetime.now().isoformat(),
                 'last_update_human': datetime.now().strftime("%d.%m.%Y %H:%M:%S")
@@ -217,7 +252,7 @@ class SmartChangeDetector:
             print(f"❌ Не удалось извлечь данные для группы {group}")
             return False
         
-        current_hash = self.calculate_smart_hash(group)
+        current_hash = self.calculate_smart_hash(group, current_data)
         if not current_hash:
             print(f"❌ Не удалось вычислить хэш для группы {group}")
             return False
@@ -256,7 +291,7 @@ class SmartChangeDetector:
             print("❌ Не удалось извлечь текущие данные")
             return
         
-        current_hash = self.calculate_smart_hash(group)
+        current_hash = self.calculate_smart_hash(group, current_data)
         old_data = self.get_old_data(group)
         
         print(f"📊 Текущий хэш: {current_hash}")
@@ -270,7 +305,7 @@ class SmartChangeDetector:
                 print(f"  📅 {week_type.upper()} НЕДЕЛЯ:")
                 for day, day_data in current_data['weeks'][week_type].items():
                     print(f"    📝 {day}:")
-                    schedule_data = day_data.get('schedule', [])
+                    schedule_data = day_data['schedule'].to_rows()
                     print(f"      schedule ({len(schedule_data)} строк):")
                     for i, row in enumerate(schedule_data):
                         if any(cell.strip() for cell in row):  # Показываем только непустые строки
@@ -313,7 +348,7 @@ class SmartChangeDetector:
             print(f"❌ Не удалось извлечь данные для группы {group}")
             return False
         
-        current_hash = self.calculate_smart_hash(group)
+        current_hash = self.calculate_smart_hash(group, current_data)
         if not current_hash:
             print(f"❌ Не удалось вычислить хэш для группы {group}")
             return False
@@ -0,0 +1,616 @@
+import os
+import sqlite3
+import threading
+import logging
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from mysql.connector import Error
+from database_manager import DatabaseManager
+from metrics import metrics
+from config import SQLITE_STORAGE, REQUEST_ROLLUPS
+
+logger = logging.getLogger(__name__)
+
+# Даты хранятся текстом 'ГГГГ-ММ-ДД ЧЧ:ММ:СС' в локальном времени, как и в MySQL
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+NOW = "datetime('now', 'localtime')"
+
+@lru_cache(maxsize=512)
+def to_qmark(sql: str) -> str:
+    """Запрос в стиле mysql.connector (%s, %%) для sqlite3 (?)"""
+    return sql.replace('%s', '?').replace('%%', '%')
+
+def _storage_error(e: sqlite3.Error) -> Error:
+    """Ошибка SQLite в виде mysql.connector.Error, который перехватывают методы DatabaseManager"""
+    message = str(e)
+    return Error(msg=message, errno=1146 if message.startswith('no such table') else None)
+
+class SQLiteCursor:
+    """Курсор sqlite3 с интерфейсом mysql.connector: параметры %s, dictionary=True, column_names"""
+
+    def __init__(self, connection: 'SQLiteConnection', dictionary: bool = False):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql: str, params=()):
+        try:
+            self._cursor.execute(to_qmark(sql), tuple(params))
+        except sqlite3.Error as e:
+            raise _storage_error(e) from e
+        self._connection.after_statement()
+
+    def executemany(self, sql: str, rows):
+        try:
+            self._cursor.executemany(to_qmark(sql), rows)
+        except sqlite3.Error as e:
+            raise _storage_error(e) from e
+        self._connection.after_statement()
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchall(self) -> list:
+        rows = self._cursor.fetchall()
+        if not self._dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, row)) for row in rows]
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """
+    Соединение потока с интерфейсом mysql.connector. close() не закрывает файл базы,
+    а только откатывает незавершенную транзакцию - соединение потока переиспользуется.
+    """
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+        self.autocommit = False
+
+    def cursor(self, dictionary: bool = False, prepared: bool = False) -> SQLiteCursor:
+        # Подготовленные запросы sqlite3 кэширует сам, prepared принимается для совместимости
+        return SQLiteCursor(self, dictionary)
+
+    def after_statement(self):
+        if self.autocommit and self.raw.in_transaction:
+            self.commit()
+
+    def commit(self):
+        try:
+            self.raw.commit()
+        except sqlite3.Error as e:
+            raise _storage_error(e) from e
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        if self.raw.in_transaction:
+            self.raw.rollback()
+
+class SQLiteManager(DatabaseManager):
+    """
+    Встроенное хранилище в одном файле SQLite (режим WAL) для установок на одном узле:
+    без сервера и сетевых запросов. У каждого потока свое соединение с файлом,
+    читатели не блокируют запись. Переопределены только запросы, синтаксис
+    которых в SQLite отличается от MySQL.
+    """
+    BACKEND = 'sqlite'
+    INSERT_IGNORE = "INSERT OR IGNORE"
+    CHAT_TYPE_INDEX = "INDEXED BY idx_chat_type"
+    ROLLUP_UPSERT = "ON CONFLICT (dimension, bucket, item_key) DO UPDATE SET count = count + excluded.count"
+
+    # Текущая схема, как и в DatabaseManager: изменения добавляются и сюда, и новой миграцией
+    TABLES = [
+        f"""
+        CREATE TABLE IF NOT EXISTS user_groups (
+            id INTEGER PRIMARY KEY,
+            chat_id VARCHAR(255) UNIQUE NOT NULL,
+            group_name VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS mailing_settings (
+            id INTEGER PRIMARY KEY,
+            chat_id VARCHAR(255) UNIQUE NOT NULL,
+            enabled BOOLEAN DEFAULT FALSE,
+            hour INT DEFAULT 18,
+            minute INT DEFAULT 0,
+            timezone VARCHAR(50) DEFAULT 'Asia/Tomsk',
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS change_notifications (
+            id INTEGER PRIMARY KEY,
+            chat_id VARCHAR(255) UNIQUE NOT NULL,
+            enabled BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY,
+            user_id VARCHAR(255) UNIQUE NOT NULL,
+            username VARCHAR(255),
+            created_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS flood_settings (
+            id INTEGER PRIMARY KEY,
+            enabled BOOLEAN DEFAULT TRUE,
+            max_requests_per_minute INT DEFAULT 30,
+            ban_duration_minutes INT DEFAULT 60,
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS banned_users (
+            id INTEGER PRIMARY KEY,
+            chat_id VARCHAR(255) UNIQUE NOT NULL,
+            reason TEXT,
+            banned_until TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS request_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id VARCHAR(255) NOT NULL,
+            command_id INT NULL,
+            user_agent_id INT NULL,
+            command VARCHAR(255),
+            user_agent TEXT,
+            timestamp TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS bot_settings (
+            id INTEGER PRIMARY KEY,
+            setting_key VARCHAR(255) UNIQUE NOT NULL,
+            setting_value TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS bot_chats (
+            id INTEGER PRIMARY KEY,
+            chat_id VARCHAR(255) UNIQUE NOT NULL,
+            chat_type VARCHAR(16) NOT NULL CHECK (chat_type IN ('private', 'group', 'supergroup', 'channel')),
+            username VARCHAR(255),
+            first_name VARCHAR(255),
+            last_name VARCHAR(255),
+            title VARCHAR(255),
+            created_at TIMESTAMP DEFAULT ({NOW}),
+            updated_at TIMESTAMP DEFAULT ({NOW})
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS settings_version (
+            id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_rollup_minute (
+            dimension VARCHAR(16) NOT NULL,
+            bucket DATETIME NOT NULL,
+            item_key VARCHAR(255) NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket, item_key)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_rollup_hour (
+            dimension VARCHAR(16) NOT NULL,
+            bucket DATETIME NOT NULL,
+            item_key VARCHAR(255) NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket, item_key)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_dictionary (
+            id INTEGER PRIMARY KEY,
+            kind VARCHAR(16) NOT NULL,
+            value VARCHAR(255) NOT NULL,
+            UNIQUE (kind, value)
+        )
+        """
+    ]
+    # Индексы, которые в MySQL объявлены внутри CREATE TABLE (имена индексов в SQLite общие для всей базы)
+    TABLE_INDEXES = [
+        ('request_stats', 'idx_chat_id', '(chat_id)'),
+        ('request_stats', 'idx_timestamp', '(timestamp)'),
+        ('bot_chats', 'idx_chat_type', '(chat_type)'),
+        ('bot_chats', 'idx_created_at', '(created_at)'),
+        ('request_rollup_minute', 'idx_bucket', '(bucket)'),
+    ]
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()  # Соединение sqlite3 текущего потока
+        self._connections = []           # Соединения всех потоков, закрываются в close()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Соединение используется только своим потоком; check_same_thread=False нужен, чтобы закрыть его при остановке
+        raw = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_STORAGE['busy_timeout_ms'] / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute(f"PRAGMA synchronous={SQLITE_STORAGE['synchronous']}")
+        raw.execute(f"PRAGMA cache_size=-{SQLITE_STORAGE['cache_size_kb']}")
+        with self._lock:
+            self._connections.append(raw)
+        # Считается только реальное открытие: дальше поток переиспользует свое соединение
+        metrics.db_connections.inc()
+        return raw
+
+    def get_connection(self):
+        raw = getattr(self._local, 'conn', None)
+        if raw is None:
+            try:
+                raw = self._connect()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"❌ Ошибка открытия базы SQLite {self.path}: {e}")
+                return None
+            self._local.conn = raw
+        return SQLiteConnection(raw)
+
+    def close(self):
+        """Закрытие соединений всех потоков при остановке бота"""
+        super().close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        self._local = threading.local()
+        for raw in connections:
+            try:
+                raw.close()
+            except sqlite3.Error:
+                pass
+
+    def init_database(self):
+        conn = self.get_connection()
+        if not conn:
+            return False
+        logger.info(f"✅ База данных SQLite открыта: {self.path}")
+        conn.close()
+        return True
+
+    def create_tables(self):
+        """Создание всех таблиц и индексов (схема SQLite всегда создается целиком, без ALTER)"""
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            for table in self.TABLES:
+                cursor.execute(table)
+            for table, index_name, columns in self.TABLE_INDEXES + self.INDEXES:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} {columns}")
+
+            cursor.execute("""
+                INSERT OR IGNORE INTO flood_settings (id, enabled, max_requests_per_minute, ban_duration_minutes)
+                VALUES (1, TRUE, 30, 60)
+            """)
+            cursor.execute("INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)")
+            conn.commit()
+            logger.info("✅ Все таблицы созданы успешно")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка создания таблиц: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def set_dictionary_binary_collation(self) -> bool:
+        """UNIQUE в SQLite и так сравнивает значения побайтно"""
+        return True
+
+    def get_storage_info(self) -> Dict[str, Any]:
+        """Версия SQLite, режим журнала и размер файла базы вместе с WAL"""
+        try:
+            journal_mode = self._execute_prepared("PRAGMA journal_mode", (), 'one')[0]
+        except Error as e:
+            logger.error(f"❌ Ошибка получения информации о базе SQLite: {e}")
+            return {}
+        size = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+        return {'version': sqlite3.sqlite_version, 'journal_mode': journal_mode, 'size_bytes': size}
+
+    # Запись с обновлением существующей строки: ON CONFLICT вместо ON DUPLICATE KEY UPDATE
+    def save_bot_chat(self, chat_id: str, chat_type: str, username: str = None,
+                 first_name: str = None, last_name: str = None, title: str = None) -> bool:
+        return self.save_bot_chats([{
+            'chat_id': chat_id, 'chat_type': chat_type, 'username': username,
+            'first_name': first_name, 'last_name': last_name, 'title': title
+        }])
+
+    def save_bot_chats(self, chats: List[Dict[str, Any]]) -> bool:
+        if not chats:
+            return True
+
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(f"""
+                INSERT INTO bot_chats (chat_id, chat_type, username, first_name, last_name, title)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                chat_type = excluded.chat_type,
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                title = excluded.title,
+                updated_at = {NOW}
+            """, [
+                (chat['chat_id'], chat['chat_type'], chat.get('username'),
+                 chat.get('first_name'), chat.get('last_name'), chat.get('title'))
+                for chat in chats
+            ])
+            conn.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка пакетного сохранения информации о чатах: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def set_user_group(self, chat_id: str, group_name: str) -> bool:
+        try:
+            self._execute_prepared(f"""
+                INSERT INTO user_groups (chat_id, group_name) VALUES (%s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET group_name = excluded.group_name, updated_at = {NOW}
+            """, (chat_id, group_name))
+            self._settings_changed(chat_id, 'group')
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка установки группы: {e}")
+            return False
+
+    def set_mailing_settings(self, chat_id: str, enabled: bool, hour: int = 18, minute: int = 0) -> bool:
+        try:
+            self._execute_prepared(f"""
+                INSERT INTO mailing_settings (chat_id, enabled, hour, minute) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                enabled = excluded.enabled, hour = excluded.hour, minute = excluded.minute, updated_at = {NOW}
+            """, (chat_id, enabled, hour, minute))
+            self._settings_changed(chat_id, 'mailing')
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка установки настроек рассылки: {e}")
+            return False
+
+    def set_change_notifications(self, chat_id: str, enabled: bool) -> bool:
+        try:
+            self._execute_prepared(f"""
+                INSERT INTO change_notifications (chat_id, enabled) VALUES (%s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET enabled = excluded.enabled, updated_at = {NOW}
+            """, (chat_id, enabled))
+            self._settings_changed(chat_id, 'notifications')
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка установки уведомлений: {e}")
+            return False
+
+    def ban_user(self, chat_id: str, reason: str = None, ban_duration_minutes: int = 0) -> bool:
+        banned_until = datetime.now() + timedelta(minutes=ban_duration_minutes) if ban_duration_minutes > 0 else None
+        try:
+            self._execute_prepared("""
+                INSERT INTO banned_users (chat_id, reason, banned_until) VALUES (%s, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET reason = excluded.reason, banned_until = excluded.banned_until
+            """, (chat_id, reason, banned_until))
+            logger.info(f"🚫 Пользователь {chat_id} забанен. Причина: {reason}, Длительность: {ban_duration_minutes} мин")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка бана пользователя: {e}")
+            return False
+
+    def set_bot_setting(self, key: str, value: str, description: str = None) -> bool:
+        try:
+            self._execute_prepared(f"""
+                INSERT INTO bot_settings (setting_key, setting_value, description) VALUES (%s, %s, %s)
+                ON CONFLICT (setting_key) DO UPDATE SET
+                setting_value = excluded.setting_value, description = excluded.description, updated_at = {NOW}
+            """, (key, value, description))
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка установки настройки: {e}")
+            return False
+
+    def _insert_dictionary_value(self, key: Tuple[str, str]) -> int:
+        # LAST_INSERT_ID(id) в SQLite нет: вставка без дублей и отдельный поиск id
+        self._execute_prepared("INSERT OR IGNORE INTO request_dictionary (kind, value) VALUES (%s, %s)", key)
+        return self._execute_prepared(
+            "SELECT id FROM request_dictionary WHERE kind = %s AND value = %s", key, 'one'
+        )[0]
+
+    # Статистика и обслуживание request_stats
+    def backfill_request_rollups(self, cutoff: datetime) -> Dict[str, int]:
+        """Пересчет агрегатов из сырых записей (то же, что в MySQL, на strftime вместо DATE_FORMAT)"""
+        cutoff = cutoff.replace(second=0, microsecond=0)
+        cutoff_hour = cutoff.replace(minute=0)
+        dimensions = (
+            ('total', "'total'"),
+            ('command', f"substr(COALESCE({self.REQUEST_COMMAND_SQL}, 'Unknown'), 1, 255)"),
+            ('chat', 'rs.chat_id'),
+        )
+
+        conn = self.get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(timestamp) FROM request_stats")
+            first = cursor.fetchone()[0]
+            if first is None:
+                return {'minute_rows': 0, 'hour_rows': 0}
+
+            # У выражения MIN() нет объявленного типа, sqlite3 возвращает строку
+            since_hour = datetime.fromisoformat(first).replace(minute=0, second=0, microsecond=0)
+            minute_since = max(since_hour, cutoff - timedelta(minutes=REQUEST_ROLLUPS['minute_retention_minutes']))
+            minute_rows = hour_rows = 0
+
+            cursor.execute("""
+                DELETE FROM request_rollup_minute WHERE bucket >= %s AND bucket < %s
+            """, (minute_since, cutoff))
+            cursor.execute("""
+                DELETE FROM request_rollup_hour WHERE bucket >= %s AND bucket <= %s
+            """, (since_hour, cutoff_hour))
+
+            for dimension, key_expr in dimensions:
+                cursor.execute(f"""
+                    INSERT INTO request_rollup_minute (dimension, bucket, item_key, count)
+                    SELECT %s, strftime('%%Y-%%m-%%d %%H:%%M:00', rs.timestamp) AS minute_bucket,
+                           {key_expr} AS item, COUNT(*)
+                    FROM request_stats rs
+                    {self.REQUEST_COMMAND_JOIN}
+                    WHERE rs.timestamp >= %s AND rs.timestamp < %s
+                    GROUP BY minute_bucket, item
+                """, (dimension, minute_since, cutoff))
+                minute_rows += cursor.rowcount
+
+                cursor.execute(f"""
+                    INSERT INTO request_rollup_hour (dimension, bucket, item_key, count)
+                    SELECT %s, hour_bucket, item, SUM(cnt) FROM (
+                        SELECT strftime('%%Y-%%m-%%d %%H:00:00', rs.timestamp) AS hour_bucket,
+                               {key_expr} AS item, COUNT(*) AS cnt
+                        FROM request_stats rs
+                        {self.REQUEST_COMMAND_JOIN}
+                        WHERE rs.timestamp >= %s AND rs.timestamp < %s
+                        GROUP BY hour_bucket, item
+                        UNION ALL
+                        SELECT strftime('%%Y-%%m-%%d %%H:00:00', bucket), item_key, SUM(count)
+                        FROM request_rollup_minute
+                        WHERE dimension = %s AND bucket >= %s AND bucket < %s
+                        GROUP BY item_key
+                    ) AS merged
+                    GROUP BY hour_bucket, item
+                """, (dimension, since_hour, cutoff, dimension, cutoff, cutoff_hour + timedelta(hours=1)))
+                hour_rows += cursor.rowcount
+
+            conn.commit()
+            logger.info(f"✅ Агрегаты статистики пересчитаны: {minute_rows} минутных, {hour_rows} часовых срезов")
+            return {'minute_rows': minute_rows, 'hour_rows': hour_rows}
+        except Error as e:
+            conn.rollback()
+            logger.error(f"❌ Ошибка пересчета агрегатов статистики: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_table_size(self, table: str) -> Dict[str, int]:
+        """Размер таблицы: строки - COUNT(*), байты - страницы таблицы и ее индексов по dbstat"""
+        conn = self.get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            sizes = {'rows': cursor.fetchone()[0], 'table': 0, 'index': 0}
+            try:
+                cursor.execute("""
+                    SELECT m.type, SUM(s.pgsize)
+                    FROM sqlite_master m
+                    JOIN dbstat s ON s.name = m.name
+                    WHERE m.tbl_name = %s
+                    GROUP BY m.type
+                """, (table,))
+                sizes.update({kind: int(size or 0) for kind, size in cursor.fetchall()})
+            except Error:
+                pass  # SQLite собран без dbstat - известно только количество строк
+            return {
+                'rows': sizes['rows'],
+                'data_bytes': sizes['table'],
+                'index_bytes': sizes['index'],
+                'total_bytes': sizes['table'] + sizes['index']
+            }
+        except Error as e:
+            logger.error(f"❌ Ошибка получения размера таблицы {table}: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def compact_requests_range(self, first_id: int, last_id: int) -> int:
+        """Перевод текстовых command/user_agent в id словаря (UPDATE с подзапросом вместо UPDATE ... JOIN)"""
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            updated = 0
+            for kind, column, id_column in (('command', 'command', 'command_id'),
+                                            ('user_agent', 'user_agent', 'user_agent_id')):
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO request_dictionary (kind, value)
+                    SELECT DISTINCT %s, substr({column}, 1, 255)
+                    FROM request_stats
+                    WHERE id >= %s AND id <= %s AND {column} IS NOT NULL
+                """, (kind, first_id, last_id))
+                cursor.execute(f"""
+                    UPDATE request_stats
+                    SET {id_column} = (
+                            SELECT d.id FROM request_dictionary d
+                            WHERE d.kind = %s AND d.value = substr(request_stats.{column}, 1, 255)
+                        ),
+                        {column} = NULL
+                    WHERE id >= %s AND id <= %s AND {column} IS NOT NULL
+                """, (kind, first_id, last_id))
+                updated += cursor.rowcount
+            conn.commit()
+            return updated
+        except Error as e:
+            conn.rollback()
+            logger.error(f"❌ Ошибка сжатия записей запросов: {e}")
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
@@ -0,0 +1,312 @@
+"""
+Проверка совместимости хранилищ: одни и те же сценарии через публичные методы
+DatabaseManager выполняются на каждом хранилище, в обоих режимах запросов
+(подготовленные на соединении потока и соединение на запрос).
+
+Запуск:
+    python storage_conformance.py               - SQLite во временном файле
+    python storage_conformance.py sqlite mysql  - плюс MySQL из DB_HOST/DB_USER/DB_PASSWORD/DB_NAME
+
+Для MySQL нужна отдельная пустая база: проверки пишут в нее и меняют общие настройки.
+"""
+import os
+import sys
+import time
+import tempfile
+import logging
+from datetime import datetime, timedelta
+from schema_migrations import SchemaMigrations
+
+CHECKS = []
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+@check
+def schema(db, ns):
+    migrations = SchemaMigrations(db=db)
+    assert db.get_schema_version() == migrations.latest_version
+    assert migrations.run() == migrations.latest_version
+    assert [row['version'] for row in db.get_schema_migrations()] == [m.version for m in migrations.migrations]
+
+@check
+def user_groups(db, ns):
+    chat, group = ns('chat'), ns('group')
+    assert db.get_user_group(chat) is None
+    assert db.set_user_group(chat, ns('old'))
+    assert db.set_user_group(chat, group)
+    assert db.get_user_group(chat) == group
+    assert db.get_chats_by_group(group) == [chat]
+    assert db.get_chats_by_group(ns('old')) == []
+
+@check
+def mailing_settings(db, ns):
+    chat = ns('chat')
+    assert db.get_mailing_settings(chat) == {'enabled': False, 'time': {'hour': 18, 'minute': 0}, 'timezone': 'Asia/Tomsk'}
+    assert db.set_mailing_settings(chat, True, 7, 30)
+    settings = db.get_mailing_settings(chat)
+    assert bool(settings['enabled']) and settings['time'] == {'hour': 7, 'minute': 30}
+    assert chat in db.get_enabled_mailing_chats()
+    assert db.set_mailing_settings(chat, False, 7, 30)
+    assert chat not in db.get_enabled_mailing_chats()
+
+@check
+def change_notifications(db, ns):
+    chat, group = ns('chat'), ns('group')
+    assert not db.get_change_notifications(chat)
+    assert db.set_change_notifications(chat, True)
+    assert db.get_change_notifications(chat)
+    assert chat in db.get_enabled_notification_chats()
+    db.set_user_group(chat, group)
+    assert db.get_notification_counts_by_group().get(group) == 1
+    assert db.set_change_notifications(chat, False)
+    assert chat not in db.get_enabled_notification_chats()
+
+@check
+def subscribers(db, ns):
+    group = ns('group')
+    plain, mailing, banned = ns('plain'), ns('mailing'), ns('banned')
+    for chat in (plain, mailing, banned):
+        db.set_user_group(chat, group)
+    db.set_mailing_settings(mailing, True, 8, 15)
+    db.set_mailing_settings(banned, True, 9, 0)
+    db.set_change_notifications(mailing, True)
+    db.ban_user(banned, 'conformance')
+
+    rows = {row['chat_id']: row for row in db.get_group_subscribers(group)}
+    assert set(rows) == {plain, mailing, banned}
+    assert rows[plain] == {'chat_id': plain, 'notifications_enabled': False, 'mailing_enabled': False,
+                           'time': {'hour': 18, 'minute': 0}, 'is_banned': False}
+    assert rows[mailing]['notifications_enabled'] and rows[mailing]['time'] == {'hour': 8, 'minute': 15}
+    assert rows[banned]['is_banned']
+
+    mailing_rows = {row['chat_id']: row for row in db.get_mailing_subscribers()}
+    assert mailing_rows[mailing] == {'chat_id': mailing, 'group': group, 'time': {'hour': 8, 'minute': 15},
+                                     'is_banned': False}
+    assert mailing_rows[banned]['is_banned']
+    db.unban_user(banned)
+
+@check
+def admins(db, ns):
+    user = ns('admin')
+    assert not db.is_admin(user)
+    assert db.add_admin(user, 'conformance')
+    assert not db.add_admin(user, 'conformance')  # user_id уникален
+    assert db.is_admin(user)
+    assert user in db.get_admin_ids()
+    assert any(admin['user_id'] == user for admin in db.get_all_admins())
+    assert db.remove_admin(user)
+    assert not db.remove_admin(user)
+
+@check
+def flood_settings(db, ns):
+    before = db.get_flood_settings()
+    assert {'enabled', 'max_requests_per_minute', 'ban_duration_minutes'} <= set(before)
+    assert db.update_flood_settings(max_requests=45, ban_duration=5)
+    after = db.get_flood_settings()
+    assert (after['max_requests_per_minute'], after['ban_duration_minutes']) == (45, 5)
+    db.update_flood_settings(max_requests=before['max_requests_per_minute'],
+                             ban_duration=before['ban_duration_minutes'])
+
+@check
+def bans(db, ns):
+    chat = ns('chat')
+    assert not db.is_banned(chat)
+    assert db.ban_user(chat, 'first', 10)
+    assert db.is_banned(chat)
+    assert db.ban_user(chat, 'second')
+    ban = next(row for row in db.get_banned_users() if row['chat_id'] == chat)
+    assert ban['reason'] == 'second' and ban['banned_until'] is None
+    assert db.unban_user(chat)
+    assert not db.is_banned(chat)
+    assert not db.unban_user(chat)
+
+@check
+def request_log(db, ns):
+    chat, command = ns('chat'), ns('/cmd')
+    for _ in range(3):
+        assert db.log_request(chat, command, 'conformance-agent')
+    db.log_request(chat, None, None)
+    assert db.get_user_request_count(chat, 1) == 4
+    last = db.get_last_request(chat)  # Записи одной секунды упорядочены произвольно
+    assert last['command'] in (command, None) and isinstance(last['timestamp'], datetime)
+
+    stats = db.get_request_stats_exact(5)
+    assert stats['recent_requests'] >= 4
+    assert (command, 3) in [tuple(row) for row in stats['popular_commands']]
+    assert (chat, 4) in [tuple(row) for row in stats['active_users']]
+
+@check
+def request_dictionary_case(db, ns):
+    # Словарь различает регистр, аргументы и @имя бота в ключ не попадают
+    chat, command = ns('chat'), '/' + ns('case')
+    for _ in range(5):
+        assert db.log_request(chat, command.upper(), 'conformance-agent')
+        assert db.log_request(chat, f"{command}@bot {ns('arg')}", 'conformance-agent')
+    popular = [tuple(row) for row in db.get_request_stats_exact(5)['popular_commands']]
+    assert (command, 5) in popular and (command.upper(), 5) in popular
+
+@check
+def request_rollups(db, ns):
+    command, chat = ns('/rollup'), ns('chat')
+    minute = datetime.now().replace(second=0, microsecond=0)
+    counts = {(minute, 'total', 'total'): 2, (minute, 'command', command): 2, (minute, 'chat', chat): 2}
+    assert db.save_request_rollups(counts)
+    assert db.save_request_rollups(counts)
+
+    for period in (60, 7 * 24 * 60):  # минутные и часовые срезы
+        stats = db.get_request_stats(period)
+        assert stats['recent_requests'] >= 4
+        assert (command, 4) in stats['popular_commands'] and (chat, 4) in stats['active_users']
+
+    db.save_request_rollups({(minute - timedelta(days=3), 'command', command): 1})
+    assert db.prune_request_rollups(24 * 60) >= 1
+
+@check
+def rollup_backfill(db, ns):
+    chat, command = ns('chat'), ns('/backfill')
+    for _ in range(2):
+        db.log_request(chat, command, 'conformance-agent')
+    result = db.backfill_request_rollups(datetime.now() + timedelta(minutes=2))
+    assert result['minute_rows'] > 0 and result['hour_rows'] > 0
+    stats = db.get_request_stats(60)
+    assert (command, 2) in stats['popular_commands']
+    # Повторный пересчет перезаписывает срезы, а не дополняет их
+    db.backfill_request_rollups(datetime.now() + timedelta(minutes=2))
+    assert (command, 2) in db.get_request_stats(60)['popular_commands']
+
+@check
+def request_retention(db, ns):
+    chat, command = ns('legacy'), ns('/legacy')
+    # Старые записи с текстом команды вместо id словаря
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO request_stats (chat_id, command, user_agent) VALUES (%s, %s, %s)",
+                       [(chat, command, 'legacy-agent')] * 2)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    first_id, last_id = db.get_request_id_range()
+    assert first_id <= last_id
+    assert db.compact_requests_range(first_id, last_id) >= 4
+    assert db.get_last_request(chat)['command'] == command
+
+    cutoff = datetime.now() + timedelta(minutes=1)
+    expired = db.get_expired_requests(cutoff, 100000)
+    legacy = [row for row in expired if row['chat_id'] == chat]
+    assert len(legacy) == 2 and legacy[0]['command'] == command and legacy[0]['user_agent'] == 'legacy-agent'
+    assert db.delete_requests_range(legacy[0]['id'], legacy[-1]['id'], cutoff) == 2
+    assert db.get_last_request(chat) is None
+
+@check
+def bot_chats(db, ns):
+    chats = [{'chat_id': ns(f'chat{number}'), 'chat_type': 'private', 'username': f'user{number}'}
+             for number in range(3)]
+    before = db.get_bot_chats_count()
+    assert db.save_bot_chats(chats)
+    assert db.save_bot_chat(ns('group'), 'group', title='Старое название')
+    assert db.save_bot_chat(ns('group'), 'group', title='Новое название')
+
+    counts = db.get_bot_chats_count()
+    assert counts['total'] == before.get('total', 0) + 4
+    assert counts['group'] == before.get('group', 0) + 1
+    groups = [chat for chat in db.get_all_bot_chats('group') if chat['chat_id'] == ns('group')]
+    assert groups[0]['title'] == 'Новое название' and isinstance(groups[0]['created_at'], datetime)
+
+    page, has_more = db.get_bot_chats_page('private', limit=2)
+    assert len(page) == 2 and has_more
+    last = page[-1]
+    older, _ = db.get_bot_chats_page('private', (last['created_at'], last['id']), 'next', limit=100)
+    newer, _ = db.get_bot_chats_page('private', (last['created_at'], last['id']), 'prev', limit=100)
+    assert [chat['id'] for chat in newer[-1:]] == [page[0]['id']]
+    assert last['id'] not in [chat['id'] for chat in older + newer]
+
+    assert db.delete_bot_chat(ns('group'))
+    assert not db.delete_bot_chat(ns('group'))
+
+@check
+def bot_settings(db, ns):
+    key = ns('setting')
+    assert db.get_bot_setting(key, 'default') == 'default'
+    assert db.set_bot_setting(key, '1', 'conformance')
+    assert db.set_bot_setting(key, '2', 'conformance')
+    assert db.get_bot_setting(key) == '2'
+
+@check
+def settings_version(db, ns):
+    version = db.get_settings_version()
+    assert db.bump_settings_version()
+    assert db.get_settings_version() == version + 1
+
+@check
+def import_chat_settings(db, ns):
+    chat, group = ns('imported'), ns('group')
+    db.set_user_group(ns('existing'), group)
+    stats = db.import_chat_settings(
+        [(chat, group), (ns('existing'), ns('json'))], [(chat, True, 6, 45)], [(chat, True)]
+    )
+    assert stats == {'user_groups': 1, 'mailing_settings': 1, 'change_notifications': 1}
+    assert db.get_user_group(ns('existing')) == group  # данные в базе новее JSON
+    assert db.get_mailing_settings(chat)['time'] == {'hour': 6, 'minute': 45}
+    assert db.import_chat_settings([(chat, group)], [], []) == {
+        'user_groups': 0, 'mailing_settings': 0, 'change_notifications': 0
+    }
+
+@check
+def settings_info(db, ns):
+    info = db.get_settings_info()
+    assert set(info) == {'user_groups_count', 'enabled_mailing_count', 'enabled_notifications_count',
+                         'admins_count', 'banned_users_count'}
+    assert all(isinstance(value, int) for value in info.values())
+
+@check
+def table_size(db, ns):
+    size = db.get_table_size('request_stats')
+    assert set(size) == {'rows', 'data_bytes', 'index_bytes', 'total_bytes'}
+    assert size['total_bytes'] == size['data_bytes'] + size['index_bytes']
+
+def run_checks(db, label: str) -> int:
+    """Все сценарии на одном хранилище; возвращает количество ошибок"""
+    if SchemaMigrations(db=db).run() is None:
+        print(f"❌ {label}: база данных недоступна")
+        return 1
+
+    failures = 0
+    for prepared in (True, False):
+        db.prepared_statements = prepared
+        mode = 'подготовленные запросы' if prepared else 'соединение на запрос'
+        print(f"\n=== {label}, {mode} ===")
+        prefix = f"conf{time.time_ns():x}"
+        for fn in CHECKS:
+            try:
+                fn(db, lambda name: f"{prefix}_{fn.__name__}_{name}")
+                print(f"  ✅ {fn.__name__}")
+            except Exception as e:
+                failures += 1
+                print(f"  ❌ {fn.__name__}: {type(e).__name__} {e}")
+        db.close()
+    return failures
+
+def main():
+    logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.CRITICAL)
+    backends = sys.argv[1:] or ['sqlite']
+    failures = 0
+    for backend in backends:
+        if backend == 'sqlite':
+            from sqlite_manager import SQLiteManager
+            with tempfile.TemporaryDirectory() as directory:
+                failures += run_checks(SQLiteManager(os.path.join(directory, 'conformance.sqlite3')), 'sqlite')
+        elif backend == 'mysql':
+            from database_manager import DatabaseManager
+            failures += run_checks(DatabaseManager(), 'mysql')
+        else:
+            print(f"❌ Неизвестное хранилище: {backend}")
+            failures += 1
+
+    print(f"\n{'✅ Все проверки пройдены' if not failures else f'❌ Ошибок: {failures}'}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
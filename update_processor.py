@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import UPDATE_PROCESSING
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с порядком внутри чата.
+    Обновления одного чата идут строго по очереди (диалоги setgroup, schedule, mailing
+    не перемешиваются), разные чаты - одновременно, но не больше max_concurrent.
+    Ожидание замеряется от получения обновления до запуска обработчиков.
+    """
+
+    def __init__(self, max_concurrent: int, max_pending: int = 1000, per_chat_ordering: bool = True,
+                 slow_wait_seconds: float = 2, stats_window: int = 1000):
+        # Семафор базового класса ограничивает число принятых обновлений (вместе с ждущими),
+        # сами обработчики ограничивает _running: его берут уже после очереди чата,
+        # чтобы ждущие обновления одного чата не занимали места других чатов
+        super().__init__(max(max_pending, max_concurrent, 2))
+        self.max_concurrent = max_concurrent
+        self.per_chat_ordering = per_chat_ordering
+        self.slow_wait_seconds = slow_wait_seconds
+        self._running = None
+        self._chats = {}  # chat_id -> [asyncio.Lock, сколько обновлений чата внутри]
+        self._waits = deque(maxlen=stats_window)
+        self._durations = deque(maxlen=stats_window)
+        self.processed = 0
+        self.active = 0
+        self.waiting = 0
+        self.slow_waits = 0
+        self.max_wait = 0.0
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.max_concurrent)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    @staticmethod
+    def chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        received = time.perf_counter()
+        self.waiting += 1
+        key = self.chat_key(update) if self.per_chat_ordering else None
+        if key is None:
+            await self._run(update, coroutine, received)
+            return
+
+        entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(update, coroutine, received)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def _run(self, update: object, coroutine: Awaitable[Any], received: float):
+        async with self._running:
+            started = time.perf_counter()
+            self.waiting -= 1
+            self._record_wait(update, started - received)
+            self.active += 1
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+                self.processed += 1
+                self._durations.append(time.perf_counter() - started)
+
+    def _record_wait(self, update: object, wait: float):
+        self._waits.append(wait)
+        self.max_wait = max(self.max_wait, wait)
+        if wait >= self.slow_wait_seconds:
+            self.slow_waits += 1
+            logger.warning(f"🐢 Обновление {getattr(update, 'update_id', '?')} "
+                           f"(чат {self.chat_key(update)}) ждало обработки {wait:.2f} с")
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ожидание и длительность обработки по последним stats_window обновлениям, в секундах"""
+        waits, durations = list(self._waits), list(self._durations)
+        return {
+            'max_concurrent': self.max_concurrent,
+            'active': self.active,
+            'waiting': self.waiting,
+            'chats': len(self._chats),
+            'processed': self.processed,
+            'slow_waits': self.slow_waits,
+            'wait_p50': self._percentile(waits, 0.5),
+            'wait_p95': self._percentile(waits, 0.95),
+            'wait_max': self.max_wait,
+            'duration_p50': self._percentile(durations, 0.5),
+            'duration_p95': self._percentile(durations, 0.95)
+        }
+
+# Глобальный экземпляр обработчика обновлений
+update_processor = ChatOrderedUpdateProcessor(
+    UPDATE_PROCESSING['max_concurrent'],
+    max_pending=UPDATE_PROCESSING['max_pending'],
+    per_chat_ordering=UPDATE_PROCESSING['per_chat_ordering'],
+    slow_wait_seconds=UPDATE_PROCESSING['slow_wait_seconds'],
+    stats_window=UPDATE_PROCESSING['stats_window']
+)
+metrics.add_collector(
+    'bot_updates', 'Обновления в обработке: active - выполняются, waiting - ждут очереди чата или места',
+    'gauge', ('state',),
+    lambda: {('active',): update_processor.active, ('waiting',): update_processor.waiting}
+)
+metrics.add_collector(
+    'bot_updates_processed_total', 'Обработанные обновления', 'counter', (),
+    lambda: {(): update_processor.processed}
+)
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import hmac
+import signal
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+import aiohttp
+from aiohttp import web
+from telegram import Update
+from config import WEBHOOK
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Поля обновления, в которых лежит чат или пользователь (для привязки чата к процессу)
+_CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'my_chat_member', 'chat_member', 'chat_join_request')
+_USER_FIELDS = ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query', 'poll_answer')
+
+def webhook_settings() -> Dict[str, Any]:
+    """WEBHOOK из config с переопределениями из переменных окружения"""
+    settings = dict(WEBHOOK)
+    settings['mode'] = os.getenv('BOT_MODE', settings['mode'])
+    settings['listen'] = os.getenv('WEBHOOK_LISTEN', settings['listen'])
+    settings['port'] = int(os.getenv('WEBHOOK_PORT', settings['port']))
+    settings['url'] = os.getenv('WEBHOOK_URL', settings['url'])
+    settings['secret_token'] = os.getenv('WEBHOOK_SECRET', settings['secret_token'])
+    settings['workers'] = int(os.getenv('WEBHOOK_WORKERS', settings['workers']))
+    settings['record_file'] = os.getenv('UPDATES_RECORD', settings['record_file'])
+    settings['bot_api_url'] = os.getenv('BOT_API_URL', settings['bot_api_url'])
+    # Номер процесса за прокси (задает сам прокси), None - единственный процесс
+    worker = os.getenv('WEBHOOK_WORKER')
+    settings['worker'] = int(worker) if worker is not None else None
+    return settings
+
+def chat_id_of(data: Dict[str, Any]) -> Optional[int]:
+    """ID чата (или пользователя) из необработанного обновления Telegram"""
+    for field in _CHAT_FIELDS:
+        if field in data:
+            return data[field].get('chat', {}).get('id')
+    if 'callback_query' in data:
+        query = data['callback_query']
+        message = query.get('message') or {}
+        return message.get('chat', {}).get('id') or query.get('from', {}).get('id')
+    for field in _USER_FIELDS:
+        if field in data:
+            return (data[field].get('from') or data[field].get('user') or {}).get('id')
+    return None
+
+def worker_for(chat_id, workers: int) -> int:
+    """Процесс, который обрабатывает все обновления чата (диалоги и рассылка живут в его памяти)"""
+    if not chat_id or workers <= 1:
+        return 0
+    return int(chat_id) % workers
+
+def secret_matches(request: web.Request, secret_token: str) -> bool:
+    if not secret_token:
+        return True
+    return hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token)
+
+class WebhookServer:
+    """
+    HTTP сервер webhook на aiohttp: проверяет секрет, кладет обновление в очередь
+    Application и сразу отвечает 200 - обработка идет в фоне, как при polling.
+    """
+
+    def __init__(self, application, listen: str, port: int, path: str, secret_token: str = ''):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = '/' + path.strip('/')
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not secret_matches(request, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        self.received += 1
+        return web.Response()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"🌐 Webhook сервер: http://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'received': self.received, 'rejected': self.rejected, 'queued': self.application.update_queue.qsize()}
+
+class UpdateRecorder:
+    """Запись входящих обновлений в JSONL (по строке на обновление) для benchmarks/webhook_load.py"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._file = open(path, 'a', encoding='utf-8')
+
+    async def record(self, update: Update, context):
+        self._file.write(json.dumps(update.to_dict(), ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.recorded += 1
+
+    def close(self):
+        self._file.close()
+        logger.info(f"💾 Записано обновлений: {self.recorded} в {self.path}")
+
+class WebhookProxy:
+    """
+    Локальный прокси для нескольких процессов бота: принимает webhook от Telegram,
+    проверяет секрет и передает обновление процессу worker_for(чат) на 127.0.0.1.
+    Обновления одного чата всегда попадают в один процесс и идут по порядку.
+    """
+
+    def __init__(self, application, settings: Dict[str, Any]):
+        self.application = application
+        self.settings = settings
+        self.workers = settings['workers']
+        self.path = '/' + settings['path'].strip('/')
+        self.forwarded = [0] * self.workers
+        self.failed = 0
+        self._session = None
+        self._processes = []
+
+    def worker_url(self, worker: int) -> str:
+        return f"http://127.0.0.1:{self.settings['worker_port'] + worker}{self.path}"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not secret_matches(request, self.settings['secret_token']):
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            worker = worker_for(chat_id_of(json.loads(body)), self.workers)
+        except (ValueError, AttributeError):
+            return web.Response(status=400)
+
+        headers = {'Content-Type': 'application/json', SECRET_HEADER: self.settings['secret_token']}
+        try:
+            async with self._session.post(self.worker_url(worker), data=body, headers=headers) as response:
+                self.forwarded[worker] += 1
+                return web.Response(status=response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Ответ не 200 - Telegram повторит доставку позже
+            self.failed += 1
+            logger.error(f"❌ Процесс бота {worker} недоступен: {e}")
+            return web.Response(status=502)
+
+    async def start_workers(self):
+        """Процессы bot.py на 127.0.0.1 с портами worker_port + номер"""
+        script = os.path.abspath(sys.argv[0])
+        for worker in range(self.workers):
+            env = dict(os.environ, BOT_MODE='webhook', WEBHOOK_LISTEN='127.0.0.1',
+                       WEBHOOK_PORT=str(self.settings['worker_port'] + worker),
+                       WEBHOOK_WORKER=str(worker), WEBHOOK_WORKERS=str(self.workers))
+            self._processes.append(await asyncio.create_subprocess_exec(sys.executable, script, env=env))
+        logger.info(f"🚀 Запущено процессов бота: {self.workers}")
+
+    async def wait_workers(self, timeout: float = 120) -> bool:
+        """Ждем, пока все процессы начнут принимать соединения (GET на POST-маршрут отвечает 405)"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        for worker in range(self.workers):
+            while True:
+                try:
+                    async with self._session.get(self.worker_url(worker)):
+                        break
+                except aiohttp.ClientError:
+                    if asyncio.get_running_loop().time() > deadline:
+                        logger.error(f"❌ Процесс бота {worker} не запустился за {timeout} с")
+                        return False
+                    await asyncio.sleep(0.5)
+        return True
+
+    async def run(self, stop: asyncio.Event):
+        await self.start_workers()
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        # Публичный порт открывается, когда процессы готовы, иначе Telegram получит 502
+        await self.wait_workers()
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.settings['listen'], self.settings['port']).start()
+        logger.info(f"🌐 Прокси webhook: http://{self.settings['listen']}:{self.settings['port']}{self.path} "
+                    f"-> {self.workers} процессов")
+
+        async with self.application.bot as bot:
+            await set_webhook(self.settings, bot)
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+            await self._session.close()
+            for process in self._processes:
+                if process.returncode is None:
+                    process.terminate()
+            for process in self._processes:
+                await process.wait()
+            logger.info(f"🛑 Прокси остановлен, передано обновлений: {self.forwarded}, ошибок: {self.failed}")
+
+async def set_webhook(settings: Dict[str, Any], bot):
+    """Регистрация webhook в Telegram (только если задан публичный адрес)"""
+    if not settings['url']:
+        logger.warning("⚠️ WEBHOOK_URL не задан - webhook в Telegram не зарегистрирован")
+        return
+    url = settings['url'].rstrip('/') + '/' + settings['path'].strip('/')
+    await bot.set_webhook(
+        url=url,
+        secret_token=settings['secret_token'] or None,
+        max_connections=settings['max_connections'],
+        allowed_updates=Update.ALL_TYPES
+    )
+    logger.info(f"✅ Webhook зарегистрирован: {url}")
+
+def _stop_event() -> asyncio.Event:
+    """Событие остановки по SIGINT/SIGTERM (на Windows остановка через KeyboardInterrupt)"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return stop
+
+async def serve(application, settings: Dict[str, Any]):
+    """Жизненный цикл Application в webhook режиме (вместо application.run_webhook)"""
+    stop = _stop_event()
+    if settings['workers'] > 1 and settings['worker'] is None:
+        await WebhookProxy(application, settings).run(stop)
+        return
+
+    server = WebhookServer(application, settings['listen'], settings['port'],
+                           settings['path'], settings['secret_token'])
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        # За прокси webhook регистрирует сам прокси
+        if settings['worker'] is None:
+            await set_webhook(settings, application.bot)
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            logger.info(f"🛑 Webhook сервер остановлен: {server.get_stats()}")
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+def run(application, settings: Dict[str, Any] = None):
+    try:
+        asyncio.run(serve(application, settings or webhook_settings()))
+    except KeyboardInterrupt:
+        pass